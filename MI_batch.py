@@ -0,0 +1,165 @@
+###################################################################
+### M a t e r i a l   I n t e n s i t y   B a t c h   R u n     ###
+###################################################################
+
+# This script runs MI_ei_3.9.1.py for several databases (e.g. the cut-off, APOS and
+# consequential variants of ecoinvent) without the openLCA application.
+# Each database is processed in its own Java virtual machine, so that independent
+# databases run at the same time. At the end, a summary with the duration and the
+# output files of every database is written.
+
+# The script has two parts:
+# 1. Driver: started with python, it starts one worker per database
+# 2. Worker: started by the driver with Jython, it opens one database and runs the script
+
+# Example:
+#   python MI_batch.py --classpath "/opt/openLCA/plugins/olca-app/libs/*" --jython jython-standalone.jar
+#                      --output batch --jobs 3 ~/openLCA-data-1.4/databases/ei391_cutoff
+#                      ~/openLCA-data-1.4/databases/ei391_apos ~/openLCA-data-1.4/databases/ei391_conseq
+
+# !! The databases must not be opened in openLCA at the same time. !!
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "MI_ei_3.9.1.py")
+
+
+##################################### 1. Driver #####################################
+
+# Each database gets its own output directory below the output directory of the batch.
+# It is passed to the worker as openLCA data directory, so that the LCIA-Method and
+# the csv files of different databases do not overwrite each other.
+def output_dir(output, database):
+  return os.path.join(os.path.abspath(output), os.path.basename(os.path.normpath(database)))
+
+# The function run_database starts the worker for one database and waits until it is done
+def run_database(args, database):
+  out         = output_dir(args.output, database)
+  result_file = os.path.join(out, "result.json")
+  if not os.path.exists(out):
+    os.makedirs(out)
+
+  env = dict(os.environ)
+  env["OPENLCA_DATA_DIR"] = out
+
+  classpath = args.classpath
+  if args.jython != None:
+    classpath = classpath + os.pathsep + args.jython
+
+  command = [args.java, "-Xmx" + args.memory, "-cp", classpath, "org.python.util.jython",
+             os.path.abspath(__file__), "--worker", os.path.abspath(database), result_file]
+
+  start = time.time()
+  with open(os.path.join(out, "log.txt"), 'w') as log:
+    exit_code = subprocess.call(command, env = env, stdout = log, stderr = subprocess.STDOUT)
+
+  result = {"database": database, "status": "failed", "error": "the worker did not write a result"}
+  if os.path.isfile(result_file):
+    with open(result_file, 'r') as f:
+      result = json.load(f)
+  if exit_code != 0 and result["status"] == "ok":
+    result["status"] = "failed"
+    result["error"]  = "the worker exited with code " + str(exit_code)
+  result["seconds_total"] = round(time.time() - start, 1)
+  result["log"]           = os.path.join(out, "log.txt")
+  return result
+
+# The function run_batch processes all databases, at most "jobs" of them at the same time
+def run_batch(args):
+  pending = list(args.databases)
+  results = {}
+  lock    = threading.Lock()
+
+  def worker():
+    while True:
+      with lock:
+        if len(pending) == 0:
+          return
+        database = pending.pop(0)
+      print("Started: " + database)
+      result = run_database(args, database)
+      print("Finished: " + database + " (" + result["status"] + ", " + str(result["seconds_total"]) + " s)")
+      with lock:
+        results[database] = result
+
+  threads = [threading.Thread(target = worker) for i in range(min(args.jobs, len(pending)))]
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+
+  # The results are listed in the order the databases were given
+  summary = [results[database] for database in args.databases]
+  if not os.path.exists(args.output):
+    os.makedirs(args.output)
+  summary_file = os.path.join(args.output, "batch_summary.json")
+  with open(summary_file, 'w') as f:
+    json.dump(summary, f, indent = 2)
+
+  print("")
+  for result in summary:
+    line = result["status"].ljust(8) + str(result["seconds_total"]).rjust(10) + " s  " + result["database"]
+    if result["status"] != "ok":
+      line = line + "  (" + result.get("error", "") + ", see " + result["log"] + ")"
+    print(line)
+  print("Summary: " + summary_file)
+  return summary
+
+
+##################################### 2. Worker #####################################
+
+# The function run_worker opens a Derby database and runs the script on it.
+# The script finds the database in the variable "db". The duration and the
+# files written to the output directory are stored in the result file.
+def run_worker(database, result_file):
+  from org.openlca.core.database import Derby
+  from java.io import File
+
+  result = {"database": database, "status": "ok"}
+  start  = time.time()
+  db     = Derby(File(database))
+  try:
+    result["name"] = db.name
+    scope = {"__name__": "__main__", "__file__": script, "db": db}
+    execfile(script, scope)
+  except Exception as e:
+    result["status"] = "failed"
+    result["error"]  = str(e)
+  finally:
+    db.close()
+  result["seconds"] = round(time.time() - start, 1)
+
+  outputs = []
+  folder  = os.path.join(os.environ["OPENLCA_DATA_DIR"], "Material Intensity")
+  if os.path.isdir(folder):
+    for name in sorted(os.listdir(folder)):
+      outputs.append(os.path.join(folder, name))
+  result["outputs"] = outputs
+
+  with open(result_file, 'w') as f:
+    json.dump(result, f, indent = 2)
+  return result
+
+
+if __name__ == "__main__":
+  if len(sys.argv) == 4 and sys.argv[1] == "--worker":
+    result = run_worker(sys.argv[2], sys.argv[3])
+    sys.exit(0 if result["status"] == "ok" else 1)
+
+  parser = argparse.ArgumentParser(description = "Runs the Material Intensity script for several databases.")
+  parser.add_argument("databases", nargs = "+", help = "directories of the Derby databases")
+  parser.add_argument("--classpath", required = True, help = "class path with the openLCA libraries")
+  parser.add_argument("--jython", default = None, help = "path of jython-standalone.jar, if not in the class path")
+  parser.add_argument("--java", default = "java", help = "java executable")
+  parser.add_argument("--memory", default = "8G", help = "maximum heap size of each worker")
+  parser.add_argument("--jobs", type = int, default = 2, help = "number of databases processed at the same time")
+  parser.add_argument("--output", default = "Material Intensity batch", help = "output directory")
+  summary = run_batch(parser.parse_args())
+  failed  = [result for result in summary if result["status"] != "ok"]
+  sys.exit(1 if len(failed) > 0 else 0)
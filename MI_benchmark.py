@@ -0,0 +1,160 @@
+###################################################################
+### M a t e r i a l   I n t e n s i t y   B e n c h m a r k     ###
+###################################################################
+
+# This script measures how long the stages of MI_ei_3.9.1.py take. It runs the script on the
+# synthetic database of MI_fixture.py, so neither openLCA nor a licensed database is needed.
+# The script is run for each of the given numbers of processes, up to the size of ecoinvent.
+# For each run, a fresh database is generated with the same seed, so that runs of
+# different versions of the script can be compared.
+
+# The duration of a stage is the time from its start until the start of the next stage:
+# flows, scan, overburden, gangue, missing flows, biomass, tillage, compacting,
+# write processes, CF lists, method writing, import and csv.
+# The counters of the stages (processes visited, exchanges scanned, ...) are taken from the
+# report the script writes, so the results also show how much work each stage did.
+# The peak memory of the stages is taken from the report as well. Without Java, it is the peak
+# memory of the benchmark process so far, so it only grows from stage to stage and from run to run.
+
+# Example:
+#   python MI_benchmark.py --processes 1000 5000 21238 --repeat 3 --output benchmark.json
+
+# The output of MI_ei_3.9.1.py is written to a log file in the working directory of the benchmark.
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import MI_fixture
+
+
+##################################### 1. Run #####################################
+
+# The function run_script runs the script once on a new database and returns the duration
+# and the counters of each stage, the number of processes and exchanges and the database operations
+def run_script(processes, seed, work_dir):
+  start = time.time()
+  db    = MI_fixture.generate(processes = processes, seed = seed)
+  generated = time.time() - start
+
+  exchanges = 0
+  for p in db.all(MI_fixture.Process):
+    exchanges = exchanges + len(p.exchanges)
+
+  # Each run writes to an empty data directory
+  data_dir = os.path.join(work_dir, "data")
+  if os.path.exists(data_dir):
+    shutil.rmtree(data_dir)
+  os.makedirs(data_dir)
+  os.environ["OPENLCA_DATA_DIR"] = data_dir
+
+  marks = []
+  def stage(name):
+    marks.append([name, time.time()])
+
+  scope  = {"__name__": "__main__", "__file__": MI_fixture.script, "db": db, "stage_hook": stage}
+  stdout = sys.stdout
+  with open(os.path.join(work_dir, "log.txt"), 'a') as log:
+    sys.stdout = log
+    try:
+      execfile(MI_fixture.script, scope)
+    finally:
+      sys.stdout = stdout
+
+  stages = []
+  for i in range(len(marks) - 1):
+    stages.append([marks[i][0], marks[i + 1][1] - marks[i][1]])
+
+  report = {"stages": []}
+  report_file = os.path.join(data_dir, "Material Intensity", "report_" + db.name + ".json")
+  if os.path.isfile(report_file):
+    with open(report_file, 'r') as f:
+      report = json.load(f)
+
+  return {
+    "processes": len(db.all(MI_fixture.Process)),
+    "exchanges": exchanges,
+    "generate" : generated,
+    "total"    : marks[-1][1] - marks[0][1],
+    "stages"   : stages,
+    "report"   : dict([[s["stage"], s["counts"]] for s in report["stages"]]),
+    "memory"   : dict([[s["stage"], s.get("peak_memory_mb")] for s in report["stages"]]),
+    "counts"   : dict(db.counts)}
+
+# The function run_benchmark runs the script "repeat" times for each number of processes.
+# The fastest run of each stage is reported, because it is disturbed the least by other programs.
+def run_benchmark(sizes, repeat, seed, work_dir):
+  results = []
+  for processes in sizes:
+    runs = []
+    for r in range(repeat):
+      runs.append(run_script(processes, seed, work_dir))
+      print("  " + str(processes) + " processes, run " + str(r + 1) + ": " + str(round(runs[-1]["total"], 2)) + " s")
+
+    best = {}
+    for run in runs:
+      for name, seconds in run["stages"]:
+        best[name] = min(best.get(name, seconds), seconds)
+
+    results.append({
+      "processes": runs[0]["processes"],
+      "exchanges": runs[0]["exchanges"],
+      "generate" : min([run["generate"] for run in runs]),
+      "total"    : min([run["total"] for run in runs]),
+      "stages"   : [[name, best[name]] for name, seconds in runs[0]["stages"]],
+      "report"   : runs[0]["report"],
+      "memory"   : dict([[name, max([run["memory"].get(name) for run in runs])] for name in runs[0]["memory"]]),
+      "counts"   : runs[0]["counts"],
+      "runs"     : runs})
+  return results
+
+
+##################################### 2. Report #####################################
+
+# The function print_report prints one row per stage and one column per number of processes
+def print_report(results):
+  print("")
+  print("stage".ljust(18) + "".join([(str(result["processes"]) + " proc.").rjust(14) for result in results]))
+  print("".ljust(18) + "".join([(str(result["exchanges"]) + " exch.").rjust(14) for result in results]))
+  for i in range(len(results[0]["stages"])):
+    name = results[0]["stages"][i][0]
+    print(name.ljust(18) + "".join([("%.3f s" % result["stages"][i][1]).rjust(14) for result in results]))
+  print("total".ljust(18) + "".join([("%.3f s" % result["total"]).rjust(14) for result in results]))
+  print("(generating)".ljust(18) + "".join([("%.3f s" % result["generate"]).rjust(14) for result in results]))
+
+  print("")
+  print("peak memory".ljust(18) + "".join([(str(result["processes"]) + " proc.").rjust(14) for result in results]))
+  for i in range(len(results[0]["stages"])):
+    name = results[0]["stages"][i][0]
+    print(name.ljust(18) + "".join([(str(result["memory"].get(name)) + " MB").rjust(14) for result in results]))
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description = "Measures the stages of the Material Intensity script on a synthetic database.")
+  parser.add_argument("--processes", type = int, nargs = "+", default = [1000, 5000, MI_fixture.ecoinvent_processes],
+                      help = "numbers of processes of the generated databases")
+  parser.add_argument("--repeat", type = int, default = 1, help = "number of runs for each number of processes")
+  parser.add_argument("--seed", type = int, default = 1, help = "seed of the generated databases")
+  parser.add_argument("--output", default = None, help = "JSON file for the results")
+  parser.add_argument("--work-dir", default = None, help = "directory for the data directory and the log (default: temporary)")
+  args = parser.parse_args()
+
+  MI_fixture.install()
+  work_dir = args.work_dir
+  if work_dir == None:
+    work_dir = tempfile.mkdtemp(prefix = "mi_benchmark_")
+  elif not os.path.exists(work_dir):
+    os.makedirs(work_dir)
+
+  print("Log of the script: " + os.path.join(work_dir, "log.txt"))
+  results = run_benchmark(args.processes, args.repeat, args.seed, work_dir)
+  print_report(results)
+
+  if args.output != None:
+    with open(args.output, 'w') as f:
+      json.dump(results, f, indent = 2)
+    print("Results: " + args.output)
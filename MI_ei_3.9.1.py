@@ -30,22 +30,32 @@
 from org.openlca.jsonld.input import JsonImport
 from org.openlca.jsonld import JsonStoreReader
 from org.openlca.jsonld import ZipStore
-from org.openlca.app.db import Database
 from org.openlca.core.database import Derby
 from java.io import File
 import org.openlca.core.model as model
 from org.openlca.core.database import UnitGroupDao, FlowPropertyDao
 from java.util import UUID
-from org.openlca.app.util import UI
-from org.openlca.app import App
 from org.openlca.core.database import ProcessDao
 from org.openlca.core.database import FlowDao
 from org.openlca.core.database import CategoryDao
 from org.openlca.core.database import FlowPropertyDao
+from org.openlca.core.database import ImpactMethodDao, ImpactCategoryDao
 import csv
+import hashlib
 import json
 import os
-import shutil
+import re
+import time
+import zipfile
+
+# The modules of the openLCA application are only available in its python console.
+# Without them (e.g. when the script is run by MI_batch.py), the database is passed in as "db".
+try:
+  from org.openlca.app.db import Database
+  from org.openlca.app.util import UI
+  from org.openlca.app import App
+except ImportError:
+  Database = None
 
 
 ###############################
@@ -57,28 +67,236 @@ import shutil
 
 analysis = True 
 
+
+###############################
+###   W R I T E   B A C K   ###
+###############################
+
+# Changed processes are not written to the database immediately. Instead, each changed
+# process is written exactly once after all stages are done. This variable defines
+# how many processes are written before the persistence context is flushed and cleared.
+
+write_batch_size = 500
+
+# The processes are written within explicitly managed transactions. This variable defines,
+# when the transaction is committed:
+# "once"  commits all processes at the end, so either all or no processes are changed.
+# "every" commits every commit_every processes.
+# "stage" commits the processes of each stage, i.e. all processes that were first changed
+#         by the overburden stage, then those first changed by the gangue stage, and so on.
+# If writing fails, the transaction is rolled back to the last commit. The stage and the process
+# that were reached are reported. Each process is always written completely, with all its changes.
+
+commit_mode  = "once"
+commit_every = 5000
+
+
+###############################
+### R E A D   B A C K E N D ###
+###############################
+
+# This variable defines, how processes and exchanges are read.
+# "jpa" loads the processes with their complete exchanges, flows and units, page_size processes
+# at a time. After each page, the persistence context is cleared, so that only the facts the
+# stages need are kept and the memory used does not grow with the size of the database.
+# "jdbc" streams the few columns that are needed with plain SQL queries, and loads
+# a process with its exchanges only if it has to be changed.
+
+read_backend = "jpa"
+page_size    = 1000
+
+
+###############################
+### I N C R E M E N T A L   ###
+###############################
+
+# After each run, the facts the stages read from the exchanges of every process are stored
+# next to the LCIA-Method, together with the version and the last change of the process.
+# If this variable is True, the exchanges of processes whose version and last change are the same
+# as after the last run are not read again, their facts are taken from the stored file instead.
+# All stages still run for all processes, so that the values that depend on several processes
+# (e.g. the distribution of gangue and overburden) are always complete.
+# The stored facts are discarded if the flows they are made of changed, or if writing the processes failed.
+# A process that was changed without a new version or last change is not read again.
+# Both read backends skip the exchanges: "jdbc" does not query them, "jpa" still loads the
+# processes, but does not load their exchanges.
+
+incremental = False
+
+
+###############################
+###   E S T I M A T E       ###
+###############################
+
+# In the impact category "ESTIMATE MISSING ABIOTIC", the flags for missing gangue and overburden
+# get a characterization factor from the distribution of all detected gangue and overburden amounts.
+# This variable defines the quantile that is used: 0.5 is the median, 0.25 and 0.75 give
+# a lower and an upper estimate.
+
+missing_quantile = 0.5
+
+
+###############################
+###     T H R E A D S       ###
+###############################
+
+# With the "jdbc" backend, the exchanges are read by several threads. Each thread reads the exchanges
+# of a range of processes with a connection of its own. The results are the same as with a single thread.
+# 0 uses one thread per processor, 1 reads all exchanges on the main thread.
+
+worker_threads = 0
+
+
+###############################
+###     D R Y   R U N       ###
+###############################
+
+# All changes of the processes are first collected in a change plan, which is written to
+# "Material Intensity/plan_<database>.json". The plan is then applied in one go.
+# If this variable is True, only the plan is written. Nothing in the database is changed:
+# the elementary flows that have to be added are only kept in memory, with temporary IDs.
+
+dry_run = False
+
+
+###############################
+### M E T H O D   I M P O R T ###
+###############################
+
+# This variable defines, how the LCIA-Method gets into the database.
+# "zip" writes the method as a JSON-LD zip file and imports this file.
+# "direct" creates the method, its impact categories and factors directly from the
+# characterization factors and stores them within a single transaction. No zip file is written.
+
+method_import = "zip"
+
+
+###############################
+###     R E P O R T         ###
+###############################
+
+# The duration of every stage is recorded together with what the stage did: the processes visited,
+# the exchanges scanned, the exchanges updated and added, the inserts, updates and deletes in the
+# database and the entries of the external data lists that were found (hits) or not (misses).
+# The report is written to "Material Intensity/report_<database>.json", next to the csv files.
+# If report_console is True, a one-line summary of each stage is printed as well.
+# If report is False, nothing is recorded.
+
+report         = True
+report_console = False
+
+
+###############################
+###   P R O G R E S S       ###
+###############################
+
+# During long loops, the progress of the current stage is printed every progress_interval
+# seconds, with the number of processes per second and the estimated remaining time.
+# 0 turns the progress messages off.
+
+# A run can be cancelled by creating the (empty) file "Material Intensity/cancel_<database>"
+# in the openLCA data directory. The script then stops within a second, at the next point
+# where the database is consistent:
+# - Before the processes are written, the processes and the LCIA-Method are not changed.
+# - While the processes are written, the transaction is rolled back to the last commit
+#   (see commit_mode), so no process is changed after it.
+# - Afterwards, all processes are written, but the LCIA-Method is not replaced.
+# Only the elementary flows added at the beginning are kept, because they are needed anyway.
+
+progress_interval = 10
+
+
+###############################
+###       R U L E S         ###
+###############################
+
+# The external data (overburden, gangue, tillage, compacting and crop-residue ratios) is read from
+# a data file for each version of ecoinvent: "rules/ecoinvent_<version>.json" next to this script.
+# The file is selected by the version in the name of the database (e.g. "ei391_cutoff" or
+# "ecoinvent_3.9.1_apos"). If the name contains no known version, the newest file is used.
+# ecoinvent_version (e.g. "3.9.1") selects a file regardless of the name of the database.
+# rules_dir sets the directory of the files. If it is None, the directory "rules" next to this
+# script is used, or "Material Intensity/rules" in the openLCA data directory (e.g. in the python
+# console of openLCA, where the location of the script is not known).
+# Support for a new version of ecoinvent is added with a new data file.
+
+ecoinvent_version = None
+rules_dir         = None
+
 version_check = "All process- and categorynames could be found."
 print("Version Check:")
-print("This Script is compatible with ecoinvent v.3.9.1")
 
 ######################################
 ###      D I R E C T O R Y         ###
 ######################################
 
 # The directory where openLCA stores its databases needs to be found,
-# because the LCIA-Method is later stored in that directory
-
-def search_folder(start_path, target_folder):
+# because the LCIA-Method is later stored in that directory.
+# It is resolved in the following order:
+# 1) the variable data_dir below, if it is set
+# 2) the environment variable OPENLCA_DATA_DIR
+# 3) the directory resolved in a previous run, which is cached in the home directory
+# 4) the default location of openLCA in the home directory
+# 5) the directory containing the open database
+# 6) a search in the home directory, limited to a few levels of subdirectories
+
+data_dir       = None
+target_folder  = 'openLCA-data-1.4'
+search_depth   = 4
+data_dir_cache = os.path.join(os.path.expanduser("~"), ".material_intensity_data_dir")
+
+# The function search_folder searches the target folder below the start path,
+# but not deeper than max_depth levels. Hidden directories are skipped.
+def search_folder(start_path, target_folder, max_depth):
+    start_depth = start_path.rstrip(os.sep).count(os.sep)
     for root, dirs, files in os.walk(start_path):
         if target_folder in dirs:
             return os.path.join(root, target_folder)
+        if root.count(os.sep) - start_depth >= max_depth - 1:
+            del dirs[:]
+        else:
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
 
     return None
 
-start_path    = '/Users'
-target_folder = 'openLCA-data-1.4'
+# The function database_folder returns the data directory that contains the open database
+def database_folder(db):
+    location = db.getFileStorageLocation()
+    if location == None:
+        return None
+    path = location.getAbsolutePath()
+    while os.path.dirname(path) != path:
+        if os.path.basename(path) == target_folder:
+            return path
+        if os.path.basename(path) == "databases":
+            return os.path.dirname(path)
+        path = os.path.dirname(path)
+    return None
 
-mainpath      = search_folder(start_path, target_folder)
+# The function resolve_data_dir returns the data directory of openLCA and caches it for later runs
+def resolve_data_dir(db):
+    if data_dir != None:
+        return data_dir
+    if os.environ.get("OPENLCA_DATA_DIR"):
+        return os.environ.get("OPENLCA_DATA_DIR")
+
+    if os.path.isfile(data_dir_cache):
+        with open(data_dir_cache, 'r') as f:
+            cached = f.read().strip()
+        if os.path.isdir(cached):
+            return cached
+
+    resolved = os.path.join(os.path.expanduser("~"), target_folder)
+    if not os.path.isdir(resolved):
+        resolved = database_folder(db)
+    if resolved == None:
+        resolved = search_folder(os.path.expanduser("~"), target_folder, search_depth)
+    if resolved == None:
+        raise Exception("The openLCA data directory could not be found. Please set data_dir.")
+
+    with open(data_dir_cache, 'w') as f:
+        f.write(resolved)
+    return resolved
 
 ############################
 ### F U N C T I O N S    ###
@@ -169,21 +387,497 @@ def CF_generate(mli, Val, dnames, duuid, dunit, dcatpath):
 # Becausse numpy is not available in the openLCA python console, basic functions as
 # mean or median have to be defined
 
+# The function select_function returns the k-th smallest value of a list (k starts at 0).
+# It uses the quickselect algorithm, which takes linear time on average, instead of sorting the list.
+def select_function(l, k):
+  values = list(l)
+  lo = 0
+  hi = len(values) - 1
+  while lo < hi:
+    pivot = values[(lo + hi) // 2]
+    i = lo
+    j = hi
+    while i <= j:
+      while values[i] < pivot:
+        i = i + 1
+      while values[j] > pivot:
+        j = j - 1
+      if i <= j:
+        values[i], values[j] = values[j], values[i]
+        i = i + 1
+        j = j - 1
+    if k <= j:
+      hi = j
+    elif k >= i:
+      lo = i
+    else:
+      return values[k]
+  return values[k]
+
 def median_function(l):
   
-  n_num = l
-  n = len(n_num)
-  n_num.sort()
+  n = len(l)
   if n % 2 == 0:
-    median1 = n_num[n//2]
-    median2 = n_num[n//2 - 1]
+    median1 = select_function(l, n//2)
+    median2 = select_function(l, n//2 - 1)
     median = (median1 + median2)/2
   else:
-    median = n_num[n//2]
+    median = select_function(l, n//2)
   return median
 
+# The function quantile_function returns the q-quantile of a list (e.g. q = 0.25),
+# interpolating linearly between the two closest values
+def quantile_function(l, q):
+  if q == 0.5:
+    return median_function(l)
+  h     = (len(l) - 1) * q
+  k     = int(h)
+  lower = select_function(l, k)
+  if h == k:
+    return lower
+  upper = select_function(l, k + 1)
+  return lower + (h - k) * (upper - lower)
+
+# Amounts can also be kept in a summary, which counts how often each amount occurs.
+# In contrast to a list, single amounts can be removed again, and two summaries can be
+# merged without losing any information.
+def summary_add(summary, amount, count):
+  summary[amount] = summary.get(amount, 0) + count
+  if summary[amount] == 0:
+    del summary[amount]
+
+def summary_merge(a, b):
+  merged = dict(a)
+  for amount in b:
+    summary_add(merged, amount, b[amount])
+  return merged
+
+def summary_values(summary):
+  values = []
+  for amount in summary:
+    values.extend([amount] * summary[amount])
+  return values
+
 def mean_function(x):
   return sum(x)/len(x)
+
+# The thread pool of Java is used to read the exchanges. If it is not available,
+# they are read on the main thread.
+try:
+  from java.util.concurrent import Executors, TimeUnit
+  from java.lang import Runtime
+except ImportError:
+  Executors = None
+
+def thread_count():
+  if Executors == None:
+    return 1
+  if worker_threads > 0:
+    return worker_threads
+  return Runtime.getRuntime().availableProcessors()
+
+# The function run_parts runs func(i, done, stopped) for each part i on the thread pool and returns the
+# results in the order of the parts. Each part counts the items it has done in done[i], and the main thread
+# reports their sum as progress. If the run is cancelled, stopped is set, and the parts should return.
+def run_parts(func, parts, unit):
+  results = [None] * parts
+  done    = [0] * parts
+  errors  = []
+  stopped = []
+
+  def task(i):
+    def run():
+      try:
+        results[i] = func(i, done, stopped)
+      except Exception as e:
+        errors.append(e)
+    return run
+
+  pool = Executors.newFixedThreadPool(parts)
+  progress_start()
+  try:
+    for i in range(parts):
+      pool.execute(task(i))
+    pool.shutdown()
+    while pool.awaitTermination(1, TimeUnit.SECONDS) == False:
+      progress(sum(done), None, unit)
+  except:
+    stopped.append(True)
+    raise
+  finally:
+    pool.shutdown()
+    pool.awaitTermination(1, TimeUnit.DAYS)
+
+  if len(errors) > 0:
+    raise errors[0]
+  return results
+
+# The function stage is called at the beginning of each stage of the script. It ends the previous
+# stage and starts recording the new one. The first stage of a numbered section also gives the section.
+# A function stage_hook can be passed in (e.g. by MI_benchmark.py). It is called with the name
+# of each stage, and with "end" when the report is finished.
+if "stage_hook" not in globals():
+  stage_hook = None
+
+# The peak memory of each stage is taken from the memory pools of the Java heap, whose peaks
+# are reset at the start of every stage. Without Java, the peak memory of the process so far is used.
+try:
+  from java.lang.management import ManagementFactory, MemoryType
+except ImportError:
+  ManagementFactory = None
+
+def heap_pools():
+  return [pool for pool in ManagementFactory.getMemoryPoolMXBeans() if pool.getType() == MemoryType.HEAP]
+
+def reset_peak_memory():
+  if ManagementFactory != None:
+    for pool in heap_pools():
+      pool.resetPeakUsage()
+
+# The function peak_memory returns the peak memory in MB, or None if it is not known
+def peak_memory():
+  if ManagementFactory != None:
+    return round(sum([pool.getPeakUsage().getUsed() for pool in heap_pools()]) / 1048576.0, 1)
+  try:
+    import resource
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)   # kB on Linux
+  except ImportError:
+    return None
+
+report_stages   = []
+current_stage   = None
+current_section = None
+stage_start     = None
+
+def stage(name, section = None):
+  global current_stage, current_section, stage_start
+  progress_state["stage"]   = name
+  progress_state["printed"] = time.time()
+  check_cancel()
+  if stage_hook != None:
+    stage_hook(name)
+  if report == False:
+    return
+  now = time.time()
+  end_stage(now)
+  if section != None:
+    current_section = section
+  current_stage = {"section": current_section, "stage": name, "seconds": 0, "peak_memory_mb": None, "counts": {}}
+  stage_start   = now
+  report_stages.append(current_stage)
+  reset_peak_memory()
+
+def end_stage(now):
+  if current_stage != None:
+    current_stage["seconds"]        = round(now - stage_start, 3)
+    current_stage["peak_memory_mb"] = peak_memory()
+    if report_console == True:
+      print(stage_summary(current_stage))
+
+# The function count adds n to a counter of the current stage. It is called once per process,
+# list entry or change, but never per exchange, so that recording costs almost nothing.
+# Without a report, there is no current stage and nothing is counted.
+def count(key, n = 1):
+  if current_stage != None:
+    counts      = current_stage["counts"]
+    counts[key] = counts.get(key, 0) + n
+
+# The function stage_summary returns the one-line summary of a stage for the console
+def stage_summary(s):
+  counts = ", ".join([key + " " + str(s["counts"][key]) for key in sorted(s["counts"])])
+  memory = ", " + str(s["peak_memory_mb"]) + " MB" if s["peak_memory_mb"] != None else ""
+  return "Stage " + s["stage"] + ": " + str(s["seconds"]) + " s" + memory + ("  (" + counts + ")" if counts != "" else "")
+
+def report_file():
+  return mainpath + "/Material Intensity/report_" + ei_version + ".json"
+
+# The function finish_report ends the last stage and writes the report. The stages are
+# also summed up for each numbered section.
+def finish_report():
+  if stage_hook != None:
+    stage_hook("end")
+  if report == False:
+    return
+  end_stage(time.time())
+
+  sections = []
+  for s in report_stages:
+    if len(sections) == 0 or sections[-1]["section"] != s["section"]:
+      sections.append({"section": s["section"], "seconds": 0, "peak_memory_mb": None, "counts": {}})
+    sections[-1]["seconds"] = round(sections[-1]["seconds"] + s["seconds"], 3)
+    if s["peak_memory_mb"] != None:
+      sections[-1]["peak_memory_mb"] = max(sections[-1]["peak_memory_mb"], s["peak_memory_mb"])
+    for key in s["counts"]:
+      sections[-1]["counts"][key] = sections[-1]["counts"].get(key, 0) + s["counts"][key]
+
+  if not os.path.exists(os.path.dirname(report_file())):
+    os.makedirs(os.path.dirname(report_file()))
+  with open(report_file(), 'w') as f:
+    json.dump({
+      "database"    : ei_version,
+      "seconds"     : round(time.time() - start_time, 3),
+      "read_backend": read_backend,
+      "incremental" : incremental,
+      "dry_run"     : dry_run,
+      "commit_mode" : commit_mode,
+      "sections"    : sections,
+      "stages"      : report_stages}, f, indent = 2)
+  print("The report can be found in: " + report_file())
+
+# The progress of the current loop (see above). The cancel file is set, once the data directory is known.
+if "progress_hook" not in globals():
+  progress_hook = None
+
+progress_state = {"stage": "", "start": 0, "checked": 0, "printed": 0}
+cancel_path    = None
+
+def progress_start():
+  progress_state["start"] = time.time()
+
+# The function progress is called during a loop with the number of items done and the total number
+# of items (None, if it is not known). At most once a second, it checks whether the run was cancelled.
+# A function progress_hook can be passed in, e.g. to show the progress in a progress monitor.
+# It is called with the stage, the items done, the total, the items per second and the remaining
+# seconds (None, if not known). If it returns True, the run is cancelled.
+def progress(done, total, unit = "processes"):
+  now = time.time()
+  if now - progress_state["checked"] < 1:
+    return
+  progress_state["checked"] = now
+
+  elapsed = now - progress_state["start"]
+  rate    = 0
+  eta     = None
+  if elapsed > 0:
+    rate = done / elapsed
+  if total != None and rate > 0:
+    eta = (total - done) / rate
+  check_cancel(done, total, rate, eta)
+
+  if progress_interval > 0 and now - progress_state["printed"] >= progress_interval:
+    progress_state["printed"] = now
+    message = "  " + progress_state["stage"] + ": " + str(done)
+    if total != None:
+      message = message + " of " + str(total)
+    message = message + " " + unit + ", " + str(int(rate)) + " " + unit + "/s"
+    if eta != None:
+      message = message + ", about " + str(int(eta) + 1) + " s left"
+    print(message)
+
+# The function tracked iterates over the items and reports the progress every 256 items.
+# The total is the number of items, unless it is given (None if it is not known).
+def tracked(items, total = -1, unit = "processes"):
+  if total == -1:
+    total = len(items)
+  progress_start()
+  done = 0
+  for item in items:
+    yield item
+    done = done + 1
+    if done % 256 == 0:
+      progress(done, total, unit)
+
+# The function check_cancel stops the run, if the cancel file exists or the progress hook asks for it
+def check_cancel(done = 0, total = None, rate = 0, eta = None):
+  cancelled = False
+  if progress_hook != None:
+    cancelled = progress_hook(progress_state["stage"], done, total, rate, eta) == True
+  if cancel_path != None and os.path.isfile(cancel_path):
+    cancelled = True
+  if cancelled == True:
+    raise Exception("The run was cancelled in the stage " + progress_state["stage"] + ".")
+
+
+############################
+###      R U L E S       ###
+############################
+
+# The soil compacted and moved by agricultural machinery is calculated from the density of soil
+density_soil = 1.4 /1000 * 100**3 # g/cm^3 -> kg/m^3
+
+# For agricultural processes a simple function is used to estimate the mass of compacted soil
+def compacting(MW):
+  
+  TW = 0.7                 # Assumed tire width: 70 cm
+  CPA = 0.2 * 2.0 * TW       # Compacted area: upper 20 cm * tire width * two tires
+  L = 10000 / MW           # Driven length for cultivating one hectar based on machinery width 
+  res = L*CPA*density_soil # Mass = area * length * density
+  return res
+
+# The compiled rules depend on the formulas above. If a formula changes, these values change
+# and the compiled rules are compiled again.
+rules_formulas = [density_soil, compacting(1), compacting(7.0)]
+
+# The processes of the external data lists below are found by parts of their names.
+# Instead of comparing every list entry with every process name, all entries of a list
+# are compiled into an Aho-Corasick automaton, which finds all entries contained
+# in a process name within a single pass over that name.
+
+# The function build_automaton compiles a list of patterns into an Aho-Corasick automaton
+def build_automaton(patterns):
+  goto = [{}]   # Transitions of each state
+  fail = [0]    # Fallback state of each state
+  out  = [[]]   # Patterns (by index) that end in each state
+
+  for i in range(len(patterns)):
+    state = 0
+    for ch in patterns[i]:
+      if ch not in goto[state]:
+        goto.append({})
+        fail.append(0)
+        out.append([])
+        goto[state][ch] = len(goto) - 1
+      state = goto[state][ch]
+    out[state].append(i)
+
+  # The fallback states are set breadth-first
+  queue = list(goto[0].values())
+  pos = 0
+  while pos < len(queue):
+    state = queue[pos]
+    pos = pos + 1
+    for ch, nxt in goto[state].items():
+      queue.append(nxt)
+      f = fail[state]
+      while f != 0 and ch not in goto[f]:
+        f = fail[f]
+      fail[nxt] = goto[f].get(ch, 0)
+      out[nxt] = out[nxt] + out[fail[nxt]]
+
+  return [goto, fail, out]
+
+# The function match_automaton returns the indices of all patterns contained in a text
+def match_automaton(automaton, text):
+  goto, fail, out = automaton
+  found = set()
+  state = 0
+  for ch in text:
+    while state != 0 and ch not in goto[state]:
+      state = fail[state]
+    state = goto[state].get(ch, 0)
+    if len(out[state]) > 0:
+      found.update(out[state])
+  return found
+
+# The function rules_directory returns the directory of the data files with the rules
+def rules_directory():
+  candidates = [rules_dir]
+  if "__file__" in globals():
+    candidates.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules"))
+  candidates.append(os.path.join(mainpath, "Material Intensity", "rules"))
+  for directory in candidates:
+    if directory != None and os.path.isdir(directory):
+      return directory
+  raise Exception("The rules could not be found. Please set rules_dir.")
+
+# The function rules_files returns the data files with the rules by version of ecoinvent
+def rules_files():
+  files = {}
+  for name in os.listdir(rules_directory()):
+    m = re.match(r"ecoinvent_([0-9.]+)\.json$", name)
+    if m:
+      files[m.group(1)] = os.path.join(rules_directory(), name)
+  if len(files) == 0:
+    raise Exception("No rules were found in " + rules_directory() + ".")
+  return files
+
+# The function rules_version selects the version of the rules for a database.
+# The parts of the version may be separated by ".", "_", "-", " " or nothing (e.g. "ei391").
+def rules_version(files, database_name):
+  if ecoinvent_version != None:
+    if ecoinvent_version not in files:
+      raise Exception("There are no rules for ecoinvent " + ecoinvent_version + ".")
+    return ecoinvent_version
+  versions = sorted(files, key = lambda v: [int(part) for part in v.split(".")])
+  for version in sorted(versions, key = len, reverse = True):
+    pattern = "(?<![0-9])" + "[._ -]?".join(version.split(".")) + "(?![0-9])"
+    if re.search(pattern, database_name):
+      return version
+  print("No rules for the version of the database " + database_name + ", the rules of ecoinvent " + versions[-1] + " are used.")
+  return versions[-1]
+
+# The function rule_amount returns the amount of an entry. Amounts are plain numbers,
+# the rules contain no expressions that would have to be evaluated.
+def rule_amount(entry):
+  amount = entry["amount"]
+  if isinstance(amount, bool) or not isinstance(amount, (int, long, float)):
+    raise Exception("The amount of the rule " + entry["process"] + " (" + entry["location"] + ") is not a number.")
+  return amount
+
+# The function compile_residue_ratios computes the ratio of each crop (the mean of the values
+# from literature, which are kept) and compiles the keywords of all crops into one automaton.
+# Crops with the same precedence would make the ratio of some processes ambiguous.
+def compile_residue_ratios(ratios):
+  crops = []
+  for c in ratios["crops"]:
+    crops.append({"crop": c["crop"], "keywords": c["keywords"], "precedence": c["precedence"],
+                  "values": c["values"], "ratio": mean_function(c["values"])})
+  precedences = [c["precedence"] for c in crops]
+  if len(set(precedences)) != len(precedences):
+    raise Exception("The crops of the crop-residue ratios must have different precedences.")
+
+  keywords      = []
+  keyword_crops = []
+  for i in range(len(crops)):
+    for keyword in crops[i]["keywords"]:
+      keywords.append(keyword)
+      keyword_crops.append(i)
+  return {
+    "average"      : ratios["average"],
+    "forestry"     : ratios["forestry"],
+    "animal"       : ratios["animal"],
+    "crops"        : crops,
+    "keyword_crops": keyword_crops,
+    "automaton"    : build_automaton(keywords)}
+
+# The function compile_rules turns the data file into the tables used by the stages:
+# [process, location, amount] for overburden and gangue, [process, amount] for tillage and
+# compacting and the crop-residue ratios (see above). All process names are compiled
+# into one automaton, which is used to find the processes of all tables in one pass.
+def compile_rules(data, key):
+  compiled = {"key": key, "name": data["name"], "ecoinvent_version": data["ecoinvent_version"],
+              "data_version": data["data_version"]}
+  compiled["overburden"] = [[e["process"], e["location"], rule_amount(e)] for e in data["overburden"]["entries"]]
+  compiled["gangue"]     = [[e["process"], e["location"], rule_amount(e)] for e in data["gangue"]["entries"]]
+  compiled["tillage"]    = [[e["process"], e["depth"] * 10000 * density_soil] for e in data["tillage"]["entries"]]
+  compiled["compacting"] = [[e["process"], compacting(e["machine_width"])] for e in data["compacting"]["entries"]]
+
+  compiled["residue_ratios"] = compile_residue_ratios(data["residue_ratios"])
+
+  patterns = set()
+  for table in ["overburden", "gangue", "tillage", "compacting"]:
+    patterns.update([entry[0] for entry in compiled[table]])
+  compiled["patterns"]  = sorted(patterns)
+  compiled["automaton"] = build_automaton(compiled["patterns"])
+  return compiled
+
+# The function load_rules returns the compiled rules for the database. The compiled rules are
+# stored in "Material Intensity/rules_<version>.compiled.json" and compiled again only
+# if the data file or the formulas changed. Freshly compiled rules are returned as they are
+# read back from that file, so that they are the same as the stored ones (e.g. unicode names).
+def load_rules(database_name):
+  files   = rules_files()
+  version = rules_version(files, database_name)
+  with open(files[version], 'r') as f:
+    content = f.read()
+  key = hashlib.md5(content + repr(rules_formulas)).hexdigest()
+
+  compiled_file = mainpath + "/Material Intensity/rules_" + version + ".compiled.json"
+  if os.path.isfile(compiled_file):
+    try:
+      with open(compiled_file, 'r') as f:
+        compiled = json.load(f)
+      if compiled["key"] == key:
+        return compiled
+    except ValueError:
+      pass
+
+  compiled = compile_rules(json.loads(content), key)
+  if not os.path.exists(os.path.dirname(compiled_file)):
+    os.makedirs(os.path.dirname(compiled_file))
+  with open(compiled_file, 'w') as f:
+    json.dump(compiled, f)
+  return json.loads(json.dumps(compiled))
   
 
 ##################################### 2. Add relevant flows #####################################
@@ -197,9 +891,30 @@ def mean_function(x):
 ###  D B   C O N N E C T I O N      ###
 #######################################
 
-# The connection to the open Database is established
-db         = Database.get()
+stage("flows", "2. Add relevant flows")
+
+# The connection to the open Database is established,
+# unless a database was already passed in (see MI_batch.py)
+start_time = time.time()
+if "db" not in globals():
+  db = Database.get()
 ei_version = db.name
+mainpath   = resolve_data_dir(db)
+
+# A cancel file of an earlier run is removed
+cancel_path = mainpath + "/Material Intensity/cancel_" + ei_version
+if os.path.isfile(cancel_path):
+  os.remove(cancel_path)
+
+# The rules for the version of the database are loaded
+rules           = load_rules(ei_version)
+overburden_list = rules["overburden"]
+gangue_list     = rules["gangue"]
+tillage_list    = rules["tillage"]
+compacting_list = rules["compacting"]
+residue_ratios  = rules["residue_ratios"]
+print("Rules: " + rules["name"] + " for ecoinvent " + rules["ecoinvent_version"]
+      + " (data version " + str(rules["data_version"]) + ")")
 
 
 # Dao objects are set. Those are used to iterate over the respective Model Type (e.g. Processes or Flows etc.)
@@ -212,30 +927,9 @@ dao_m  = ImpactMethodDao(db)
 dao_i  = ImpactCategoryDao(db)
 
 allflows      = dao_f.getAll()
-allprocesses  = dao_p.getAll()
-allmethods    = dao_m.getAll()
-allimpcat     = dao_i.getAll()
-allcategories = dao_c.getAll()
 allunits      = dao_u.getAll()
 allproperties = dao_fp.getAll()
 
-###################################################
-###  D e l e t e  e x i s t i n g   M e t h o d  ##    ###
-###################################################
-
-for meth in allmethods:
-  if meth.name == "Material Intensity":
-    dao_m.delete(meth)
-
-for ic in allimpcat:
-  if ic.category.name == "Material Intensity":
-    dao_i.delete(ic)
-
-for c in allcategories:
-  
-  if c.name == "Material Intensity":
-    dao_c.delete(c)
-
 ######################################################################
 ###  N E C E S S A R Y    U N I T S    A N D   P R O P E R T I E S ###
 ######################################################################
@@ -257,32 +951,101 @@ for prop in allproperties:
 ###  N E C E S S A R Y    F L O W S ###
 #######################################
 
+# All flows are indexed in a flow catalog, which is built in a single pass over all flows.
+# The catalog stores the flows by name, refId, category name and reference flow property. Flows that are inserted later are added to the catalog as well,
+# so that it never has to be rebuilt.
+
+flow_catalog = {
+  "names"      : [],  # Names of the flows in the order they were first found
+  "by_name"    : {},
+  "by_ref_id"  : {},
+  "by_category": {},  # e.g. "in ground"
+  "by_property": {}}  # e.g. "Mass"
+
+# The function catalog_add adds a flow to all indices of the flow catalog
+def catalog_add(f):
+  if f.name not in flow_catalog["by_name"]:
+    flow_catalog["names"].append(f.name)
+  flow_catalog["by_name"].setdefault(f.name, []).append(f)
+  flow_catalog["by_ref_id"][f.refId] = f
+  if f.category != None:
+    flow_catalog["by_category"].setdefault(f.category.name, []).append(f)
+  if f.referenceFlowProperty != None:
+    flow_catalog["by_property"].setdefault(f.referenceFlowProperty.name, []).append(f)
+
+# The function insert_flow adds a new flow to the flow catalog. The new flows are stored
+# together in one transaction by store_new_flows, before their IDs are needed.
+# In a dry run, they are not stored, but get temporary (negative) IDs, which cannot be
+# confused with the IDs of the database.
+new_flows = []
+
+def insert_flow(f):
+  new_flows.append(f)
+  catalog_add(f)
+
+def store_new_flows():
+  if len(new_flows) == 0:
+    return
+  if dry_run == True:
+    for i in range(len(new_flows)):
+      new_flows[i].id = -(i + 1)
+    print(str(len(new_flows)) + " new elementary flows are kept in memory only (dry run)")
+    return
+  em = db.getEntityFactory().createEntityManager()
+  try:
+    em.getTransaction().begin()
+    for f in new_flows:
+      em.persist(f)
+    em.getTransaction().commit()
+  except:
+    if em.getTransaction().isActive():
+      em.getTransaction().rollback()
+    raise
+  finally:
+    em.close()
+  count("dao_inserts", len(new_flows))
+  count("commits")
+
+# The function flows_named returns all flows with the given name
+def flows_named(name):
+  return flow_catalog["by_name"].get(name, [])
+
+# The function flows_with_property returns the refIds of all flows with the given reference flow property.
+# The lists for the impact categories use it, so that the property of each flow is not read again.
+def flows_with_property(name):
+  return set([f.refId for f in flow_catalog["by_property"].get(name, [])])
+
+# The function flows_in_category returns all flows, whose category has the given name
+def flows_in_category(name):
+  return flow_catalog["by_category"].get(name, [])
+
+# The function is_template tells, whether a flow of the given category within the category
+# "Resource" can serve as template for new flows in that category
+def is_template(f, category_name):
+  return (f.category != None and f.category.name == category_name and f.category.category != None
+          and f.category.category.name == "Resource" and f.referenceUnit.name == "kg")
+
 # All necessary flows are set. Gangue already exists and serves as template for
 # flows that are introduced and should be stored in the category "in ground".
-
-allflow_names = []
-
-for f in allflows:
-  allflow_names.append(f.name)
-  if "Gangue" in f.name and "bauxite" not in f.name:
-      gangue_name = f.name
-
-gangue = dao_f.getForName(gangue_name)[0]
-elem_flow_ground = gangue
-
 # An arbitrary flow from the category "biotic" is extracted to serve as template for
-# flows that are introduced and should be stored in the category "biotic resources"
+# flows that are introduced and should be stored in the category "biotic resources".
+# An arbitrary flow from the category "unspecified" is extracted to serve as template for
+# flows that are introduced and should be stored in the category "unspecified".
+# The templates are found in the same pass that builds the catalog.
 
 for f in allflows:
-  if f.category.name == "biotic" and f.category.category.name == "Resource" and f.referenceUnit.name == "kg":
+  catalog_add(f)
+  if "Gangue" in f.name and "bauxite" not in f.name:
+    gangue_name = f.name
+  if is_template(f, "biotic"):
     elem_flow_biotic = f
+  if is_template(f, "unspecified"):
+    elem_flow_unspec = f
 
-# An arbitrary flow from the category "unspecified" is extracted to serve as template for
-# flows that are introduced and should be stored in the category "unspecified"
+count("flows", len(allflows))
 
-for f in allflows:
-  if f.category.name == "unspecified" and f.category.category.name == "Resource" and f.referenceUnit.name == "kg":
-    elem_flow_unspec = f
+gangue = flows_named(gangue_name)[0]
+elem_flow_ground = gangue
 
 
 # The follwing elementary flows are created (if not already present)
@@ -297,241 +1060,898 @@ for f in allflows:
 # - flag missing gangue
 # - flag external data
 
-if "Overburden" in allflow_names:
-  overburden = dao_f.getForName("Overburden")[0]
+if len(flows_named("Overburden")) > 0:
+  overburden = flows_named("Overburden")[0]
 else:
   overburden       = elem_flow_ground.copy()
   overburden.name  = 'Overburden'
   overburden.refId = "8711a380-e9dc-4bbf-be2b-91d243a8e39d"
-  dao_f.insert(overburden)
+  insert_flow(overburden)
 
   
-if "Biomass, used" in allflow_names:
-  biomass_used = dao_f.getForName("Biomass, used")[0]
+if len(flows_named("Biomass, used")) > 0:
+  biomass_used = flows_named("Biomass, used")[0]
 else:
   biomass_used       = elem_flow_biotic.copy()
   biomass_used.name  = 'Biomass, used'
   biomass_used.refId = "9442f771-1473-40d6-8dab-8ffbb94fec1d"
-  dao_f.insert(biomass_used)
+  insert_flow(biomass_used)
 
   
-if "Biomass, unused" in allflow_names:
-  biomass_unused = dao_f.getForName("Biomass, unused")[0]
+if len(flows_named("Biomass, unused")) > 0:
+  biomass_unused = flows_named("Biomass, unused")[0]
 else:
   biomass_unused       = elem_flow_biotic.copy()
   biomass_unused.name  = 'Biomass, unused'
   biomass_unused.refId = "bfb3e97d-cb6b-4f02-867c-e8908601a8f3"
-  dao_f.insert(biomass_unused)
+  insert_flow(biomass_unused)
 
 
-if "Soil, moved" in allflow_names:
-  soilmoved = dao_f.getForName("Soil, moved")[0]
+if len(flows_named("Soil, moved")) > 0:
+  soilmoved = flows_named("Soil, moved")[0]
 else:
   soilmoved       = elem_flow_ground.copy()
   soilmoved.name  = 'Soil, moved'
   soilmoved.refId = "676ab17e-7679-42b1-8095-76fe2340e14b"
-  dao_f.insert(soilmoved)
+  insert_flow(soilmoved)
 
-if "Soil, compacted" in allflow_names:
-  soilcompacted = dao_f.getForName("Soil, compacted")[0]
+if len(flows_named("Soil, compacted")) > 0:
+  soilcompacted = flows_named("Soil, compacted")[0]
 else:
   soilcompacted       = elem_flow_ground.copy()
   soilcompacted.name  = 'Soil, compacted'
   soilcompacted.refId = "1755461b-ad4c-4a02-a7b0-67efe5bc053f"
-  dao_f.insert(soilcompacted)
+  insert_flow(soilcompacted)
 
-if "Soil, erodet" in allflow_names:
-  soilerodet = dao_f.getForName("Soil, erodet")[0]
+if len(flows_named("Soil, erodet")) > 0:
+  soilerodet = flows_named("Soil, erodet")[0]
 else:
   soilerodet       = elem_flow_ground.copy()
   soilerodet.name  = 'Soil, erodet'
   soilerodet.refId = "5cb88e58-b1e2-4b10-a055-c9870eb375e7"
-  dao_f.insert(soilerodet)
+  insert_flow(soilerodet)
 
   
-if "flag missing overburden" in allflow_names:
-  missingoverburden_flow = dao_f.getForName("flag missing overburden")[0]
+if len(flows_named("flag missing overburden")) > 0:
+  missingoverburden_flow = flows_named("flag missing overburden")[0]
 else:
   missingoverburden_flow       = elem_flow_unspec.copy()
   missingoverburden_flow.name  = 'flag missing overburden'
   missingoverburden_flow.refId = "1994dbda-47ff-4dba-9f5b-f28f84b15b30"
-  dao_f.insert(missingoverburden_flow)
+  insert_flow(missingoverburden_flow)
 
-if "flag missing gangue" in allflow_names:
-  missinggangue_flow = dao_f.getForName("flag missing gangue")[0]
+if len(flows_named("flag missing gangue")) > 0:
+  missinggangue_flow = flows_named("flag missing gangue")[0]
 else:
   missinggangue_flow       = elem_flow_unspec.copy()
   missinggangue_flow.name  = 'flag missing gangue'
   missinggangue_flow.refId = "8f27c4a2-a8d2-45e5-b15b-d2af5ef0447e"
-  dao_f.insert(missinggangue_flow)
+  insert_flow(missinggangue_flow)
 
   
-if "flag external data" in allflow_names:
-  external_data_flow = dao_f.getForName("flag external data")[0]
+if len(flows_named("flag external data")) > 0:
+  external_data_flow = flows_named("flag external data")[0]
 else:
   external_data_flow       = elem_flow_unspec.copy()
   external_data_flow.name  = 'flag external data'
   external_data_flow.refId = "db01c0ff-a5ca-454a-8834-0595e7b59814"
-  dao_f.insert(external_data_flow)
+  insert_flow(external_data_flow)
+
+store_new_flows()
+
+
+#######################################
+###  F L O W   I D S                ###
+#######################################
+
+# Comparing flows by name requires loading every flow and its category.
+# Therefore, all flows that are relevant for the following stages are resolved
+# to their database IDs once. The stages then only compare IDs.
+
+# The waste flows indicating overburden are specified
+overburden_waste_flows = ["non-sulfidic overburden, off-site",
+                          "spoil from hard coal mining",
+                          "spoil from lignite mining"]
+
+# The flows that are added or updated by this script. Their exchanges are stored
+# in the fact record, so that they can be updated without iterating the process again.
+tracked_flows = [overburden,
+                 gangue,
+                 external_data_flow,
+                 biomass_used,
+                 biomass_unused,
+                 soilmoved,
+                 soilcompacted,
+                 missingoverburden_flow,
+                 missinggangue_flow]
+
+tracked_ids          = set()  # The flows above
+overburden_waste_ids = set()  # Waste flows indicating overburden
+in_ground_ids        = set()  # Flows of the category "in ground"
+in_ground_mined_ids  = set()  # Flows of the category "in ground", except soil
+energy_ids           = set()  # Energy content of biomass, without its correction
+embankment_ids       = set()  # Transformation from rail/road embankment
+
+# The sets are filled from the flow catalog, which already contains the flows that were just added
+
+for f in tracked_flows:
+  tracked_ids.add(f.id)
+
+for name in overburden_waste_flows:
+  for f in flows_named(name):
+    overburden_waste_ids.add(f.id)
+
+for category_name in flow_catalog["by_category"]:
+  if "in ground" in category_name:
+    for f in flows_in_category(category_name):
+      in_ground_ids.add(f.id)
+      if "Soil," not in f.name:
+        in_ground_mined_ids.add(f.id)
+
+# There is an elementary flow for the correction of energy content which is not intended here.
+for name in flow_catalog["names"]:
+  if "Energy, gross calorific value, in biomass" in name and "correction" not in name:
+    for f in flows_named(name):
+      energy_ids.add(f.id)
+
+for f in flows_named("Transformation, from traffic area, rail/road embankment"):
+  embankment_ids.add(f.id)
+
+
+###########################################
+###  E X C H A N G E   S C A N N E R    ###
+###########################################
+
+# All of the following stages need to know which of the relevant flows a process contains.
+# Instead of iterating the exchanges of all processes once per stage, every process is
+# scanned a single time and the findings are stored in a fact record.
+# The stages take their decisions from these records and keep them up to date
+# whenever they add or change an exchange.
+
+# The function isic_code returns the ISIC code of a category name or "" if it has none.
+# The ISIC code is the part of the name before the colon, e.g. "0710" for "0710:Mining of iron ores".
+def isic_code(name):
+  code = name.split(":")[0]
+  if ":" in name and code.isdigit():
+    return code
+  return ""
+
+# The function division returns the ISIC division (the first two digits of the ISIC code)
+# of the category of a process, e.g. "07" for "0710:Mining of iron ores".
+# The ISIC code is taken from the category index, instead of parsing the name on every call.
+def division(rec):
+  info = category_index.get(rec["category_id"])
+  if info == None:
+    return ""
+  return info["isic"][0:2]
+
+# The amounts of gangue and overburden in the processes of the divisions "05" and "07" are
+# summarized during the scan. Whenever the stages change or add such an exchange, the summary
+# is updated, so that it always reflects the current amounts without another pass.
+# Each scan fills a summary of its own, which is merged into amount_stats only when the scan
+# succeeded. By this, a failed scan that is repeated with JPA does not count any amount twice.
+def new_amount_stats():
+  return {gangue.id: {}, overburden.id: {}}
+
+amount_stats = new_amount_stats()
+
+def count_amount(rec, flow_id, amount, sign, stats):
+  if flow_id in stats:
+    if division(rec) == "07" or division(rec) == "05":
+      summary_add(stats[flow_id], amount, sign)
+
+def merge_amount_stats(stats):
+  for flow_id in amount_stats:
+    amount_stats[flow_id] = summary_merge(amount_stats[flow_id], stats[flow_id])
+
+# The function note_in_ground records, whether a flow of the category "in ground" is present
+def note_in_ground(rec, flow_id):
+  if flow_id in in_ground_ids:
+    rec["isin_ig"] = True
+    if flow_id in in_ground_mined_ids:
+      rec["isin_ig_mined"] = True
+
+# The function new_record creates an empty fact record for a process
+def new_record(process_id, ref_id, version, last_change, name, category, category_id, location, ref_unit):
+  return {
+    "id"             : process_id,
+    "ref_id"         : ref_id,
+    "version"        : version,
+    "last_change"    : last_change,
+    "name"           : name,
+    "category"       : category,
+    "category_id"    : category_id,
+    "location"       : location,
+    "ref_unit"       : ref_unit,
+    "max_internal_id": 0,      # Highest internal ID of the exchanges, used to allocate new IDs
+    "ov_waste"       : 0,      # Sum of the overburden waste flows
+    "isin_ov_waste"  : False,  # Overburden as waste flow
+    "isin_ig"        : False,  # Any flow of the category "in ground"
+    "isin_ig_mined"  : False,  # Any flow of the category "in ground", except soil
+    "isin_energy"    : False,  # Energy content as elementary flow
+    "energy"         : 0,      # Energy content
+    "embankment"     : [],     # Transformation from rail/road embankment (inputs)
+    "exchanges"      : {},     # Exchanges of the tracked flows, stored by flow ID
+    "new_exchanges"  : [],     # Exchanges that were added by this script
+    "changes"        : [],     # Changed exchanges with their flow, old amount and kind of change
+    "changed_ids"    : set()}  # Python ids of the changed exchanges
+
+# The function scan_exchange adds the facts of a single exchange to the record of its process.
+# Both read backends use it, so they lead to the same decisions.
+# The exchange itself (ex) is only needed for tracked flows. The amounts are added to the summary stats.
+def scan_exchange(rec, flow_id, is_input, amount, internal_id, ex, stats):
+  count_amount(rec, flow_id, amount, 1, stats)
+
+  if internal_id > rec["max_internal_id"]:
+    rec["max_internal_id"] = internal_id
+
+  if flow_id in tracked_ids:
+    rec["exchanges"].setdefault(flow_id, []).append(ex)
+
+  # Because one process can have several overburden waste flows, their amounts is cumulated.
+  if flow_id in overburden_waste_ids:
+    rec["ov_waste"]      = rec["ov_waste"] + amount
+    rec["isin_ov_waste"] = True
+
+  note_in_ground(rec, flow_id)
+
+  if flow_id in energy_ids:
+    rec["energy"]      = amount
+    rec["isin_energy"] = True
+
+  if is_input == True:
+    if flow_id in embankment_ids:
+      rec["embankment"].append(amount)
+
+# The function scan_process iterates the exchanges of a process entity once and returns its fact record.
+# The record keeps the exchanges of tracked flows, but not the process itself.
+# If facts of the process are stored from the last run, they are restored and the exchanges,
+# which are loaded only when they are accessed, are not read.
+def scan_process(p, stats, facts):
+  category    = ""
+  category_id = None
+  location    = ""
+  ref_unit    = ""
+  if p.category != None:
+    category    = p.category.name
+    category_id = p.category.id
+  if p.location != None:
+    location = p.location.name
+  if p.quantitativeReference != None:
+    ref_unit = p.quantitativeReference.unit.name
+
+  rec = new_record(p.id, p.refId, p.version, p.lastChange, p.name, category, category_id, location, ref_unit)
+  rec["max_internal_id"] = p.lastInternalId
+  entry = stored_entry(facts, rec)
+  if entry != None:
+    restore_facts(rec, entry, stats)
+    count("processes_restored")
+    return rec
+  for ex in p.exchanges:
+    scan_exchange(rec, ex.flow.id, ex.isInput, ex.amount, ex.internalId, ex, stats)
+  count("exchanges", len(p.exchanges))
+  return rec
+
+# The function process_pages returns the process entities, read in pages of page_size processes
+# ordered by their ID. After each page, the persistence context is cleared, so that the
+# processes of the page can be freed once they are scanned.
+def process_pages():
+  em = db.getEntityFactory().createEntityManager()
+  try:
+    last_id = 0
+    while True:
+      query = em.createQuery("SELECT p FROM Process p WHERE p.id > " + str(last_id) + " ORDER BY p.id", model.Process)
+      query.setMaxResults(page_size)
+      page = query.getResultList()
+      if len(page) == 0:
+        return
+      for p in page:
+        yield p
+      last_id = page[-1].id
+      em.clear()
+  finally:
+    em.close()
+
+# The function jdbc_rows streams the rows of an SQL query as tuples
+def jdbc_rows(con, sql):
+  stmt = con.createStatement()
+  rs   = stmt.executeQuery(sql)
+  cols = range(1, rs.getMetaData().getColumnCount() + 1)
+  try:
+    while rs.next():
+      yield tuple([rs.getObject(i) for i in cols])
+  finally:
+    rs.close()
+    stmt.close()
+
+# The function tracked_exchange returns an (unattached) exchange object of a tracked flow,
+# which carries the ID, direction, amount and internal ID of the exchange, and its unit if it is kg
+def tracked_exchange(ex_id, is_input, amount, internal_id, in_kg):
+  ex            = model.Exchange()
+  ex.id         = ex_id
+  ex.isInput    = is_input
+  ex.amount     = amount
+  ex.internalId = internal_id
+  if in_kg == True:
+    ex.unit     = kg
+  return ex
+
+# The facts of the last run are stored in "Material Intensity/facts_<database>.json".
+# They are only valid for the flows they were made of, therefore a key of these flows is stored with them.
+def facts_file():
+  return mainpath + "/Material Intensity/facts_" + ei_version + ".json"
+
+# The facts that are read from the exchanges of a process, besides the exchanges of tracked flows
+stored_facts = ["max_internal_id", "ov_waste", "isin_ov_waste", "isin_ig", "isin_ig_mined",
+                "isin_energy", "energy", "embankment"]
+
+# The function facts_key identifies the flows the facts of a process are made of
+def facts_key():
+  flow_ids = [tracked_ids, overburden_waste_ids, in_ground_ids, in_ground_mined_ids,
+              energy_ids, embankment_ids, [kg.id]]
+  return hashlib.md5(repr([sorted([str(i) for i in ids]) for ids in flow_ids])).hexdigest()
+
+# The function load_facts returns the stored facts by process ID, or nothing if they
+# are not used or not valid for the current flows
+def load_facts():
+  if incremental == True and os.path.isfile(facts_file()):
+    try:
+      with open(facts_file(), 'r') as f:
+        facts = json.load(f)
+      if facts["flows"] == facts_key():
+        return facts["processes"]
+    except ValueError:
+      pass
+  return {}
+
+# The function save_facts stores the facts of all processes, as they are after the processes were written.
+# A process with an exchange that has no ID yet is left out, so that it is read again in the next run.
+def save_facts():
+  processes = {}
+  for rec in records:
+    exchanges = []
+    for flow_id in rec["exchanges"]:
+      for ex in rec["exchanges"][flow_id]:
+        in_kg = ex.unit != None and ex.unit.id == kg.id
+        exchanges.append([flow_id, ex.id, ex.isInput == True, ex.amount, ex.internalId, in_kg])
+    if len([ex for ex in exchanges if ex[1] == None or ex[1] == 0]) > 0:
+      continue
+    entry = {"version": rec["version"], "last_change": rec["last_change"], "exchanges": exchanges}
+    for key in stored_facts:
+      entry[key] = rec[key]
+    processes[str(rec["id"])] = entry
+  if not os.path.exists(os.path.dirname(facts_file())):
+    os.makedirs(os.path.dirname(facts_file()))
+  with open(facts_file(), 'w') as f:
+    json.dump({"flows": facts_key(), "processes": processes}, f)
+
+# The function remove_facts discards the stored facts, before the processes are written
+def remove_facts():
+  if os.path.isfile(facts_file()):
+    os.remove(facts_file())
+
+# The function stored_entry returns the stored facts of a process, if its version and last change
+# are still the same as in the last run, or None if its exchanges have to be read
+def stored_entry(facts, rec):
+  entry = facts.get(str(rec["id"]))
+  if entry != None and entry["version"] == rec["version"] and entry["last_change"] == rec["last_change"]:
+    return entry
+  return None
+
+# The function restore_facts takes the facts of a process from the stored facts of the last run,
+# instead of reading its exchanges again
+def restore_facts(rec, entry, stats):
+  max_internal_id = rec["max_internal_id"]
+  for key in stored_facts:
+    rec[key] = entry[key]
+  rec["max_internal_id"] = max(max_internal_id, rec["max_internal_id"])
+  for flow_id, ex_id, is_input, amount, internal_id, in_kg in entry["exchanges"]:
+    rec["exchanges"].setdefault(flow_id, []).append(tracked_exchange(ex_id, is_input, amount, internal_id, in_kg))
+    count_amount(rec, flow_id, amount, 1, stats)
+
+# The function exchange_rows streams the exchanges of the processes with the given (sorted) IDs.
+# If the exchanges of all processes within the range of the IDs are needed (complete), they are
+# read with a single query, otherwise with one query per page_size processes.
+def exchange_rows(con, owner_ids, complete):
+  sql = "SELECT f_owner, id, f_flow, is_input, resulting_amount_value, internal_id, f_unit FROM tbl_exchanges"
+  if complete == True:
+    for row in jdbc_rows(con, sql + " WHERE f_owner >= " + str(owner_ids[0]) + " AND f_owner <= " + str(owner_ids[-1])):
+      yield row
+    return
+  for i in range(0, len(owner_ids), page_size):
+    owners = ", ".join([str(owner_id) for owner_id in owner_ids[i:i + page_size]])
+    for row in jdbc_rows(con, sql + " WHERE f_owner IN (" + owners + ")"):
+      yield row
+
+# The function scan_rows adds the exchange rows to the records of their processes. The number of
+# rows is counted in done[i]. If stopped is set, e.g. because another thread failed, it returns.
+def scan_rows(rows, by_id, stats, done, i, stopped):
+  for row in rows:
+    if len(stopped) > 0:
+      return
+    rec = by_id.get(row[0])
+    if rec == None:
+      continue
+    done[i]  = done[i] + 1
+    is_input = row[3] == True or row[3] == 1
+    ex = None
+    if row[2] in tracked_ids:
+      ex = tracked_exchange(row[1], is_input, row[4], row[5] or 0, row[6] == kg.id)
+    scan_exchange(rec, row[2], is_input, row[4], row[5] or 0, ex, stats)
+
+# The function owner_parts splits the sorted process IDs into ranges of about the same size,
+# one for each thread
+def owner_parts(owner_ids, threads):
+  size = (len(owner_ids) + threads - 1) // threads
+  return [owner_ids[i:i + size] for i in range(0, len(owner_ids), size)]
+
+# The function scan_parts reads the exchanges of the parts on the thread pool. Each thread uses a
+# connection of its own and keeps its own summary of gangue and overburden amounts. Because the parts
+# are ranges of process IDs, every record is changed by a single thread only. The summaries are merged
+# in the order of the parts. It returns the merged summary and the number of rows.
+def scan_parts(parts, by_id, complete):
+  def scan_part(i, done, stopped):
+    part_stats = new_amount_stats()
+    con        = db.createConnection()
+    try:
+      scan_rows(exchange_rows(con, parts[i], complete), by_id, part_stats, done, i, stopped)
+    finally:
+      con.close()
+    return [part_stats, done[i]]
+
+  stats   = new_amount_stats()
+  scanned = 0
+  for part_stats, rows in run_parts(scan_part, len(parts), "exchanges"):
+    for flow_id in stats:
+      stats[flow_id] = summary_merge(stats[flow_id], part_stats[flow_id])
+    scanned = scanned + rows
+  return [stats, scanned]
+
+# The function scan_database reads the processes and their exchanges with a few SQL queries
+# and returns the fact records. Only the exchanges of tracked flows are represented
+# by (unattached) exchange objects, which carry the ID, direction and amount.
+# In the incremental mode, the exchanges of processes with the same version and last change
+# as in the last run are not read, their facts are restored instead.
+# The records are returned together with the summary of their gangue and overburden amounts.
+def scan_database(facts):
+  recs    = []
+  by_id   = {}
+  scanned = 0
+  stats   = new_amount_stats()
+  con     = db.createConnection()
+  try:
+    for row in jdbc_rows(con, "SELECT p.id, p.ref_id, p.version, p.last_change, p.name, c.name, l.name, u.name, "
+                              "p.last_internal_id, p.f_category "
+                              "FROM tbl_processes p "
+                              "LEFT JOIN tbl_categories c ON p.f_category = c.id "
+                              "LEFT JOIN tbl_locations l ON p.f_location = l.id "
+                              "LEFT JOIN tbl_exchanges q ON p.f_quantitative_reference = q.id "
+                              "LEFT JOIN tbl_units u ON q.f_unit = u.id"):
+      rec = new_record(row[0], row[1], row[2] or 0, row[3] or 0, row[4], row[5] or "", row[9], row[6] or "", row[7] or "")
+      rec["max_internal_id"] = row[8] or 0
+      recs.append(rec)
+      entry = stored_entry(facts, rec)
+      if entry != None:
+        restore_facts(rec, entry, stats)
+      else:
+        by_id[rec["id"]] = rec
+
+    # The exchanges of the processes that were not restored are read, in parallel if there
+    # are several threads
+    owner_ids = sorted(by_id.keys())
+    complete  = len(by_id) == len(recs)
+    parts     = []
+    if len(owner_ids) > 0:
+      parts = owner_parts(owner_ids, thread_count())
+    if len(parts) > 1:
+      part_stats, scanned = scan_parts(parts, by_id, complete)
+      for flow_id in stats:
+        stats[flow_id] = summary_merge(stats[flow_id], part_stats[flow_id])
+    elif len(parts) == 1:
+      done = [0]
+      scan_rows(tracked(exchange_rows(con, owner_ids, complete), None, "exchanges"), by_id, stats, done, 0, [])
+      scanned = done[0]
+  finally:
+    con.close()
+  count("processes_restored", len(recs) - len(by_id))
+  count("exchanges", scanned)
+  return [recs, stats]
+
+# The function load_process returns the process entity of a record with all changes of the
+# stages applied. Processes are loaded here again, only if they were changed.
+def load_process(rec):
+  p = dao_p.getForId(rec["id"])
+  loaded = {}
+  for ex in p.exchanges:
+    loaded[ex.id] = ex
+  for flow_id in rec["exchanges"]:
+    for ex in rec["exchanges"][flow_id]:
+      if ex.id in loaded:
+        loaded[ex.id].amount = ex.amount
+        if ex.unit != None:
+          loaded[ex.id].unit = ex.unit
+  for ex in rec["new_exchanges"]:
+    p.exchanges.add(ex)
+  if rec["max_internal_id"] > p.lastInternalId:
+    p.lastInternalId = rec["max_internal_id"]
+  return p
+
+# The function note_change remembers the old amount of an exchange, before it is changed
+# for the first time. The kind of change is "insert", "update" or "unit".
+def note_change(rec, ex, flow, old_amount, kind):
+  if id(ex) not in rec["changed_ids"]:
+    rec["changed_ids"].add(id(ex))
+    rec["changes"].append([ex, flow, old_amount, kind])
+
+# The function has_flow tells, whether a tracked flow is present in a process
+def has_flow(rec, flow):
+  return flow.id in rec["exchanges"]
+
+# The function set_amount updates all input exchanges of a tracked flow.
+# It returns False if the process has no such exchange.
+def set_amount(rec, flow, amount):
+  found = False
+  for ex in rec["exchanges"].get(flow.id, []):
+    if ex.isInput == True:
+      note_change(rec, ex, flow, ex.amount, "update")
+      count_amount(rec, flow.id, ex.amount, -1, amount_stats)
+      count_amount(rec, flow.id, amount, 1, amount_stats)
+      count("exchanges_updated")
+      ex.amount = amount
+      found = True
+  return found
+
+# The function next_internal_id hands out a new internal ID for an exchange of a process.
+# The IDs are strictly increasing, starting after the highest ID found by the scan.
+def next_internal_id(rec):
+  rec["max_internal_id"] = rec["max_internal_id"] + 1
+  return rec["max_internal_id"]
+
+# The function add_exchange adds an input exchange of a tracked flow to a process
+def add_exchange(rec, flow, amount):
+  ex                    = model.Exchange()
+  ex.isInput            = True
+  ex.flow               = flow
+  ex.amount             = amount
+  ex.unit               = kg
+  ex.flowPropertyFactor = flow.referenceFactor
+  ex.internalId         = next_internal_id(rec)
+
+  rec["new_exchanges"].append(ex)
+  rec["exchanges"].setdefault(flow.id, []).append(ex)
+  note_change(rec, ex, flow, None, "insert")
+  count("exchanges_added")
+  count_amount(rec, flow.id, amount, 1, amount_stats)
+  note_in_ground(rec, flow.id)
+  return ex
+
+# The function set_or_add updates the input exchanges of a tracked flow
+# or adds one, if the flow is not present yet
+def set_or_add(rec, flow, amount):
+  if set_amount(rec, flow, amount) == False:
+    add_exchange(rec, flow, amount)
+
+# The function mark_dirty is called instead of dao_p.update, whenever a stage changed a process.
+# The process is remembered and written only once by apply_plan. The calls are counted
+# per process, so that the merges saved by writing each process once can be reported.
+dirty_records = []
+
+def mark_dirty(rec):
+  rec["dirty_calls"] = rec.get("dirty_calls", 0) + 1
+  if rec.get("dirty") != True:
+    rec["dirty"] = True
+    rec["stage"] = progress_state["stage"]   # The stage that changed the process first
+    dirty_records.append(rec)
+
+# The function plan_entries returns the change plan of a single process. Updates that
+# do not change the amount are left out.
+# Each entry contains: process refId, flow, old amount, new amount, kind of change
+def plan_entries(rec):
+  entries = []
+  for ex, flow, old_amount, kind in rec["changes"]:
+    if kind == "update" and old_amount == ex.amount:
+      continue
+    if kind == "unit":
+      kind = "update"
+    entries.append([rec["ref_id"], flow.name, old_amount, ex.amount, kind])
+  return entries
+
+# The function build_plan collects the changes of all processes, which were changed by the stages.
+# Only processes with at least one entry in the plan have to be written.
+planned_records = []
+change_plan     = []
+
+def build_plan():
+  for rec in dirty_records:
+    entries = plan_entries(rec)
+    if len(entries) > 0:
+      planned_records.append(rec)
+      change_plan.extend(entries)
+  change_plan.sort()
+  count("processes", len(dirty_records))
+  count("changes", len(change_plan))
+  print("Change plan: " + str(len(change_plan)) + " changes in " + str(len(planned_records)) + " processes, "
+        + str(len(dirty_records) - len(planned_records)) + " processes without changes")
+
+# The plan is written with one change per line, so that the plans of two runs can be compared.
+def plan_file():
+  return mainpath + "/Material Intensity/plan_" + ei_version + ".json"
+
+def write_plan():
+  if not os.path.exists(os.path.dirname(plan_file())):
+    os.makedirs(os.path.dirname(plan_file()))
+  with open(plan_file(), 'w') as f:
+    f.write("[\n")
+    f.write(",\n".join([json.dumps(entry) for entry in change_plan]))
+    f.write("\n]\n")
+
+# The function commit_due tells, whether the processes written so far are committed,
+# before the process of the given record is written
+def commit_due(rec, previous, written):
+  if commit_mode == "every":
+    return written % commit_every == 0
+  if commit_mode == "stage":
+    return previous != None and previous["stage"] != rec["stage"]
+  return False
+
+# The function take_exchange_ids copies the IDs, which the new exchanges got when the processes were
+# written, to the exchanges of the records, so that they can be stored with the facts
+def take_exchange_ids(merged):
+  for rec, p in merged:
+    ids = {}
+    for ex in p.exchanges:
+      ids[ex.internalId] = ex.id
+    for ex in rec["new_exchanges"]:
+      ex.id = ids.get(ex.internalId, ex.id)
+  del merged[:]
+
+# The function write_failure describes, where writing the processes failed. A process fails alone
+# when it is merged. A flush or a commit fails for all processes it sends to the database,
+# i.e. those from first to last (indexes in planned_records).
+def write_failure(step, first, last, committed):
+  recs   = planned_records[first:last + 1]
+  stages = []
+  for rec in recs:
+    if rec["stage"] not in stages:
+      stages.append(rec["stage"])
+  if len(recs) == 1:
+    where = "the process " + recs[0]["name"] + " (" + recs[0]["ref_id"] + "), which was"
+  else:
+    where = "the processes " + str(first + 1) + " to " + str(last + 1) + " of the plan, which were"
+  by = "the stage " if len(stages) == 1 else "the stages "
+  return ("Writing the processes failed at the " + step + " of " + where + " changed first by " + by
+          + ", ".join(stages) + ". " + str(committed) + " of " + str(len(planned_records))
+          + " processes were committed, the others were rolled back.")
+
+# The function apply_plan writes all processes of the plan in batches. The transaction is
+# committed according to commit_mode. If writing fails, the transaction is rolled back to
+# the last commit, and the processes and stages of the failed step are printed.
+def apply_plan():
+  if commit_mode not in ["once", "every", "stage"]:
+    raise Exception("Unknown commit_mode: " + str(commit_mode))
+  remove_facts()
+  em        = db.getEntityFactory().createEntityManager()
+  written   = 0
+  flushed   = 0      # The processes before this index were sent to the database
+  committed = 0
+  previous  = None
+  step      = None   # The step that is running: "merge", "flush" or "commit"
+  merged    = []     # Records and merged processes of the current batch
+  try:
+    em.getTransaction().begin()
+    for rec in tracked(planned_records):
+      if written > committed and commit_due(rec, previous, written):
+        step = "commit"
+        em.getTransaction().commit()
+        count("commits")
+        committed = written
+        flushed   = written
+        take_exchange_ids(merged)
+        em.clear()
+        em.getTransaction().begin()
+      previous = rec
+      step     = "merge"
+      merged.append([rec, em.merge(load_process(rec))])
+      written = written + 1
+      if written % write_batch_size == 0:
+        step = "flush"
+        em.flush()
+        flushed = written
+        take_exchange_ids(merged)
+        em.clear()
+    step = "commit"
+    em.getTransaction().commit()
+    count("commits")
+    committed = written
+    take_exchange_ids(merged)
+  except:
+    if em.getTransaction().isActive():
+      em.getTransaction().rollback()
+    if step == "merge":
+      print(write_failure(step, written, written, committed))
+    elif step != None:
+      print(write_failure(step, flushed, written - 1, committed))
+    raise
+  finally:
+    em.close()
+
+  # Only the repeated merges of the processes that were written are saved merges
+  saved = sum([rec["dirty_calls"] - 1 for rec in planned_records[0:written]])
+  count("dao_updates", written)
+  print("Write back: " + str(written) + " processes written, " + str(saved) + " merges saved")
+  if incremental == True:
+    save_facts()
+
+# The processes found for the patterns of the rules are stored in "Material Intensity/resolution_<database>.json",
+# together with a fingerprint of the refIds, names and locations of all processes. As long as the
+# fingerprint is the same, the processes are taken from the stored refIds, and only patterns that are
+# not stored yet (e.g. after new rules were added) are matched against the names of the processes.
+def resolution_file():
+  return mainpath + "/Material Intensity/resolution_" + ei_version + ".json"
+
+def load_resolution(database):
+  if os.path.isfile(resolution_file()):
+    try:
+      with open(resolution_file(), 'r') as f:
+        resolution = json.load(f)
+      if resolution["database"] == database:
+        return resolution
+    except ValueError:
+      pass
+  return {"database": database, "patterns": {}}
+
+def save_resolution(resolution):
+  if not os.path.exists(os.path.dirname(resolution_file())):
+    os.makedirs(os.path.dirname(resolution_file()))
+  with open(resolution_file(), 'w') as f:
+    json.dump(resolution, f)
+
+# The function names_fingerprint identifies the refIds, names and locations of all processes.
+# Like the hash over the exchanges, it does not depend on the order of the processes.
+def names_fingerprint(records):
+  h = 0
+  for rec in records:
+    h = (h + hash((rec["ref_id"], rec["name"], rec["location"]))) % 2**61
+  return h
+
+# The function index_processes returns the records of the processes matching the patterns
+# of the rules by pattern and location. Market activities are excluded.
+# Patterns that are not stored in the resolution file are matched against the names of all
+# processes in one pass.
+def index_processes(rules):
+  by_ref_id  = dict([[rec["ref_id"], rec] for rec in records])
+  resolution = load_resolution(names_fingerprint(records))
+  index      = {}
+  missing    = []
+  for pattern in rules["patterns"]:
+    index[pattern] = {}
+    if pattern in resolution["patterns"]:
+      for loc, ref_ids in resolution["patterns"][pattern].items():
+        index[pattern][loc] = [by_ref_id[ref_id] for ref_id in ref_ids]
+    else:
+      missing.append(pattern)
+  count("resolution_hits", len(rules["patterns"]) - len(missing))
+  count("resolution_misses", len(missing))
+  if len(missing) == 0:
+    return index
+
+  automaton = rules["automaton"]
+  if len(missing) < len(rules["patterns"]):
+    automaton = build_automaton(missing)
+
+  count("processes", len(records))
+  for rec in tracked(records):
+    if "market" not in rec["name"]:
+      for i in match_automaton(automaton, rec["name"]):
+        index[missing[i]].setdefault(rec["location"], []).append(rec)
+
+  for pattern in missing:
+    resolution["patterns"][pattern] = {}
+    for loc in index[pattern]:
+      resolution["patterns"][pattern][loc] = [rec["ref_id"] for rec in index[pattern][loc]]
+  save_resolution(resolution)
+  return index
+
+# The function lookup_processes returns the records matching a pattern of an index.
+# If a location is given, only processes whose location contains it are returned.
+def lookup_processes(index, pattern, location = None):
+  found = []
+  for loc in index[pattern]:
+    if location == None or location in loc:
+      found.extend(index[pattern][loc])
+  return found
+
+stage("scan")
+
+allcategories = dao_c.getAll()
+
+# The categories are indexed by their ID. For each category, the names of all its parent
+# categories (from the top down) and its ISIC code are stored.
+# By this, category membership can be tested for any depth of the category tree.
+# The index is built before the scan, which takes the ISIC divisions of the processes from it.
+
+category_index = {}
+
+for c in allcategories:
+  ancestors = []
+  parent    = c.category
+  while parent != None:
+    ancestors.insert(0, parent.name)
+    parent = parent.category
+  category_index[c.id] = {
+    "name"     : c.name,
+    "ancestors": ancestors,
+    "isic"     : isic_code(c.name)}
+
+# All processes are scanned once, either with JDBC or as JPA entities.
+# If reading with JDBC fails, the JPA entities are used instead. Only the summary
+# of the scan that succeeded is kept. In the incremental mode, both backends take the facts
+# of unchanged processes from the last run.
+records    = None
+scan_stats = None
+facts      = load_facts()
+
+if read_backend == "jdbc":
+  try:
+    records, scan_stats = scan_database(facts)
+  except Exception as e:
+    print("Reading with JDBC failed, processes are loaded with JPA instead: " + str(e))
+
+if records == None:
+  records    = []
+  scan_stats = new_amount_stats()
+  for p in tracked(process_pages(), None):
+    records.append(scan_process(p, scan_stats, facts))
+
+merge_amount_stats(scan_stats)
+facts = None   # The stored facts are not needed after the scan
+
+count("processes", len(records))
+
+
 
-  
 ##############################
 ###  O V E R B U R D E N   ###
 ##############################
 
+stage("overburden")
+
 # In ecoinvent, Overburden that is not refilled, is partly recorded with 3 different waste flows.
 # However, it is not possible to assign a characterization factor to waste flows.
 # Therefore, the elementary flow "Overburden" is added to each process containing one or more of these waste flows.
 # The amount of overburden is the sum of the amounts of these waste flows.
 
-overburden_processes   = []
-overburden_amounts     = []
+count("processes", len(records))
+for rec in tracked(records):
 
-# The waste flows indicating overburden are specified
-overburden_waste_flows = ["non-sulfidic overburden, off-site",
-                          "spoil from hard coal mining",
-                          "spoil from lignite mining"]
-
-for p in allprocesses:
-  
-  # The booleans isin_x indicate, whether the respective flow is present in a process
-  isin_ov_elem  = False   # overburden as elementar flow
-  isin_ov_waste = False   # overburden as waste flow
-
-  amount = 0
-  
   # Market and treatment activities that deal with waste flows are not mining activities
   # and should therefore not include overburden
-  if "market" not in p.name and "treatment" not in p.name:
-    
-    internalIDs = []
-    for ex in p.exchanges:
-      internalIDs.append(ex.internalId)
-      if ex.flow.name =="Overburden":
-        isin_ov_elem = True
-
-	  # If the process contains one of the waste flows, an exchange for overburden is created.
-      # Because one process can have several overburden waste flows, their amounts is cumulated.
-      if ex.flow.name in overburden_waste_flows:
-        amount                   = amount + ex.amount 
-        ex_ov                    = model.Exchange()
-        ex_ov.isInput            = True
-        ex_ov.flow               = overburden
-        ex_ov.amount             = amount
-        ex_ov.unit               = kg
-        ex_ov.flowPropertyFactor = overburden.referenceFactor 
-
-        isin_ov_waste = True
+  if "market" not in rec["name"] and "treatment" not in rec["name"]:
 
     # If the process contains overburden, its value is updated
-    if isin_ov_elem == True:
-      for ex in p.exchanges:
-        if ex.flow.name == "Overburden":
-          ex.amount = amount
-          dao_p.update(p)
-    
+    if has_flow(rec, overburden) == True:
+      set_amount(rec, overburden, rec["ov_waste"])
+      mark_dirty(rec)
+
     # If the process contains an overburden waste flow, but no overburden elementary flow,
     # the exchange for the overburden elementary flow is added
-    if isin_ov_waste == True:
-      if isin_ov_elem == False:
-        ex_ov.internalId = max(internalIDs)
-        p.exchanges.add(ex_ov)
-        dao_p.update(p)
+    elif rec["isin_ov_waste"] == True:
+      add_exchange(rec, overburden, rec["ov_waste"])
+      mark_dirty(rec)
 
 
 
 # Because not every mining process contains information regarding overburden, 
 # external data was used to fill these gaps. 
-# In the following list the coressponding overburden values are stored.
-# The sources are documented as comments.
+# The overburden values are stored in overburden_list (see Rules).
+# The sources are documented in the data file.
 
-overburden_list = [
-  
-  
-  # TO DO: ilmenite - magnetite mine operation
-  # TO DO: manganese concentrate production
-  
-  #Bauxite
-  ["bauxite mine operation | bauxite","Global", 0.1904762],    # ecoinvent report 10 v.2.1: 1m cap thickness vs. 3 to 7m ore thickness  
-  
-  #Baryte
-  ["barite production | barite","Rest-of-World", 0.09],            # ANDHRA PRADESH MINERAL DEVELOPMENT CORPORATION LIMITEDreport
-  ["barite production | barite","Europe", 0.09],                   # ANDHRA PRADESH MINERAL DEVELOPMENT CORPORATION LIMITEDreport
-  ["barite production | barite","Canada, Qu", 0.09],               # ANDHRA PRADESH MINERAL DEVELOPMENT CORPORATION LIMITEDreport
-  
-  # Iron
-  ["iron ore mine operation, 63% Fe | iron ore, crude ore, 63% Fe","India",1.85],         # ecoinvent report v2.1 report No 10 dataset "Iron ore 46% Fe, at mine" remarks
-  ["iron ore mine operation, 46% Fe | iron ore, crude ore, 46% Fe","Global", 1.85],       # ecoinvent report v2.1 report No 10 dataset "Iron ore 46% Fe, at mine" remarks
-  ["iron ore mine operation and beneficiation | iron ore concentrate","Canada, Qu",1.85], # ecoinvent report v2.1 report No 10 dataset "Iron ore 46% Fe, at mine" remarks
-	
-  #Copper
-  ["gold mine operation and refining | copper, cathode","Sweden",291],                                                  #global database, generic
-  ["platinum group metal mine operation, ore with high palladium content | copper, cathode","Russian Federation", 291], #global database, generic
-  ["copper production, cathode, solvent extraction and electrowinning process | copper, cathode","Global",291],         #global database, generic
-  #Copper concentrate
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","Australia",70],          #global database, country specific
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","Canada",69],             #global database, country specific
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","Chile",121],             #global database, country specific
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","China",75],              #global database, generic
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","Indonesia",109],         #global database, country specific
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","Kazakhstan",60],         #global database, country specific
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","Rest-of-World",75],      #global database, generic
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","Russian Federation",75], #global database, generic
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","United States",309],     #global database, country specific
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","Zambia",264],            #global database, country specific
-  
-  ["gold-silver mine operation and beneficiation | copper concentrate, sulfide ore","Canada, Qu",69], #global database, country specific
-  ["molybdenite mine operation | copper concentrate, sulfide ore","Global",75],                       #global database, generic
-
-  #Gold
-  ["silver-gold mine operation with refinery | gold","Chile",1912966],         #global database, generic
-  ["silver-gold mine operation with refinery | gold","Rest-of-World",1912966], #global database, generic
- 
-  ["gold mine operation and gold production, unrefined | gold, unrefined","South Africa",1912966], #global database, generic
-  ["gold mine operation and gold production, unrefined | gold, unrefined","Rest-of-World",1912966],#global database, generic
-  ["gold mine operation and refining | gold","Sweden",1912966],                                    #global database, generic
-  ["gold-silver mine operation with refinery | gold","Papua New Guinea",200793],                   #global database, country specific
-  ["gold-silver mine operation with refinery | gold","Canada, Qu",253051],                         #global database, country specific
-  ["gold-silver mine operation with refinery | gold","Rest-of-World",1912966],                     #global database, generic
-  ["gold-silver mine operation with refinery | gold","Rest-of-World",1912966],                     #global database, generic
-  ["gold production | gold","Canada",253051],                                                      #global database, country specific
-  ["gold production | gold","Australia",1573988],                                                  #global database, country specific
-  ["gold production | gold","Tanzania, United Republic of",1793320],                               #global database, country specific
-  ["gold production | gold","United States",5093769],                                              #global database, country specific
-
-  #Silver
-  ["gold mine operation and refining | silver","Sweden",30970],                  #global database, generic
-  
-  ["gold-silver mine operation with refinery | silver","Papua New Guinea",30970],#global database, generic
-  ["gold-silver mine operation with refinery | silver","Canada, Qu",27409],      #global database,country specific
-  ["gold-silver mine operation with refinery | silver","Rest-of-World",30970],   #global database, generic
-  
-  ["silver-gold mine operation with refinery | silver","Chile",30970],           #global database, generic
-  ["silver-gold mine operation with refinery | silver","Rest-of-World",30970],   #global database, generic
-  
-  ["silver mine operation with extraction | silver, unrefined","Peru",26580],    #global database,country specific
-
-  #Molybdenite
-  ["copper mine operation and beneficiation, sulfide ore | molybdenite","Canada",1125],              #global database, country specific
-  ["copper mine operation and beneficiation, sulfide ore | molybdenite","Chile",1134],               #global database, generic
-  ["copper mine operation and beneficiation, sulfide ore | molybdenite","China",1134],               #global database, generic
-  ["copper mine operation and beneficiation, sulfide ore | molybdenite","Rest-of-World",1134],       #global database, generic
-  ["copper mine operation and beneficiation, sulfide ore | molybdenite","Russian Federation",1134],  #global database, generic
-  ["copper mine operation and beneficiation, sulfide ore | molybdenite","United States",1134],       #global database, generic
-  
-  ["molybdenite mine operation | molybdenite","Global",1136],                                        #global database, generic
-
-  #Zinc
-  ["gold mine operation and refining | zinc","Sweden",76], #global database, generic
-  #Zinc concentrate
-  ["gold-silver mine operation and beneficiation | zinc concentrate","Canada, Qu",40], #global database, country specific
-  ["silver mine operation with extraction | zinc concentrate","Peru",40]]              #global database, country specific
+# In a next step, the overburden list is iterated and the overburden values are inserted 
+# in the respective processes.
+# All mining processes of all rules are identified based on their names at once.
 
+rule_index = index_processes(rules)
 
-# In a next step, the overburden list is iterated and the overburden values are inserted 
-# in the respective processes
-  
-  
 for mp in overburden_list:
   
   #name, location and amount are extracted from the list
@@ -539,184 +1959,38 @@ for mp in overburden_list:
   location                = mp[1]
   overburden_amount       = mp[2]
 
-  for ap in allprocesses:
-    
-    # All mining processes are identified based on the name in the list.
-    # Market activities are excluded. 
-    if mining_process_name_raw in ap.name:
-      if "market" not in ap.name:
-        mining_processes_name_explicit = ap.name
-
-        
-  mining_processes = dao_p.getForName(mining_processes_name_explicit)
   foundsomething = False    # This boolean is used to print a warning message, if no process could be found
-  for p in mining_processes:
-    
-    
-    if location in p.location.name:
-      foundsomething = True      
-      
-      # The booleans isin_x indicate, whether the respective flow is present in a process
-      isin_ov  = False   # Overburden as elementary flow
-      isin_ext = False   # Flow indicating external data
-
-      # Iterating over exchanges and report whether overburden as elementary flow and 
-      # the flow indicating external data are present. If so, the amount is updated.
-      internalIDs = []
-      for ex in p.exchanges:
-        internalIDs.append(ex.internalId)
-        if ex.isInput == True:
-          if ex.flow.name == overburden.name:
-            ex.amount = overburden_amount
-            dao_p.update(p)
-            isin_ov = True
-            
-          
-          if ex.flow.name == external_data_flow.name:
-            ex.amount = overburden_amount
-            dao_p.update(p)
-            isin_ext = True
-            
-
-      # If overburden is not present, a new exchange is created and added.   
-      if isin_ov == False:
-
-        ex                    = model.Exchange()
-        ex.isInput            = True
-        ex.flow               = overburden
-        ex.amount             = overburden_amount
-        ex.unit               = kg        
-        ex.flowPropertyFactor = overburden.referenceFactor   
-        ex.internalId         = max(internalIDs)
-
-        p.exchanges.add(ex)
-        dao_p.update(p)
-
-      # If the flow indicating external data is not present, a new exchange is created and added.   
-      if isin_ext == False:
-        
-        ex                    = model.Exchange()
-        ex.isInput            = True
-        ex.flow               = external_data_flow
-        ex.amount             = overburden_amount
-        ex.unit               = kg
-        ex.flowPropertyFactor = external_data_flow.referenceFactor
-        #internalIDs.append(max(internalIDs) + 1)
-        ex.internalId         = max(internalIDs)
-        
-        p.exchanges.add(ex)
-        dao_p.update(p)
-      
+  for rec in lookup_processes(rule_index, mining_process_name_raw, location):
+    foundsomething = True
+
+    # If overburden or the flow indicating external data are present, the amount is updated.
+    # If not, a new exchange is created and added.
+    set_or_add(rec, overburden, overburden_amount)
+    set_or_add(rec, external_data_flow, overburden_amount)
+    mark_dirty(rec)
+
   # If no process with the given name and location can be found, a warning message is printed.    
   if foundsomething == False:
     version_check = ""
     print("nothing found for:" + mining_process_name_raw + location)
+    count("rule_misses")
+  else:
+    count("rule_hits")
 
 
 ############################
 ###     G A N G U E      ###
 ############################
 
+stage("gangue")
+
 # Because not every mining process contains information regarding gangue, 
 # external data was used to fill these gaps. 
-# In the following list the coressponding gangue values are stored.
-# The sources given are given as comments.
-
-allprocesses = dao_p.getAll()
+# The gangue values are stored in gangue_list (see Rules).
+# The sources are documented in the data file.
 
-
-gangue_list = [
-  
-  
-  # TO DO: ilmenite - magnetite mine operation
-  # TO DO: manganese concentrate production
-  
-  #Bauxite
-  ["bauxite mine operation | bauxite","Global", 0],    # Bauxite is the mined ore. Therefore gangue is set to 0
-  
-  # Barite
-  ["barite production | barite |","Europe", 0.333],           # ore grade in ecoinvent documentation https://ecoquery.ecoinvent.org/3.9.1/cutoff/dataset/7053/documentation
-  ["barite production | barite |","Rest-of-World",0.333],     # ore grade in ecoinvent documentation https://ecoquery.ecoinvent.org/3.9.1/cutoff/dataset/7053/documentation
-  ["barite production | barite |","Canada, Qu", 0.333],       # ore grade in ecoinvent documentation https://ecoquery.ecoinvent.org/3.9.1/cutoff/dataset/7053/documentation
-  
-  # Iron
-  ["iron ore mine operation and beneficiation | iron ore concentrate |","Canada, Q",46/100 * 0.4995],    # ecoinvent process: iron ore mine operation, 63% Fe
-  ["iron ore mine operation, 46% Fe | iron ore, crude ore, 46% Fe |","Global",46/63 * 0.4995],           # ecoinvent process: iron ore mine operation, 63% Fe
-
-  # Copper
-  ["platinum group metal mine operation, ore with high palladium content | copper, cathode |","Russian Federation", 212.0], # gobal database, country specific
-  ["gold mine operation and refining | copper, cathode |","Sweden",39.0],                                                   # gobal database, country specific
-  ["copper production, cathode, solvent extraction and electrowinning process | copper, cathode","Global",119.0],           # gobal database, generic
-  
-  # Copper concentrate
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","Australia",22.0],         # gobal database, country specific
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","Canada",14.0],            # gobal database, country specific
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","Chile",67.0],             # gobal database, country specific
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","China",75.0],             # gobal database, generic
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","Indonesia",75.0],         # gobal database, generic
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","Kazakhstan",29.0],        # gobal database, country specific
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","Rest-of-World",75.0],     # gobal database, generic
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","Russian Federation",75.0],# gobal database, generic
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","United States",85.0],     # gobal database, country specific
-  ["copper mine operation and beneficiation, sulfide ore | copper concentrate, sulfide ore","Zambia",40.0],            # gobal database, country specific
-  
-  ["molybdenite mine operation | copper concentrate, sulfide ore |","Global",75.0],                      # gobal database, generic
-  ["gold-silver mine operation and beneficiation | copper concentrate, sulfide ore","Canada, Qu",14.0],  # gobal database, country specific
-
-
-  # Gold
-  ["gold mine operation and gold production, unrefined | gold, unrefined","Rest-of-World",511257.0],  # gobal database, generic
-  ["gold mine operation and gold production, unrefined | gold, unrefined","South Africa",34.0],             # gobal database, country specific
-  ["gold mine operation and refining | gold |","Sweden",1000340.0],                                   # gobal database, country specific
-  ["gold production | gold |","Australia",1627.0],                                                    # gobal database, country specific
-  ["gold production | gold |","Canada",520026.0],                                                     # gobal database, country specific
-  ["gold production | gold |","Tanzania, United Republic of",334465.0],                               # gobal database, country specific
-  ["gold production | gold |","United States",509221.0],                                              # gobal database, country specific
-  ["silver-gold mine operation with refinery | gold |","Chile",938750.0],                             # gobal database, country specific
-  ["silver-gold mine operation with refinery | gold |","Rest-of-World",511257.0],                     # gobal database, generic
-  ["gold-silver mine operation with refinery | gold |","Canada, Q",520026.0],                         # gobal database, country specific
-  ["gold-silver mine operation with refinery | gold |","Papua New Guinea",1258757.0],                 # gobal database, country specific
-  ["gold-silver mine operation with refinery | gold |","Rest-of-World",511257.0],                     # gobal database, generic
-
-  # Molybdenum
-  ["molybdenite mine operation | molybdenite |","Global",1414],   # gobal database
-
-  # Silver
-  ["gold-silver mine operation with refinery | silver |","Canada, Q",14185.0],        # gobal database, country specific
-  ["gold-silver mine operation with refinery | silver |","Papua New Guinea",21172.0], # gobal database, country specific
-  ["gold-silver mine operation with refinery | silver |","Rest-of-World",9432.0],     # gobal database, generic
-  
-  ["gold mine operation and refining | silver |","Sweden",16334.0],                 # gobal database, country specific
-  ["silver-gold mine operation with refinery | silver |","Chile",9089.0],           # gobal database, country specific
-  ["silver-gold mine operation with refinery | silver |","Rest-of-World",9432.0],   # gobal database, generic
-
-  # Lead
-  ["gold mine operation and refining | lead","Sweden",31.0],                             # gobal database, generic
-  # Lead concentrate
-  ["gold-silver mine operation and beneficiation | lead concentrate","Canada, Q",10.0],  # gobal database, country specific
-
-  # Zinc
-  ["gold mine operation and refining | zinc","Sweden",11.0],                             # gobal database, country ,specific
-  # Zinc concentrate
-  ["gold-silver mine operation and beneficiation | zinc concentrate","Canada, Q",18.0],  # gobal database, country specific
-
-  # Nickel
-  ["platinum group metal mine operation, ore with high palladium content | nickel, class","Russian Federation",93.0],  # gobal database, country specific
-
-  # Palladium
-  ["platinum group metal mine operation, ore with high palladium content | palladium","Russian Federation",3127297.0], # gobal database, country specific
-
-  # Platinum
-  ["platinum group metal mine operation, ore with high palladium content | platinum","Russian Federation",2534893.0],  # gobal database, country specific
-
-  # Rhodium
-  ["platinum group metal mine operation, ore with high palladium content | rhodium","Russian Federation",28.0],        # gobal database, country specific
-
-  # Uranium
-  ["uranium production, in yellowcake, in-situ leaching | uranium, in yellowcake","Global",8384]]  # gobal database, generic
-
-
-# In a next step, mining processes are updated with the respective value
+# In a next step, mining processes are updated with the respective value.
+# All mining processes were identified based on the name in the list.
 
 
 for mp in gangue_list:
@@ -726,121 +2000,77 @@ for mp in gangue_list:
   location                = mp[1]
   gangue_amount           = mp[2]
 
-  for ap in allprocesses:
-    # All mining processes are identified based on the name in the list.
-    # Market activities are excluded. 
-    if mining_process_name_raw in ap.name:
-      if "market" not in ap.name:
-        mining_processes_name_explicit = ap.name
-
-  # All mining processes are iterated       
-  mining_processes = dao_p.getForName(mining_processes_name_explicit)
+  # All mining processes are iterated
   foundsomething = False             # the variable foundsomething is used to print an error message if no process was found
-  
-  for p in mining_processes:
-    if location in p.location.name:
-      foundsomething = True          
-      
-      # The booleans isin_x indicate, whether the respective flow is present in a process
-      isin_ga  = False  # Gangue as elementary flow
-      isin_ext = False  # Flow indicating external data
-      
-      # The exchanges of the mining process are iterated to identify
-      # 1) the elementary flow for gangue 
-      # 2) the flow that flags external data
-      internalIDs = []
-      for ex in p.exchanges:
-        internalIDs.append(ex.internalId)
-        if ex.isInput == True:
-          
-          # If gangue is present, its amount updated
-          if ex.flow.name == gangue.name:
-            ex.amount = gangue_amount
-            dao_p.update(p)
-            isin_ga = True
-
-          # If the flow that flags external data is present, its amount updated
-          if ex.flow.name == external_data_flow.name:
-            ex.amount = gangue_amount
-            dao_p.update(p)
-            isin_ext = True
-            
-      # If gangue is not present, it is added  
-      if isin_ga == False:
-        
-        ex                    = model.Exchange()
-        ex.isInput            = True
-        ex.flow               = gangue
-        ex.amount             = gangue_amount
-        ex.unit               = kg
-        ex.flowPropertyFactor = gangue.referenceFactor
-        ex.internalId         = max(internalIDs)
-        
-        p.exchanges.add(ex)
-        dao_p.update(p)
 
-      # If the flow that flags external data is not present, it is added 
-      if isin_ext == False:
-        
-        ex                    = model.Exchange()
-        ex.isInput            = True
-        ex.flow               = external_data_flow
-        ex.amount             = gangue_amount
-        ex.unit               = kg
-        ex.flowPropertyFactor = gangue.referenceFactor
-        ex.internalId         = max(internalIDs)
-        
-        p.exchanges.add(ex)
-        dao_p.update(p)
+  for rec in lookup_processes(rule_index, mining_process_name_raw, location):
+    foundsomething = True
+
+    # If gangue or the flow that flags external data are present, their amount is updated.
+    # If not, they are added.
+    set_or_add(rec, gangue, gangue_amount)
+    set_or_add(rec, external_data_flow, gangue_amount)
+    mark_dirty(rec)
 
   # If no process with the given name and location can be found, a warning message is printed.    
   if foundsomething == False:
     version_check = ""
     print("nothing found for:" + mining_process_name_raw + location)
+    count("rule_misses")
+  else:
+    count("rule_hits")
 
       
 ####################################
 ### M I S S I N G   F L O W S    ###
 ####################################
+
+stage("missing flows")
         
 # Not all mining processes contain flows for overburden and gangue.
 # In order to estimate the extent of this this 
 # data gap, these processes are flagged with special elementary flows
   
-allprocesses  = dao_p.getAll()
-allcategories = dao_c.getAll()
+# The function categories_under returns the IDs of all categories below one of the given categories.
+# If with_self is True, the given categories themselves are included.
+def categories_under(names, with_self):
+  names = set(names)
+  ids   = set()
+  for category_id in category_index:
+    info  = category_index[category_id]
+    chain = info["ancestors"]
+    if with_self == True:
+      chain = chain + [info["name"]]
+    for name in chain:
+      if name in names:
+        ids.add(category_id)
+        break
+  return ids
+
+# The records are also indexed by their category. The stages that only deal with the processes
+# of some categories (crops, forestry, logging) only visit these candidates.
+# The index is built from the records of the scan, which reads all processes for the other stages anyway,
+# so the candidates need no queries of their own.
+# The stages that depend on flows that can occur in any process (overburden waste flows,
+# missing flows, energy content and unused biomass) visit all processes.
+records_by_category = {}
+for rec in records:
+  records_by_category.setdefault(rec["category_id"], []).append(rec)
+
+# The function candidate_records returns the records within the given categories
+def candidate_records(category_ids):
+  found = []
+  for category_id in sorted(set(category_ids) & set(records_by_category)):
+    found.extend(records_by_category[category_id])
+  return found
 
 # Only mining processes should contain gangue and overburden flows.
-# Therefore, onley processes within mining categories are scrutinized
-
-mining_cat_parents = []
-
-# The mining categories are identified
-for c in allcategories:
-  if c.name in ["05:Mining of coal and lignite","07:Mining of metal ores","08:Other mining and quarrying"]:
-    mining_cat_parents.append(c)
+# Therefore, onley processes within mining categories are scrutinized.
+# These are all categories below the following mining categories, at any depth.
 
-    
-children_list_glob= []
-
-# The function "children" yields the subcategories of a given category and
-# stores all subcategories within a global list ("children_list_glob")
-def children(parent):
-  children_list = []
-  if len(parent.childCategories)>0:
-    for child in parent.childCategories:
-      children_list.append(child)
-      children_list_glob.append(child.name)
-  return children_list
-
-# The function "children" is deployed on two levels of categories:
-# 1) The mining categories (mining_cat_parents)
-# 2) The first subcategories of these mining categories
-# By this, all three sublevels of mining categories are added to the global list
-for par in mining_cat_parents:
-  childs = children(par)
-  for gc in childs:
-    children(gc)
+mining_category_ids = categories_under(["05:Mining of coal and lignite",
+                                        "07:Mining of metal ores",
+                                        "08:Other mining and quarrying"], False)
 
 
 # The lists missing_x will later contain the names of processes that lack
@@ -859,89 +2089,64 @@ missing_gangue     = []
 missing_outside    = []
   
 
-# The processes within mining categories are iterated
-for p in allprocesses:
-  if p.category.name in children_list_glob:
-
-    # The booleans isin_x indicate, whether the respective flow is present in a process
-    isin_ig = False # Any flow of the category "in ground"
-    isin_ga = False # Gangue as elementary flow
-    isin_ov = False # Overburden as elementary flow
+# The function missing_flows finds out, what is missing in a process.
+# It returns three values: gangue is missing, overburden is missing, and
+# the process is a system process outside of the mining categories with missing flows.
+def missing_flows(rec):
+  lacks_gangue     = False
+  lacks_overburden = False
+  lacks_outside    = False
 
-    # The exchanges of the mining process are iterated to identify
-    # 2) Any flow of the category "in ground"
-    # 2) the elementary flow for gangue 
-    # 3) the elementary flow for overburden
-    internalIDs = []
-    for ex in p.exchanges:
-      internalIDs.append(ex.internalId)
-      if "in ground" in ex.flow.category.name:
-        isin_ig = True
-      if ex.flow.name == gangue.name:
-        isin_ga = True
-      if ex.flow.name == overburden.name:
-        isin_ov = True
+  # The processes within mining categories are checked
+  if rec["category_id"] in mining_category_ids:
 
     # Only if the process contains elementary flows of the category "in ground",
-    # it should also contain gangue and overburden. E.g. market processes 
+    # it should also contain gangue and overburden. E.g. market processes
     # or processes for imports should not contain these elementary flows.
-    if isin_ig == True:
-      if isin_ga ==False:
-        if "07" in p.category.name:
-          missing_gangue.append(p.name) # The list containing process names is updated
-          
-          # If the flag for missing gangue is not present, it is added (with a value of 1)
-          ex                    = model.Exchange()
-          ex.isInput            = True
-          ex.flow               = missinggangue_flow
-          ex.amount             = 1
-          ex.unit               = kg
-          ex.flowPropertyFactor = missinggangue_flow.referenceFactor
-          ex.internalId         = max(internalIDs)
-          
-          p.exchanges.add(ex)
-          dao_p.update(p)
-          
-      if isin_ov ==False:
+    if rec["isin_ig"] == True:
+      if has_flow(rec, gangue) == False:
+        if division(rec) == "07":
+          lacks_gangue = True
+
+      if has_flow(rec, overburden) == False:
         # In category "05:Mining of coal and lignite" overburden plays a role, but gangue is not nessecary for coal and lignite
-        if "05" in p.category.name or "07" in p.category.name:
-          missing_overburden.append(p.name) # The list containing process names is updated
-          
-          # If the flag for missing overburden is not present, it is added (with a value of 1)
-          ex                    = model.Exchange()
-          ex.isInput            = True
-          ex.flow               = missingoverburden_flow
-          ex.amount             = 1
-          ex.unit               = kg
-          ex.flowPropertyFactor = missingoverburden_flow.referenceFactor
-          ex.internalId         = max(internalIDs)
-          
-          p.exchanges.add(ex)
-          dao_p.update(p)
-  
-  # The system processes that are not part of the mining categories are addressed
-  if p.category.name not in children_list_glob:
+        if division(rec) == "05" or division(rec) == "07":
+          lacks_overburden = True
 
-    isin_ig = False
-    isin_ga = False
-    isin_ov = False
+  # The system processes that are not part of the mining categories are addressed.
+  # If material is extracted as part of the system process, it should contain
+  # an elementary flow of the category "in ground"
+  if rec["category_id"] not in mining_category_ids:
 
-    # If material is extracted as part of the system process, it should contain
-    # an elementary flow of the category "in ground"
-    for ex in p.exchanges:
-      if "in ground" in ex.flow.category.name:
-        if "Soil," not in ex.flow.name:
-          isin_ig = True
-      if ex.flow.name == gangue.name:
-        isin_ga = True
-      if ex.flow.name == overburden.name:
-        isin_ov = True
-
-    if isin_ig == True:
+    if rec["isin_ig_mined"] == True:
       # If either gangue or overburden is missing for one of the system processes
       # that are not within the mining categories, their names are stored
-      if isin_ga == False or isin_ov == False:
-        missing_outside.append(p.name) # The list containing process names is updated
+      if has_flow(rec, gangue) == False or has_flow(rec, overburden) == False:
+        lacks_outside = True
+
+  return [lacks_gangue, lacks_overburden, lacks_outside]
+
+# All processes are checked, then the flags are added one process after the other
+missing = [missing_flows(rec) for rec in tracked(records)]
+count("processes", len(records))
+
+for rec, (lacks_gangue, lacks_overburden, lacks_outside) in zip(records, missing):
+  if lacks_gangue == True:
+    missing_gangue.append(rec["name"]) # The list containing process names is updated
+
+    # If the flag for missing gangue is not present, it is added (with a value of 1)
+    set_or_add(rec, missinggangue_flow, 1)
+    mark_dirty(rec)
+
+  if lacks_overburden == True:
+    missing_overburden.append(rec["name"]) # The list containing process names is updated
+
+    # If the flag for missing overburden is not present, it is added (with a value of 1)
+    set_or_add(rec, missingoverburden_flow, 1)
+    mark_dirty(rec)
+
+  if lacks_outside == True:
+    missing_outside.append(rec["name"]) # The list containing process names is updated
 
 
 missing_overburden = list(set(missing_overburden))
@@ -953,6 +2158,8 @@ missing_outside    = list(set(missing_outside))
 ### B I O T I C   R E S O U R C E S ###
 #######################################
 
+stage("biomass")
+
 ### Used Biomass ###
 
 # The amount of used biomass in estimated in three different ways.
@@ -1000,119 +2207,79 @@ animal_categories_list = [
   
 ]
 
+# The IDs of these categories and all categories below them are stored in sets
+agriculture_category_ids = categories_under(agriculture_categories_list, True)
+forestry_category_ids    = categories_under(forestry_categories_list, True)
+animal_category_ids      = categories_under(animal_categories_list, True)
+
 # Version Check #
 
-for i in agriculture_categories_list + forestry_categories_list + animal_categories_list:
-  foundsomething = False
-  for c in allcategories:
-    if i in c.name:
-      foundsomething = True
-  if foundsomething == False:
-    version_check = ""
-    print("nothing found for category: " + i)
+category_names = set([category_index[category_id]["name"] for category_id in category_index])
+
+for i in sorted(set(agriculture_categories_list + forestry_categories_list + animal_categories_list) - category_names):
+  version_check = ""
+  print("nothing found for category: " + i)
+  count("rule_misses")
+
+count("rule_hits", len(set(agriculture_categories_list + forestry_categories_list + animal_categories_list) & category_names))
   
   
 
+# The amounts of biomass are calculated for the given processes first. The function
+# apply_amounts then updates the flow if present, and adds it if not, one process after the other.
+# Processes without an amount (None) are not changed.
+def apply_amounts(flow, recs, amounts):
+  count("processes", len(recs))
+  for rec, amount in zip(recs, amounts):
+    if amount != None:
+      set_or_add(rec, flow, amount)
+      mark_dirty(rec)
+
 # Argriculture
 # ------------
 
-# All processes are iterated, and those within crop categories are identified 
-for p in allprocesses:
-  if p.category.name in agriculture_categories_list:
+# The processes within crop categories are iterated
+def crop_biomass(rec):
+  if rec["category_id"] in agriculture_category_ids:
     # Market processes are excluded
-    if "market" not in p.name:
-      
-      # The booleans isin_x indicate, whether the respective flow is present in a process
-      isin_biomass = False # Biomass as elementary flow
-      
-      internalIDs = []
-      for ex in p.exchanges:
-        internalIDs.append(ex.internalId)
-        if "Biomass, used" in ex.flow.name:
-          isin_biomass = True
-
-      # If the quantitative reference is kg and biomass is not present, it is added    
-      if p.quantitativeReference.unit.name == "kg" and isin_biomass == False:
-        ex_used                    = model.Exchange()
-        ex_used.isInput            = True
-        ex_used.flow               = biomass_used
-        ex_used.amount             = 1
-        ex_used.unit               = kg
-        ex_used.flowPropertyFactor = biomass_used.referenceFactor
-        ex_used.internalId         = max(internalIDs)
-        
-        p.exchanges.add(ex_used)
-        dao_p.update(p)
-      
-      # If the quantitative reference is kg and biomass is present, it is updated    
-      if p.quantitativeReference.unit.name == "kg" and isin_biomass == True:
-        for ex in p.exchanges:
-          if ex.isInput == True:
-            if ex.flow.name == biomass_used.name:
-              ex.amount = 1
-              dao_p.update(p)
-      
-      
-      
+    if "market" not in rec["name"]:
+
+      # If the quantitative reference is kg, the used biomass is 1
+      if rec["ref_unit"] == "kg":
+        return 1
+  return None
+
+crop_records = candidate_records(agriculture_category_ids)
+apply_amounts(biomass_used, crop_records, [crop_biomass(rec) for rec in tracked(crop_records)])
+
+
+
 # Forestry
 #---------
 
-# All processes are iterated, and those within crop categories are identified 
-for p in allprocesses:
-  
-  if p.category.name in forestry_categories_list:
-    
-    # The booleans isin_x indicate, whether the respective flow is present in a process
-    isin_energy  = False  # Energy content as elementary flow
-    isin_biomass = False  # Used Biomass as elementary flow
-    
+# The processes within forestry categories are iterated
+def wood_biomass(rec):
+
+  if rec["category_id"] in forestry_category_ids:
+
     # The inverse energy density is used (source: ecoinvent report 9 Wood fuel construction)
-    mass_per_energy = 1.0/15.5  
-    
-    if "hardwood" in p.name:
-      mass_per_energy = 1.0/15.0 
-    if "softwood" in p.name:
-      mass_per_energy = 1.0/15.7 
-    
-    internalIDs = []  
-    for ex in p.exchanges:
-      internalIDs.append(ex.internalId)
-      # Identify, whether used biomass elementary flow is present or not 
-      if "Biomass, used" in ex.flow.name:
-        isin_biomass = True
-      
-      # Identify, whether used biomass elementary flow is present or not 
-      # There is an elementary flow for the correction of energy content which is not intended here.
-      if "Energy, gross calorific value, in biomass" in ex.flow.name:
-        if "correction" not in ex.flow.name:
-          energy_amount = ex.amount
-          isin_energy = True
-    
-    # If the energy content is present but used biomass is not, it is added.
-    # The amount is the product of the inverse energy density and the energy content.
-    if isin_energy == True and isin_biomass == False:
-
-      ex_used                    = model.Exchange()
-      ex_used.isInput            = True
-      ex_used.flow               = biomass_used
-      ex_used.amount             = mass_per_energy * energy_amount
-      ex_used.unit               = kg
-      ex_used.flowPropertyFactor = biomass_used.referenceFactor
-      ex_used.internalId         = max(internalIDs)
-      
-      p.exchanges.add(ex_used)
-      dao_p.update(p)
-    
-    # If the energy content is given and biomass is  present, it is updated.
-    # The amount is the product of the inverse energy density and the energy content.  
-    if isin_energy == True and isin_biomass == True:
-      for ex in p.exchanges:
-        if ex.isInput == True:
-          if ex.flow.name == biomass_used.name:
-            ex.amount = mass_per_energy * energy_amount
-            dao_p.update(p)
+    mass_per_energy = 1.0/15.5
+
+    if "hardwood" in rec["name"]:
+      mass_per_energy = 1.0/15.0
+    if "softwood" in rec["name"]:
+      mass_per_energy = 1.0/15.7
+
+    # If the energy content is present, the used biomass is
+    # the product of the inverse energy density and the energy content.
+    if rec["isin_energy"] == True:
+      return mass_per_energy * rec["energy"]
+  return None
+
+wood_records = candidate_records(forestry_category_ids)
+apply_amounts(biomass_used, wood_records, [wood_biomass(rec) for rec in tracked(wood_records)])
+
 
-          
 # Rest
 #-----
 
@@ -1122,377 +2289,173 @@ for p in allprocesses:
 # The inverse energy density is used (source: XXX)
 mass_per_energy_average = 1.0/19.0
 
-for p in allprocesses:
-  
-  # The booleans isin_x indicate, whether the respective flow is present in a process
-  isin_energy  = False  # Energy content as elementary flow
-  isin_biomass = False  # Used Biomass as elementary flow
-  
-  internalIDs = []
-  for ex in p.exchanges:
-    internalIDs.append(ex.internalId)
-    
-	# Identify, whether used biomass elementary flow is present or not 
-    if "Biomass, used" in ex.flow.name:
-      isin_biomass = True
-    
-    # Identify, whether used biomass elementary flow is present or not 
-    # There is an elementary flow for the correction of energy content which is not intended here.
-    if "Energy, gross calorific value, in biomass" in ex.flow.name:
-      if "correction" not in ex.flow.name:
-        energy_amount = ex.amount
-        isin_energy = True
-
-  # If the energy content is present but used biomass is not, it is added.
-  # The amount is the product of the inverse energy density and the energy content.    
-  if isin_energy == True and isin_biomass == False:
-    
-    ex_used                    = model.Exchange()
-    ex_used.isInput            = True
-    ex_used.flow               = biomass_used
-    ex_used.amount             = mass_per_energy_average * energy_amount
-    ex_used.unit               = kg
-    ex_used.flowPropertyFactor = biomass_used.referenceFactor
-    ex.internalId              = max(internalIDs)
-    
-    p.exchanges.add(ex_used)
-    dao_p.update(p)
+def other_biomass(rec):
+
+  # If the energy content is present, the used biomass is
+  # the product of the inverse energy density and the energy content.
+  if rec["isin_energy"] == True:
+    return mass_per_energy_average * rec["energy"]
+  return None
+
+apply_amounts(biomass_used, records, [other_biomass(rec) for rec in tracked(records)])
 
-  # If the energy content is given and biomass is  present, it is updated.
-  # The amount is the product of the inverse energy density and the energy content.  
-  if isin_energy == True and isin_biomass == True:
-    for ex in p.exchanges:
-      if ex.isInput == True:
-        if ex.flow.name == biomass_used.name:
-          ex.amount = mass_per_energy_average * energy_amount
-          dao_p.update(p)
-    
 
-### Unused Biomass ###            
+### Unused Biomass ###
 
 # The amount of unused biomass is estimated based on the used biomass and
 # specific or average crop-residue ratios
 
 
-for p in allprocesses:
-  
-  # The booleans isin_x indicate, whether the respective flow is present in a process
-  isin_biomass_used   = False  # Used biomass as elementary flow
-  isin_biomass_unused = False  # Unused biomass as elementary flow
-  
-  internalIDs = []
-  for ex in p.exchanges:
-    internalIDs.append(ex.internalId)
-    
-    # Identify, whether used biomass elementary flow is present or not 
-    # If so, the amount is stored
-    if "Biomass, used" in ex.flow.name:
-      isin_biomass_used   = True
-      biomass_used_amount = ex.amount
-
-    # Identify, whether unused biomass elementary flow is present or not 
-    if "Biomass, unused" in ex.flow.name:
-      isin_biomass_unused = True
-  
-    
-  # Average crop-residue ratio is defined
-  residue_ratio = 1
-    
-  # Specific crop-residue ratios are defined - depending on process categories and names
-  # Sources can be founde in the corresponding manuscript
-  if p.category.name in agriculture_categories_list:
-    if "wheat" in p.name:
-      residue_ratio = mean_function([1.3,1.2,1.34,1.75,0.6,1,
-                                      1.7,1.7,1.6,0.8,1.7,
-                                      1.3,1.3,1.5,0.9,1.3])   
-    if "barley" in p.name:
-      residue_ratio = mean_function([1.3,1.5,1,1.75,1,1.24,1.2,1])
-    if "rye" in p.name:
-      residue_ratio = mean_function([1.75,1.7])
-    if "maize" in p.name or "corn" in p.name:
-      residue_ratio = mean_function([1,1,0.9,2,1.3,1,0.7,1,1,1])
-    if "sunflower" in p.name:
-      residue_ratio = mean_function([1.5,2.6,1.4,])
-    if "rape" in p.name:
-      residue_ratio = mean_function([1.1,1.7,1.7])
-    if "rice" in p.name:
-      residue_ratio = mean_function([1.76,1])
-      
-    
-  if p.category.name in forestry_categories_list:
-    residue_ratio = 6.0 / 4.0                      # Source: https://wgbis.ces.iisc.ac.in/energy/HC270799/RWEDP/acrobat/p_residues.pdf
-      
-  if p.category.name in animal_categories_list:
-    residue_ratio = 0                              # Assumption: If animals graze, there are no residues
-    
-    
-  # If used biomass is present, and unused biomass is not, the latter is added
-  if isin_biomass_used == True and isin_biomass_unused == False:
-    
-    ex_unused                    = model.Exchange()
-    ex_unused.isInput            = True
-    ex_unused.flow               = biomass_unused
-    ex_unused.amount             = biomass_used_amount * residue_ratio
-    ex_unused.unit               = kg
-    ex_unused.flowPropertyFactor = biomass_unused.referenceFactor
-    ex_unused.internalId         = max(internalIDs)
-    
-    p.exchanges.add(ex_unused)
-    dao_p.update(p)    
-      
-  # If used and unused biomass is present, the latter is updated.
-  if isin_energy == True and isin_biomass == True:
-    for ex in p.exchanges:
-      if ex.isInput == True:
-        if ex.flow.name == biomass_unused.name:
-          ex.amount = biomass_used_amount * residue_ratio
-          dao_p.update(p)       
+# The function residue_crop returns the crop of a process name, found with a single pass
+# over the name. If the keywords of several crops are found, the one with the highest precedence is used.
+def residue_crop(name):
+  crop = None
+  for i in match_automaton(residue_ratios["automaton"], name):
+    found = residue_ratios["crops"][residue_ratios["keyword_crops"][i]]
+    if crop == None or found["precedence"] > crop["precedence"]:
+      crop = found
+  return crop
 
-          
-############################
-### T I L L A G E        ###
-############################
+def unused_biomass(rec):
 
-# The elementary flow soil moved should be added to all processes that tillage the soil.
-# How much soil is moved is calculated according to the following formulas
+  # Only processes that contain used biomass get unused biomass
+  if has_flow(rec, biomass_used) == False:
+    return None
 
-density_soil = 1.4 /1000 * 100**3 # g/cm^3 -> kg/m^3
+  biomass_used_amount = rec["exchanges"][biomass_used.id][-1].amount
 
-moved_soil_harrowing = 0.15 * 10000 * density_soil
-moved_soil_ploughing = 0.2  * 10000 * density_soil
-moved_soil_subsoil   = 0.3  * 10000 * density_soil
+  # Average crop-residue ratio is defined
+  residue_ratio = residue_ratios["average"]
 
+  # Specific crop-residue ratios are defined - depending on process categories and names
+  # Sources can be founde in the corresponding manuscript
+  if rec["category_id"] in agriculture_category_ids:
+    crop = residue_crop(rec["name"])
+    if crop != None:
+      residue_ratio = crop["ratio"]
 
-# The tillage list contains all processes that tillage the soil
-# and the corresponding amount of moved earth 
-tillage_list = [
+  if rec["category_id"] in forestry_category_ids:
+    residue_ratio = residue_ratios["forestry"]
 
-  # harrowing
-  ["tillage, harrowing, ",moved_soil_harrowing],
+  if rec["category_id"] in animal_category_ids:
+    residue_ratio = residue_ratios["animal"]
 
-  # ploughing
-  ["tillage, ploughing | tillage, ploughing |",moved_soil_ploughing],
 
-  # subsoiling
-  ["tillage, subsoiling, by subsoiler plow | tillage, subsoiling, by subsoiler plow |",moved_soil_subsoil]]
+  return biomass_used_amount * residue_ratio
 
+# If unused biomass is present, it is updated. If not, it is added.
+apply_amounts(biomass_unused, records, [unused_biomass(rec) for rec in tracked(records)])
+          
+############################
+### T I L L A G E        ###
+############################
+
+stage("tillage")
+
+# The elementary flow soil moved should be added to all processes that tillage the soil.
+# The tillage list contains all processes that tillage the soil and the corresponding
+# amount of moved earth: depth * 10000 m2 * density of soil (see Rules)
 
 # The tillage list is iterated and the respective processes are identified
+
 for tp in tillage_list:
-  
-  foundsomething = False 
 
   tillage_process_name_raw = tp[0]
   soilmoved_amount = tp[1]
 
-  for ap in allprocesses:
-    if tillage_process_name_raw in ap.name:
-      # Market processes are excluded
-      if "market" not in ap.name:
-        tillage_processes_name_explicit = ap.name
-        foundsomething = True
+  tillage_processes = lookup_processes(rule_index, tillage_process_name_raw)
+  foundsomething    = len(tillage_processes) > 0
 
-
-  tillage_processes = dao_p.getForName(tillage_processes_name_explicit)
-
-  # All tillage processes are iterated
-  for p in tillage_processes:
-
-    # The booleans isin_x indicate, whether the respective flow is present in a process
-    isin_sm = False  # Moved soil as elementary flow
-
-    # Check, whether moved soil is already present
-    internalIDs = []
-    for ex in p.exchanges:
-      internalIDs.append(ex.internalId)
-      if ex.isInput == True:
-        if ex.flow.name == soilmoved.name:
-          ex.amount = soilmoved_amount
-          dao_p.update(p)
-          isin_sm = True
-          
-    # If soilmoved is not present, it is added
-    if isin_sm == False:
-
-      ex                    = model.Exchange()
-      ex.isInput            = True
-      ex.flow               = soilmoved
-      ex.amount             = soilmoved_amount
-      ex.unit               = kg
-      ex.flowPropertyFactor = soilmoved.referenceFactor
-      ex.internalId         = max(internalIDs)
-      
-      p.exchanges.add(ex)
-      dao_p.update(p)
-
-    # If soilmoved is present, it is updated
-    if isin_sm == True:
-      for ex in p.exchanges:
-        if ex.isInput == True:
-          if ex.flow.name == soilmoved.name:
-            ex.amount = soilmoved_amount
-            dao_p.update(p)  
-      
+  # All tillage processes are iterated.
+  # If soilmoved is present, it is updated. If not, it is added.
+  for rec in tillage_processes:
+    set_or_add(rec, soilmoved, soilmoved_amount)
+    mark_dirty(rec)
   if foundsomething == False:
     version_check = ""
     print("nothing found for:" + tillage_process_name_raw)
+    count("rule_misses")
+  else:
+    count("rule_hits")
       
 
 ############################
 ### C O M P A C T I N G  ###
 ############################
 
+stage("compacting")
+
 # The elementary flow soil compacted should be added to all processes where soil is compacted.
 # How much soil is compacted is calculated according to the following formulas
 
-# For agricultural processes a simple function is used to estimate the mass of compacted soil
-def compacting(MW):
-  
-  TW = 0.7                 # Assumed tire width: 70 cm
-  CPA = 0.2 * 2.0 * TW       # Compacted area: upper 20 cm * tire width * two tires
-  L = 10000 / MW           # Driven length for cultivating one hectar based on machinery width 
-  res = L*CPA*density_soil # Mass = area * length * density
-  return res
+# For agricultural processes, the mass of compacted soil is estimated with the function
+# compacting from the machinery width reported in ecoinvent (see Rules)
 
 # For forestry a road area factor is calculated which can be multiplied
 # with the area of established forest road to yield the amount of compacted mass
 road_area_factor = ((2.0 * 0.85) / 4.0) * 0.6 * 1400.0  # (tires * tire width) / road width * compacting depth * density soil
 #road_area_factor = 367 # 
 
-# The compacting list contains all processes where machinery is used in agriculture
-# The compacted soil is calculated based on the machinery width reported in ecoinvent
-compacting_list = [
-  # Plant protection
-  ["application of plant protection product, by field sprayer | application of plant protection product, by field sprayer",compacting(7)],
-
-  # Harvesting
-  ["combine harvesting | combine harvesting |",compacting(7)],
-  ["harvesting, by complete harvester, beets | harvesting, by complete harvester, beets |",compacting(7)],
-  ["harvesting, by complete harvester, ground crops | harvesting, by complete harvester, ground crops |",compacting(7)],
-  ["harvesting, sugarcane | harvesting, sugarcane |",compacting(7)],
-  ["chopping, maize | chopping, maize |",compacting(7)],
-
-  # Fertilizing
-  ["fertilising, by broadcaster | fertilising, by broadcaster |",compacting(5)],
-  ["fertilising, by rig fertiliser, sugarcane | fertilising, by rig fertiliser, sugarcane |",compacting(10)],
-
-  # Haying
-  ["haying, by rotary tedder | haying, by rotary tedder |",compacting(5)],
-
-  # Hoeing
-  ["hoeing | hoeing |",compacting(3)],
-
-  # Mowing
-  ["mowing, by motor mower | mowing, by motor mower |",compacting(7)],
-
-  # Mulching
-  ["mulching | mulching |",compacting(2.5)],
-
-  # Planting
-  ["planting | planting |",compacting(2.5)],
-  ["planting, potato | potato planting |",compacting(3.7)],
-  ["planting, sugarcane | planting, sugarcane |",compacting(3.7)],
-
-  # Cutting
-  ["potato haulm cutting | potato haulm cutting |",compacting(2)],
+# The function set_soil_compacted updates compacted soil, or adds it if it is not present
+def set_soil_compacted(rec, amount):
+  set_or_add(rec, soilcompacted, amount)
+  for ex in rec["exchanges"][soilcompacted.id]:
+    if ex.unit == None or ex.unit.id != kg.id:
+      note_change(rec, ex, soilcompacted, ex.amount, "unit")
+      ex.unit = kg
+  mark_dirty(rec)
 
-  # Sowing
-  ["sowing | sowing |",compacting(3)],
-
-  # Swath
-  ["swath, by rotary windrower | swath, by rotary windrower |",compacting(4)],
-
-  # Cultivating
-  ["tillage, cultivating, chiselling | tillage, cultivating, chiselling |",compacting(3.4)],
-
-  # Currying
-  ["tillage, currying, by weeder | tillage, currying, by weeder |",compacting(6)],
+# The compacting list is iterated and the relevant processes are identified
 
-  #Harrowing
-  ["tillage, harrowing, by offset disc harrow | tillage, harrowing, by offset disc harrow |",compacting(7)],
-  ["tillage, harrowing, by offset leveling disc harrow | tillage, harrowing, by offset leveling disc harrow |",compacting(7)],
-  ["tillage, harrowing, by rotary harrow | tillage, harrowing, by rotary harrow |",compacting(7)],
-  ["tillage, hoeing and earthing-up, potatoes | tillage, hoeing and earthing-up, potatoes",compacting(7)],
-  ["tillage, harrowing, by spring tine harrow | tillage, harrowing, by spring tine harrow |",compacting(3)],
+for cp in compacting_list:
 
-  # Ploughing
-  ["tillage, ploughing | tillage, ploughing |",compacting(7)],
+  compacting_process_name_raw = cp[0]
+  soilcompacted_amount = cp[1]
 
-  # Rolling
-  ["tillage, rolling | tillage, rolling |",compacting(3)],
+  compacting_processes = lookup_processes(rule_index, compacting_process_name_raw)
+  foundsomething       = len(compacting_processes) > 0
 
-  # Rotary cultivator
-  ["tillage, rotary cultivator | tillage, rotary cultivator |",compacting(7.8)]]
+  # The processes that compact the soil are iterated
+  for rec in compacting_processes:
+    set_soil_compacted(rec, soilcompacted_amount)
 
+  if foundsomething == False:
+    version_check = ""
+    print("nothing found for:" + compacting_process_name_raw)
+    count("rule_misses")
+  else:
+    count("rule_hits")
 
 # For forestry processes, the area of established forest road
-# is multiplied by the road area factor to yield the mass of compacted soil
-for p in allprocesses:
-  if p.category.name == "0220:Logging":
-    for ex in p.exchanges:
-      if ex.isInput == True:
-        if ex.flow.name == "Transformation, from traffic area, rail/road embankment":
-          compacting_list.append([p.name,ex.amount * road_area_factor])
-
-# The compacting list is iterated and the relevant processes are identified
-for cp in compacting_list:
-  
-  foundsomething = False
-
-  compacting_process_name_raw = cp[0]
-  soilcompacted_amount = cp[1]
+# is multiplied by the road area factor to yield the mass of compacted soil.
+# The logging processes are updated directly, based on their own records.
+logging_ids     = [category_id for category_id in category_index if category_index[category_id]["name"] == "0220:Logging"]
+logging_records = candidate_records(logging_ids)
+count("processes", len(logging_records))
+for rec in tracked(logging_records):
+  if rec["category"] == "0220:Logging":
+    for embankment_amount in rec["embankment"]:
+      set_soil_compacted(rec, embankment_amount * road_area_factor)
+      
 
-  for ap in allprocesses:
-    if compacting_process_name_raw in ap.name:
-      # Market processes are excluded
-      if "market" not in ap.name:
-        compacting_processes_name_explicit = ap.name
-        foundsomething = True
-       
-  compacting_processes = dao_p.getForName(compacting_processes_name_explicit)
+#######################################
+###  W R I T E   P R O C E S S E S  ###
+#######################################
 
-  # The processes that compact the soil are iterated 
-  for p in compacting_processes:
+stage("write processes")
 
-    # The booleans isin_x indicate, whether the respective flow is present in a process
-    isin_comp = False  # Compacted soil as elementary flow
+# The changes of the stages above are collected in the change plan, which is written to a file.
+# Then, the changed processes are written to the database, unless this is a dry run.
+build_plan()
+write_plan()
+plan_time = time.time()
+print("Planning took " + str(round(plan_time - start_time, 1)) + " s, the plan can be found in: " + plan_file())
 
-    internalIDs = []
-    for ex in p.exchanges:
-      internalIDs.append(ex.internalId)
-      if ex.isInput == True:
-        if ex.flow.name == soilcompacted.name:
-          ex.amount = soilcompacted_amount
-          ex.unit = kg
-          dao_p.update(p)
-          isin_comp = True
-          
+if dry_run == False:
+  apply_plan()
+  print("Writing took " + str(round(time.time() - plan_time, 1)) + " s")
 
-    # If compacted soil is not present, it is added
-    if isin_comp == False:
-
-      ex                    = model.Exchange()
-      ex.isInput            = True
-      ex.flow               = soilcompacted
-      ex.amount             = soilcompacted_amount
-      ex.unit               = kg
-      ex.flowPropertyFactor = soilcompacted.referenceFactor
-      ex.internalId         = max(internalIDs)
-      p.exchanges.add(ex)
-      dao_p.update(p)
-
-    # If compacted soil is present, it is updated
-    if isin_comp == True:
-      for ex in p.exchanges:
-        if ex.isInput == True:
-          if ex.flow.name == soilcompacted.name:
-            ex.amount = soilcompacted_amount
-            dao_p.update(p)  
 
-  if foundsomething == False:
-    version_check = ""
-    print("nothing found for:" + compacting_process_name_raw)
-      
 ##################################### 3. Create LCIA-Method  #####################################
 
 
@@ -1500,6 +2463,8 @@ for cp in compacting_list:
 ### C R E A T E    L I S T S    F O R    I M P A C T   C A T E G O R I E S  ###
 ###############################################################################
 
+stage("CF lists", "3. Create LCIA-Method")
+
 # For creating the LCIA Method several lists need to be created and filled.
 # The lists contain the following information:
 # 1) The uuid of the elementary flow
@@ -1508,7 +2473,7 @@ for cp in compacting_list:
 # 4) The unit of the elementary flow
 # 5) The value of the characterization factor
 
-allflows      = dao_f.getAll() # Updated with newly added flows
+# All flows are taken from the flow catalog, which also contains the newly added flows
 
 ### A B I O T I C   R E S O U R C E S
 
@@ -1525,18 +2490,20 @@ abiotic_tmr_catpath = []
 # For abiotic rmi, overburden is excluded because it represents
 # unused material
 
-for f in allflows:
-    if f.category != None:
-        if f.category.name == "in ground":
-          if f.referenceFlowProperty.name =="Mass":
-            if "Soil," not in f.name:
-              if "Overburden" not in f.name:
-                abiotic_rmi_names.append(f.name)
-                abiotic_rmi_uuid.append(f.refId)
-                abiotic_rmi_catpath.append(f.category.name)
-              abiotic_tmr_names.append(f.name)
-              abiotic_tmr_uuid.append(f.refId)
-              abiotic_tmr_catpath.append(f.category.name)
+abiotic_flows = flows_in_category("in ground")
+mass_flows    = flows_with_property("Mass")
+count("flows", len(abiotic_flows))
+
+for f in abiotic_flows:
+    if f.refId in mass_flows:
+      if "Soil," not in f.name:
+        if "Overburden" not in f.name:
+          abiotic_rmi_names.append(f.name)
+          abiotic_rmi_uuid.append(f.refId)
+          abiotic_rmi_catpath.append(f.category.name)
+        abiotic_tmr_names.append(f.name)
+        abiotic_tmr_uuid.append(f.refId)
+        abiotic_tmr_catpath.append(f.category.name)
 
 # All elementary flows get an characterization factor of 1
 # because they are given in kg
@@ -1579,43 +2546,43 @@ biotic_tmr_values  = []
 # For biotic resources the elementary flows for used biomass, unused biomass and
 # extracted fish are used. The reference unit of all three flows is kg.
 # Hence, the characterization factor is set to 1.
-for f in allflows:
+for name in flow_catalog["names"]:
+  if "Fish," in name:
+    for f in flows_named(name):
+      biotic_rmi_uuid.append(f.refId)
+      biotic_rmi_names.append(f.name)
+      biotic_rmi_catpath.append(f.category.name)
+      biotic_rmi_units.append("kg")
+      biotic_rmi_values.append(1)
+
+      biotic_tmr_uuid.append(f.refId)
+      biotic_tmr_names.append(f.name)
+      biotic_tmr_catpath.append(f.category.name)
+      biotic_tmr_units.append("kg")
+      biotic_tmr_values.append(1)
+
+for f in flows_named("Biomass, used"):
   
-  if "Fish," in f.name:
-	biotic_rmi_uuid.append(f.refId)
-	biotic_rmi_names.append(f.name)
-	biotic_rmi_catpath.append(f.category.name)
-	biotic_rmi_units.append("kg")
-	biotic_rmi_values.append(1)
-
-  	biotic_tmr_uuid.append(f.refId)
-	biotic_tmr_names.append(f.name)
-	biotic_tmr_catpath.append(f.category.name)
-	biotic_tmr_units.append("kg")
-	biotic_tmr_values.append(1)
-
-  if f.name == "Biomass, used":
-    
-    biotic_rmi_uuid.append(f.refId)
-    biotic_rmi_names.append(f.name)
-    biotic_rmi_catpath.append(f.category.name)
-    biotic_rmi_units.append("kg")
-    biotic_rmi_values.append(1)
-    
-    biotic_tmr_uuid.append(f.refId)
-    biotic_tmr_names.append(f.name)
-    biotic_tmr_catpath.append(f.category.name)
-    biotic_tmr_units.append("kg")
-    biotic_tmr_values.append(1)
-
-  # Unused biomass is only added to tmr and not to rmi  
-  if f.name == "Biomass, unused":
-    
-    biotic_tmr_uuid.append(f.refId)
-    biotic_tmr_names.append(f.name)
-    biotic_tmr_catpath.append(f.category.name)
-    biotic_tmr_units.append("kg")
-    biotic_tmr_values.append(1)
+  biotic_rmi_uuid.append(f.refId)
+  biotic_rmi_names.append(f.name)
+  biotic_rmi_catpath.append(f.category.name)
+  biotic_rmi_units.append("kg")
+  biotic_rmi_values.append(1)
+  
+  biotic_tmr_uuid.append(f.refId)
+  biotic_tmr_names.append(f.name)
+  biotic_tmr_catpath.append(f.category.name)
+  biotic_tmr_units.append("kg")
+  biotic_tmr_values.append(1)
+
+# Unused biomass is only added to tmr and not to rmi  
+for f in flows_named("Biomass, unused"):
+  
+  biotic_tmr_uuid.append(f.refId)
+  biotic_tmr_names.append(f.name)
+  biotic_tmr_catpath.append(f.category.name)
+  biotic_tmr_units.append("kg")
+  biotic_tmr_values.append(1)
 
 
     
@@ -1650,19 +2617,24 @@ water_values  = []
 # If the reference unit is kg, the characterization factor is 1.
 # If the reference unit is m3, the characteritation factor is 1000.
 
-for f in allflows:
-    if f.category != None:
-        if f.category.name == "in water" or f.category.name == "in ground" :
-            if "Water," in f.name and "turbine" not in f.name and "salt" not in f.name:
-                water_uuid.append(f.refId)
-                water_names.append(f.name)
-                water_catpath.append(f.category.name)
-                if f.referenceFlowProperty.name == "Mass":
-                  water_units.append("kg")
-                  water_values.append(1)
-                if f.referenceFlowProperty.name == "Volume":
-                  water_units.append("m3")
-                  water_values.append(1000)
+water_flows = []
+for f in flows_in_category("in water") + flows_in_category("in ground"):
+  if "Water," in f.name and "turbine" not in f.name and "salt" not in f.name:
+    water_flows.append(f)
+
+count("flows", len(water_flows))
+volume_flows = flows_with_property("Volume")
+
+for f in water_flows:
+  water_uuid.append(f.refId)
+  water_names.append(f.name)
+  water_catpath.append(f.category.name)
+  if f.refId in mass_flows:
+    water_units.append("kg")
+    water_values.append(1)
+  if f.refId in volume_flows:
+    water_units.append("m3")
+    water_values.append(1000)
 
 
 water_dict ={
@@ -1685,15 +2657,14 @@ movedsoil_values  = []
 
 # Only the three soil related elementary flows are part of the impact category
 # The characterization factors are all 1.
-for f in allflows:
-  if f.name == "Soil, moved" or f.name == "Soil, compacted" or f.name == "Soil, erodet":
-    if f.category != None:
-      if f.category.name == "in ground":
-        movedsoil_uuid.append(f.refId)
-        movedsoil_names.append(f.name)
-        movedsoil_catpath.append(f.category.name)
-        movedsoil_units.append("kg")
-        movedsoil_values.append(1)
+for f in flows_named("Soil, moved") + flows_named("Soil, compacted") + flows_named("Soil, erodet"):
+  if f.category != None:
+    if f.category.name == "in ground":
+      movedsoil_uuid.append(f.refId)
+      movedsoil_names.append(f.name)
+      movedsoil_catpath.append(f.category.name)
+      movedsoil_units.append("kg")
+      movedsoil_values.append(1)
 
 
 movedsoil_dict ={
@@ -1711,20 +2682,11 @@ movedsoil_dict ={
 # whenever gangue and overburden where missing, a flagged counterpart 
 # was added. In the impact category "ESTIMATE MISSING ABIOTIC" these
 # the characterization factor of these elementary flows is set to the 
-# median value of all detected gangue and overburden, respectively.
-
-overburden_amounts  = []
-gangue_amounts      = []
+# median value (or the quantile set above) of all detected gangue and overburden, respectively.
 
-# In order to calculate the median value, all gangue and 
-# overburden values are stored in lists
-for p in allprocesses:
-  if "07" in p.category.name or "05" in p.category.name:
-    for ex in p.exchanges:
-      if ex.flow.name == gangue.name:
-        gangue_amounts.append(ex.amount)
-      if ex.flow.name == overburden.name:
-        overburden_amounts.append(ex.amount)
+# All gangue and overburden values were summarized during the scan and the stages
+overburden_amounts  = summary_values(amount_stats[overburden.id])
+gangue_amounts      = summary_values(amount_stats[gangue.id])
 
 
 missing_uuid    = []
@@ -1734,20 +2696,19 @@ missing_units   = []
 missing_values  = []
 
 # The media values are added as characterization factors
-for f in allflows:
-  if f.name == "flag missing overburden":
-    missing_uuid.append(f.refId)
-    missing_names.append(f.name)
-    missing_catpath.append(f.category.name)
-    missing_units.append("kg")
-    missing_values.append(median_function(overburden_amounts))
+for f in flows_named("flag missing overburden"):
+  missing_uuid.append(f.refId)
+  missing_names.append(f.name)
+  missing_catpath.append(f.category.name)
+  missing_units.append("kg")
+  missing_values.append(quantile_function(overburden_amounts, missing_quantile))
 
-  if f.name == "flag missing gangue":
-    missing_uuid.append(f.refId)
-    missing_names.append(f.name)
-    missing_catpath.append(f.category.name)
-    missing_units.append("kg")
-    missing_values.append(median_function(gangue_amounts))
+for f in flows_named("flag missing gangue"):
+  missing_uuid.append(f.refId)
+  missing_names.append(f.name)
+  missing_catpath.append(f.category.name)
+  missing_units.append("kg")
+  missing_values.append(quantile_function(gangue_amounts, missing_quantile))
 
 
 missing_dict ={
@@ -1770,13 +2731,12 @@ external_catpath = []
 external_units   = []
 external_values  = []
 
-for f in allflows:
-  if f.name == "flag external data":
-    external_uuid.append(f.refId)
-    external_names.append(f.name)
-    external_catpath.append(f.category.name)
-    external_units.append("kg")
-    external_values.append(1)
+for f in flows_named("flag external data"):
+  external_uuid.append(f.refId)
+  external_names.append(f.name)
+  external_catpath.append(f.category.name)
+  external_units.append("kg")
+  external_values.append(1)
 
 external_dict ={
     "names": external_names,
@@ -1790,15 +2750,15 @@ external_dict ={
 ### E M P T Y   M E T H O D        ###
 ######################################
 
-# First, the directories for the .json files of the LCIA Method are created
+stage("method writing")
+
+# The LCIA Method is stored as a zip file in the JSON-LD format.
+# The method and its impact categories are kept in memory and written to the zip file only once.
 
-path_lcia_categories = mainpath + "/Material Intensity/Material Intensity METHOD_"+ei_version +"/lcia_categories"
-path_lcia_methods    = mainpath + "/Material Intensity/Material Intensity METHOD_"+ei_version +"/lcia_methods"
+method_dir = mainpath + "/Material Intensity/Material Intensity METHOD_" + ei_version + ".zip"
 
-if not os.path.exists(path_lcia_categories):
-    os.makedirs(path_lcia_categories)
-if not os.path.exists(path_lcia_methods):
-    os.makedirs(path_lcia_methods)
+if not os.path.exists(mainpath + "/Material Intensity"):
+    os.makedirs(mainpath + "/Material Intensity")
 
 
 # Dictionaries for the .json files are created 
@@ -1933,31 +2893,17 @@ empty_external  ={
     "impactFactors": [],
     "id": "edeb416b-5d59-4524-95dc-9c0a9261c0d0.json"}
 
-# The dictionaries are saved as .json-files
+# The dictionaries of the impact categories are stored by the name of their .json-file
 
-with open(path_lcia_methods + '/56c9a436-2c1d-4ead-87d5-17ac168b0191.json', 'w') as fp:
-  json.dump(method, fp)
-
-with open(path_lcia_categories +'/90768cd8-9b26-11ee-b9d1-0242ac120002.json', 'w') as fp:
-  json.dump(empty_abiotic_rmi, fp)
-with open(path_lcia_categories +'/0e79d9c7-8add-4a23-a25e-1f55a4e82d2d.json', 'w') as fp:
-  json.dump(empty_abiotic_tmr, fp)
-
-with open(path_lcia_categories +'/90768f6c-9b26-11ee-b9d1-0242ac120002.json', 'w') as fp:
-  json.dump(empty_biotic_rmi, fp)
-with open(path_lcia_categories +'/3d2d5656-2e3e-4453-8003-c3d485356045.json', 'w') as fp:
-  json.dump(empty_biotic_tmr, fp)
-
-with open(path_lcia_categories +'/8f07827d-72c0-4ae7-a708-a18e684b3f54.json', 'w') as fp:
-  json.dump(empty_water, fp)
-with open(path_lcia_categories +'/68be8652-dba7-443e-b439-c57d058f0388.json', 'w') as fp:
-  json.dump(empty_soil, fp)
-
-with open(path_lcia_categories +'/cd9a353b-371c-4aa9-bdec-89e98891d5dd.json', 'w') as fp:
-  json.dump(empty_missing, fp)
-  
-with open(path_lcia_categories +'/edeb416b-5d59-4524-95dc-9c0a9261c0d0.json', 'w') as fp:
-  json.dump(empty_external, fp)
+empty_categories = {
+    "90768cd8-9b26-11ee-b9d1-0242ac120002.json": empty_abiotic_rmi,
+    "0e79d9c7-8add-4a23-a25e-1f55a4e82d2d.json": empty_abiotic_tmr,
+    "90768f6c-9b26-11ee-b9d1-0242ac120002.json": empty_biotic_rmi,
+    "3d2d5656-2e3e-4453-8003-c3d485356045.json": empty_biotic_tmr,
+    "8f07827d-72c0-4ae7-a708-a18e684b3f54.json": empty_water,
+    "68be8652-dba7-443e-b439-c57d058f0388.json": empty_soil,
+    "cd9a353b-371c-4aa9-bdec-89e98891d5dd.json": empty_missing,
+    "edeb416b-5d59-4524-95dc-9c0a9261c0d0.json": empty_external}
 
 
 ##################################################
@@ -2029,15 +2975,14 @@ if analysis == True:
 
 
 # The following for loop iterates through the dictionaries and 
-# populates the json files with the relevant information
+# populates the impact categories with the relevant information.
+# This is only needed, if the method is imported from a zip file.
 
-for i in range(0,len(MI_uuid)):
-  f_in = os.path.join(path_lcia_categories,MI_uuid[i])
-  with open(f_in, 'r+') as f:
-    thisd = json.load(f)
+if method_import == "zip":
+  for i in range(0,len(MI_uuid)):
+    thisd = empty_categories[MI_uuid[i]]
     thisd['name'] = cat_names[i]
     thisd['id']   = MI_uuid[i]
-    del thisd['impactFactors'][0:len(thisd['impactFactors'])] # delete the two factors that are still there from copying the files
     
     for mli in range(0,len(MI_dict[cat_names[i]]["values"])):
       CF = CF_generate(mli,
@@ -2046,20 +2991,20 @@ for i in range(0,len(MI_uuid)):
                        duuid = MI_dict[cat_names[i]]["uuids"],
                        dcatpath = "",
                        dunit = MI_dict[cat_names[i]]["units"])
-      # add new CF to json file:
+      # add new CF to the impact category:
       if CF["value"] > 0:
         thisd['impactFactors'].append(CF)
-        
-    # wrap up and save
-    f.seek(0)        # reset file position to the beginning.
-    json.dump(thisd, f, indent=4)
-    f.truncate()     # remove remaining part
-    f.close()
+        count("factors")
 
 
-# Save the Method 
-shutil.make_archive(mainpath + "/Material Intensity/Material Intensity METHOD_"+ ei_version, 'zip', root_dir=mainpath + "/Material Intensity/Material Intensity METHOD_"+ ei_version)
-method_dir = mainpath + "/Material Intensity/Material Intensity METHOD_" + ei_version + ".zip"
+  # Save the Method 
+  # The method and all impact categories are serialized once, without indentation,
+  # and written directly into the zip file
+  with zipfile.ZipFile(method_dir, 'w', zipfile.ZIP_DEFLATED) as zf:
+    zf.writestr("lcia_methods/56c9a436-2c1d-4ead-87d5-17ac168b0191.json", json.dumps(method, separators=(',', ':')))
+    for file_name in sorted(empty_categories):
+      zf.writestr("lcia_categories/" + file_name, json.dumps(empty_categories[file_name], separators=(',', ':')))
+
 print(version_check)
 print("Material Intensity method created :)")
 
@@ -2068,15 +3013,105 @@ if analysis == False:
 
 ##################################### 4. Import #####################################
 
-# The LCIA-Method is imported into the current database
-reader = ZipStore.open(File(method_dir))
-i = JsonImport(reader,db)
-i.run()
-reader.close()
+stage("import", "4. Import")
+
+# The function create_method creates the LCIA-Method with the model API.
+# The impact categories are taken from the method dictionary and filled with the same
+# characterization factors as in the zip file. Everything is stored in one transaction.
+def create_method():
+  method_category           = model.Category()
+  method_category.refId     = str(UUID.randomUUID())
+  method_category.name      = "Material Intensity"
+  method_category.modelType = model.ModelType.IMPACT_METHOD
+
+  impact_category           = model.Category()
+  impact_category.refId     = str(UUID.randomUUID())
+  impact_category.name      = "Material Intensity"
+  impact_category.modelType = model.ModelType.IMPACT_CATEGORY
+
+  m          = model.ImpactMethod()
+  m.refId    = method["@id"]
+  m.name     = method["name"]
+  m.version  = model.Version.fromString(method["version"]).value
+  m.category = method_category
+
+  impact_categories = []
+  for i in range(0,len(MI_uuid)):
+    ic               = model.ImpactCategory()
+    ic.refId         = MI_uuid[i].replace(".json", "")
+    ic.name          = cat_names[i]
+    ic.version       = m.version
+    ic.referenceUnit = "kg"
+    ic.category      = impact_category
+    cf_table         = MI_dict[cat_names[i]]
+    for mli in range(0,len(cf_table["values"])):
+      if cf_table["values"][mli] > 0:
+        flow                      = flow_catalog["by_ref_id"][cf_table["uuids"][mli]]
+        factor                    = model.ImpactFactor()
+        factor.flow               = flow
+        factor.flowPropertyFactor = flow.referenceFactor
+        factor.unit               = flow.referenceUnit
+        factor.value              = cf_table["values"][mli]
+        ic.impactFactors.add(factor)
+        count("factors")
+    impact_categories.append(ic)
+    m.impactCategories.add(ic)
+
+  em = db.getEntityFactory().createEntityManager()
+  try:
+    em.getTransaction().begin()
+    em.persist(method_category)
+    em.persist(impact_category)
+    for ic in impact_categories:
+      em.persist(ic)
+    em.persist(m)
+    em.getTransaction().commit()
+    count("dao_inserts", len(impact_categories) + 3)
+  except:
+    if em.getTransaction().isActive():
+      em.getTransaction().rollback()
+    raise
+  finally:
+    em.close()
+
+###################################################
+###  D e l e t e  e x i s t i n g   M e t h o d  ##    ###
+###################################################
+
+# The existing method is deleted right before the new one is imported, so that
+# a run that is cancelled before keeps it. In a dry run, the existing method is kept.
+if dry_run == False:
+  for meth in dao_m.getAll():
+    if meth.name == "Material Intensity":
+      dao_m.delete(meth)
+      count("dao_deletes")
+
+  for ic in dao_i.getAll():
+    if ic.category.name == "Material Intensity":
+      dao_i.delete(ic)
+      count("dao_deletes")
+
+  for c in dao_c.getAll():
+    
+    if c.name == "Material Intensity":
+      dao_c.delete(c)
+      count("dao_deletes")
+
+# The LCIA-Method is imported into the current database, unless this is a dry run
+if dry_run == False:
+  if method_import == "direct":
+    create_method()
+  else:
+    reader = ZipStore.open(File(method_dir))
+    i = JsonImport(reader,db)
+    i.run()
+    reader.close()
 
 
 ##################################### 5. Document Missing Flows #####################################
 
+stage("csv", "5. Document Missing Flows")
+
 # For transparency and analytical reasons, csv files are created that contain the names of
 # process data sets where information regarding gangue and/or overburden is missing.
 
@@ -2108,3 +3143,4 @@ if analysis == True:
       for name in missing_outside:
           csv_writer.writerow([name])
 print("CSV files with information regarding data gaps can be found in: " + mainpath + "/Material Intensity")
+finish_report()
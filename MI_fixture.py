@@ -0,0 +1,1026 @@
+###################################################################
+### M a t e r i a l   I n t e n s i t y   F i x t u r e         ###
+###################################################################
+
+# This module provides an in-memory database that can stand in for an ecoinvent database
+# in openLCA. It is used by MI_benchmark.py to run MI_ei_3.9.1.py without openLCA and
+# without a licensed database.
+
+# The module has the following structure
+
+# 1. Model      In-memory stand-ins for the classes of org.openlca.core.model
+# 2. Database   The DAOs, the entity manager and a JDBC connection on top of the stored entities
+# 3. Generator  A synthetic database with N processes, similar to ecoinvent
+# 4. Install    The stand-ins are registered as the modules the script imports
+
+# Only the parts of the openLCA API that are used by the script are provided. The module runs
+# with Python 2.7, like the python console of openLCA.
+
+# Example:
+#   import MI_fixture
+#   db = MI_fixture.generate(processes = 21000)
+#   MI_fixture.install()
+#   execfile("MI_ei_3.9.1.py", {"__name__": "__main__", "__file__": MI_fixture.script, "db": db})
+
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import threading
+import types
+import uuid
+import zipfile
+
+script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "MI_ei_3.9.1.py")
+rules  = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules", "ecoinvent_3.9.1.json")
+
+
+##################################### 1. Model #####################################
+
+# All entities get a unique ID. Like in openLCA, the ID is set when an entity is stored.
+entity_ids = itertools.count(1)
+
+# The class JavaList behaves like the java.util.List of the entities (e.g. process.exchanges)
+class JavaList(list):
+
+  def add(self, item):
+    self.append(item)
+
+  def size(self):
+    return len(self)
+
+  def isEmpty(self):
+    return len(self) == 0
+
+# The class Entity is the base of all stored entities. Attributes are given as keywords.
+class Entity(object):
+
+  def __init__(self, **attributes):
+    self.id         = 0
+    self.refId      = None
+    self.name       = None
+    self.version    = 0
+    self.lastChange = 0
+    self.category   = None
+    for key in attributes:
+      setattr(self, key, attributes[key])
+
+  # Like in openLCA, a copy gets no ID, so that it is stored as a new entity
+  def copy(self):
+    other = self.__class__()
+    other.__dict__.update(self.__dict__)
+    other.id = 0
+    return other
+
+class Category(Entity):
+
+  def __init__(self, **attributes):
+    self.modelType       = None
+    self.childCategories = JavaList()
+    Entity.__init__(self, **attributes)
+
+class Location(Entity):
+  pass
+
+class Unit(Entity):
+  pass
+
+class UnitGroup(Entity):
+
+  def __init__(self, **attributes):
+    self.units = JavaList()
+    Entity.__init__(self, **attributes)
+
+class FlowProperty(Entity):
+  pass
+
+class FlowPropertyFactor(Entity):
+  pass
+
+class Flow(Entity):
+  pass
+
+# A full ecoinvent database has about a million exchanges. Therefore, exchanges only
+# have the attributes used by the script.
+class Exchange(object):
+
+  __slots__ = ["id", "internalId", "isInput", "flow", "amount", "unit", "flowPropertyFactor"]
+
+  def __init__(self, **attributes):
+    self.id                 = 0
+    self.internalId         = 0
+    self.isInput            = False
+    self.flow               = None
+    self.amount             = 0.0
+    self.unit               = None
+    self.flowPropertyFactor = None
+    for key in attributes:
+      setattr(self, key, attributes[key])
+
+class Process(Entity):
+
+  def __init__(self, **attributes):
+    self.exchanges             = JavaList()
+    self.lastInternalId        = 0
+    self.location              = None
+    self.quantitativeReference = None
+    Entity.__init__(self, **attributes)
+
+class ImpactFactor(Entity):
+
+  def __init__(self, **attributes):
+    self.flow               = None
+    self.flowPropertyFactor = None
+    self.unit               = None
+    self.value              = 0.0
+    Entity.__init__(self, **attributes)
+
+class ImpactCategory(Entity):
+
+  def __init__(self, **attributes):
+    self.impactFactors = JavaList()
+    self.referenceUnit = None
+    Entity.__init__(self, **attributes)
+
+class ImpactMethod(Entity):
+
+  def __init__(self, **attributes):
+    self.impactCategories = JavaList()
+    Entity.__init__(self, **attributes)
+
+class ModelType(object):
+  PROCESS         = "PROCESS"
+  FLOW            = "FLOW"
+  IMPACT_METHOD   = "IMPACT_METHOD"
+  IMPACT_CATEGORY = "IMPACT_CATEGORY"
+
+# Versions are stored as a single number, like in openLCA (major, minor, update)
+class Version(object):
+
+  def __init__(self, value):
+    self.value = value
+
+  @staticmethod
+  def fromString(text):
+    parts = [int(part) for part in (text.split(".") + ["0", "0"])[0:3]]
+    return Version(parts[0] * 10**10 + parts[1] * 10**5 + parts[2])
+
+class UUID(object):
+
+  @staticmethod
+  def randomUUID():
+    return uuid.uuid4()
+
+class File(object):
+
+  def __init__(self, path):
+    self.path = path
+
+  def getAbsolutePath(self):
+    return os.path.abspath(self.path)
+
+  def getParentFile(self):
+    return File(os.path.dirname(self.path))
+
+# The thread pool of java.util.concurrent is emulated with Python threads.
+# The fixture reports a machine with four processors.
+class TimeUnit(object):
+  SECONDS = 1
+  DAYS    = 86400
+
+class ThreadPool(object):
+
+  def __init__(self, threads):
+    self.threads = []
+
+  def execute(self, task):
+    thread = threading.Thread(target = task)
+    thread.start()
+    self.threads.append(thread)
+
+  def shutdown(self):
+    pass
+
+  def awaitTermination(self, timeout, unit):
+    for thread in self.threads:
+      thread.join(timeout * unit)
+    return len([thread for thread in self.threads if thread.is_alive()]) == 0
+
+class Executors(object):
+
+  @staticmethod
+  def newFixedThreadPool(threads):
+    return ThreadPool(threads)
+
+class Runtime(object):
+
+  @staticmethod
+  def getRuntime():
+    return Runtime()
+
+  def availableProcessors(self):
+    return 4
+
+
+##################################### 2. Database #####################################
+
+# The class Database stores the entities of each type in a list and by ID.
+# It counts the operations that change the database, so that a benchmark can report them.
+class Database(object):
+
+  def __init__(self, name):
+    self.name     = name
+    self.entities = {}
+    self.by_id    = {}
+    self.counts   = {"insert": 0, "update": 0, "delete": 0, "merge": 0, "persist": 0, "commit": 0, "rollback": 0, "query": 0,
+                     "connection": 0}
+
+  def all(self, cls):
+    return self.entities.setdefault(cls, [])
+
+  def get(self, cls, entity_id):
+    return self.by_id.setdefault(cls, {}).get(entity_id)
+
+  # The function store gives an entity (and the exchanges of a process) an ID and adds it
+  def store(self, cls, entity):
+    if entity.id == 0:
+      entity.id = next(entity_ids)
+    if isinstance(entity, Process):
+      for ex in entity.exchanges:
+        if ex.id == 0:
+          ex.id = next(entity_ids)
+    if self.get(cls, entity.id) == None:
+      self.all(cls).append(entity)
+      self.by_id[cls][entity.id] = entity
+    return entity
+
+  def remove(self, cls, entity):
+    if self.get(cls, entity.id) != None:
+      self.all(cls).remove(entity)
+      del self.by_id[cls][entity.id]
+
+  def getEntityFactory(self):
+    return EntityFactory(self)
+
+  def createConnection(self):
+    self.counts["connection"] += 1
+    return Connection(self)
+
+  def getFileStorageLocation(self):
+    return None
+
+  def close(self):
+    pass
+
+# The class Dao provides the DAO methods for one entity type
+class Dao(object):
+
+  cls = None
+
+  def __init__(self, db):
+    self.db = db
+
+  def getAll(self):
+    return list(self.db.all(self.cls))
+
+  def getForId(self, entity_id):
+    return self.db.get(self.cls, entity_id)
+
+  def getForRefId(self, ref_id):
+    for entity in self.db.all(self.cls):
+      if entity.refId == ref_id:
+        return entity
+    return None
+
+  def getForName(self, name):
+    return [entity for entity in self.db.all(self.cls) if entity.name == name]
+
+  def insert(self, entity):
+    self.db.counts["insert"] += 1
+    return self.db.store(self.cls, entity)
+
+  def update(self, entity):
+    self.db.counts["update"] += 1
+    return self.db.store(self.cls, entity)
+
+  def delete(self, entity):
+    self.db.counts["delete"] += 1
+    self.db.remove(self.cls, entity)
+
+class CategoryDao(Dao):
+  cls = Category
+
+class LocationDao(Dao):
+  cls = Location
+
+class UnitGroupDao(Dao):
+  cls = UnitGroup
+
+class FlowPropertyDao(Dao):
+  cls = FlowProperty
+
+class FlowDao(Dao):
+  cls = Flow
+
+class ProcessDao(Dao):
+  cls = Process
+
+class ImpactMethodDao(Dao):
+  cls = ImpactMethod
+
+class ImpactCategoryDao(Dao):
+  cls = ImpactCategory
+
+# The entity manager stores merged and persisted entities immediately.
+# A transaction only counts commits and rollbacks.
+class Transaction(object):
+
+  def __init__(self, db):
+    self.db     = db
+    self.active = False
+
+  def begin(self):
+    self.active = True
+
+  def commit(self):
+    self.db.counts["commit"] += 1
+    self.active = False
+
+  def rollback(self):
+    self.db.counts["rollback"] += 1
+    self.active = False
+
+  def isActive(self):
+    return self.active
+
+class EntityManager(object):
+
+  def __init__(self, db):
+    self.db          = db
+    self.transaction = Transaction(db)
+
+  def getTransaction(self):
+    return self.transaction
+
+  def stored_type(self, entity):
+    for cls in [Process, Flow, Category, ImpactMethod, ImpactCategory, ImpactFactor]:
+      if isinstance(entity, cls):
+        return cls
+    return type(entity)
+
+  def merge(self, entity):
+    self.db.counts["merge"] += 1
+    return self.db.store(self.stored_type(entity), entity)
+
+  def persist(self, entity):
+    self.db.counts["persist"] += 1
+    self.db.store(self.stored_type(entity), entity)
+
+  def find(self, cls, entity_id):
+    return self.db.get(cls, entity_id)
+
+  def createQuery(self, jpql, cls):
+    return Query(self.db, jpql, cls)
+
+  def flush(self):
+    pass
+
+  def clear(self):
+    pass
+
+  def close(self):
+    pass
+
+# The query answers the query of the script for a page of processes:
+# "SELECT p FROM Process p WHERE p.id > <ID> ORDER BY p.id"
+class Query(object):
+
+  def __init__(self, db, jpql, cls):
+    self.db      = db
+    self.cls     = cls
+    self.last_id = int(re.search(r"p\.id > ([0-9]+)", jpql).group(1))
+    self.limit   = None
+
+  def setMaxResults(self, limit):
+    self.limit = limit
+    return self
+
+  def getResultList(self):
+    self.db.counts["query"] += 1
+    found = sorted([e for e in self.db.all(self.cls) if e.id > self.last_id], key = lambda e: e.id)
+    return found[:self.limit]
+
+class EntityFactory(object):
+
+  def __init__(self, db):
+    self.db = db
+
+  def createEntityManager(self):
+    return EntityManager(self.db)
+
+# The JDBC connection answers the queries of the script on the processes and exchanges.
+# The rows are created while they are read, like with a database cursor.
+class Connection(object):
+
+  def __init__(self, db):
+    self.db = db
+
+  def createStatement(self):
+    return Statement(self.db)
+
+  def close(self):
+    pass
+
+class Statement(object):
+
+  def __init__(self, db):
+    self.db = db
+
+  def executeQuery(self, sql):
+    self.db.counts["query"] += 1
+    processes = self.db.all(Process)
+    if "FROM tbl_processes" in sql:
+      return ResultSet(process_rows(processes), 10)
+    if "FROM tbl_exchanges" in sql:
+      owners = re.search(r"WHERE f_owner IN \(([0-9, ]+)\)", sql)
+      if owners != None:
+        owner_ids = set([int(owner_id) for owner_id in owners.group(1).split(",")])
+        processes = [p for p in processes if p.id in owner_ids]
+      owners = re.search(r"WHERE f_owner >= ([0-9]+) AND f_owner <= ([0-9]+)", sql)
+      if owners != None:
+        first, last = int(owners.group(1)), int(owners.group(2))
+        processes = [p for p in processes if first <= p.id <= last]
+      return ResultSet(exchange_rows(processes), 7)
+    raise Exception("The fixture does not support the query: " + sql)
+
+  def close(self):
+    pass
+
+def process_rows(processes):
+  for p in processes:
+    category = p.category
+    ref_unit = None
+    if p.quantitativeReference != None and p.quantitativeReference.unit != None:
+      ref_unit = p.quantitativeReference.unit.name
+    yield (p.id, p.refId, p.version, p.lastChange, p.name,
+           category.name if category != None else None,
+           p.location.name if p.location != None else None,
+           ref_unit, p.lastInternalId,
+           category.id if category != None else None)
+
+def exchange_rows(processes):
+  for p in processes:
+    for ex in p.exchanges:
+      yield (p.id, ex.id, ex.flow.id, 1 if ex.isInput else 0, ex.amount, ex.internalId,
+             ex.unit.id if ex.unit != None else None)
+
+class ResultSet(object):
+
+  def __init__(self, rows, column_count):
+    self.rows         = rows
+    self.row          = None
+    self.column_count = column_count
+
+  def next(self):
+    self.row = next(self.rows, None)
+    return self.row != None
+
+  def getObject(self, column):
+    return self.row[column - 1]
+
+  def getMetaData(self):
+    return MetaData(self.column_count)
+
+  def close(self):
+    pass
+
+class MetaData(object):
+
+  def __init__(self, column_count):
+    self.column_count = column_count
+
+  def getColumnCount(self):
+    return self.column_count
+
+# The JSON-LD import reads the LCIA-Method from the zip file and stores it, so that
+# a second run finds and deletes it like in openLCA
+class ZipStore(object):
+
+  def __init__(self, path):
+    self.path = path
+
+  @staticmethod
+  def open(f):
+    return ZipStore(f.path)
+
+  def close(self):
+    pass
+
+class JsonImport(object):
+
+  def __init__(self, reader, db):
+    self.reader = reader
+    self.db     = db
+
+  def run(self):
+    flows = {}
+    for f in self.db.all(Flow):
+      flows[f.refId] = f
+
+    with zipfile.ZipFile(self.reader.path) as zf:
+      documents = [json.loads(zf.read(name)) for name in zf.namelist() if name.endswith(".json")]
+
+    folder = self.db.store(Category, Category(refId = str(uuid.uuid4()), name = "Material Intensity",
+                                              modelType = ModelType.IMPACT_CATEGORY))
+    impact_categories = {}
+    for d in documents:
+      if d.get("@type") == "ImpactCategory":
+        ic = ImpactCategory(refId = d["@id"], name = d["name"], category = folder)
+        for factor in d.get("impactFactors", []):
+          flow = flows.get(factor["flow"]["@id"])
+          if flow != None:
+            ic.impactFactors.add(ImpactFactor(flow = flow, value = factor["value"]))
+        impact_categories[ic.refId] = self.db.store(ImpactCategory, ic)
+
+    for d in documents:
+      if d.get("@type") == "ImpactMethod":
+        method = ImpactMethod(refId = d["@id"], name = d["name"])
+        for ref in d.get("impactCategories", []):
+          if ref["@id"] in impact_categories:
+            method.impactCategories.add(impact_categories[ref["@id"]])
+        self.db.store(ImpactMethod, method)
+
+
+##################################### 3. Generator #####################################
+
+# The generated database follows the structure of ecoinvent 3.9.1 (cut-off):
+# - the ISIC category tree of the processes, including all categories the script refers to
+# - the elementary flow compartments with a few thousand elementary flows
+# - process names "activity | product | Cutoff, U" with ecoinvent-like locations
+# - about 30 exchanges per process on average, with a long tail up to a few hundred
+# The processes named in the rules of the script are generated for all locations given
+# there, so that every stage finds work. The remaining processes are spread over the
+# categories with weights similar to ecoinvent. The same seed always gives the same database.
+
+ecoinvent_processes = 21238
+
+# ISIC classes used for the processes: section, division, group, class and the weight
+# of the class for the remaining processes
+isic_classes = [
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "011:Growing of non-perennial crops", "0111:Growing of cereals (except rice), leguminous crops and oil seeds", 40],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "011:Growing of non-perennial crops", "0112:Growing of rice", 6],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "011:Growing of non-perennial crops", "0113:Growing of vegetables and melons, roots and tubers", 20],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "011:Growing of non-perennial crops", "0114:Growing of sugar cane", 4],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "011:Growing of non-perennial crops", "0116:Growing of fibre crops", 4],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "011:Growing of non-perennial crops", "0119:Growing of other non-perennial crops", 8],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "012:Growing of perennial crops", "0121:Growing of grapes", 4],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "012:Growing of perennial crops", "0122:Growing of tropical and subtropical fruits", 6],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "012:Growing of perennial crops", "0123:Growing of citrus fruits", 4],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "012:Growing of perennial crops", "0124:Growing of pome fruits and stone fruits", 4],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "012:Growing of perennial crops", "0125:Growing of other tree and bush fruits and nuts", 3],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "012:Growing of perennial crops", "0126:Growing of oleaginous fruits", 4],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "012:Growing of perennial crops", "0127:Growing of beverage crops", 4],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "012:Growing of perennial crops", "0128:Growing of spices, aromatic, drug and pharmaceutical crops", 2],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "012:Growing of perennial crops", "0129:Growing of other perennial crops", 2],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "014:Animal production", "0141:Raising of cattle and buffaloes", 6],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "014:Animal production", "0144:Raising of sheep and goats", 2],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "014:Animal production", "0145:Raising of swine|pigs", 3],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "014:Animal production", "0146:Raising of poultry", 3],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "014:Animal production", "0149:Raising of other animals", 1],
+  ["A:Agriculture, forestry and fishing", "01:Crop and animal production, hunting and related service activities", "016:Support activities to agriculture and post-harvest crop activities", "0161:Support activities for crop production", 12],
+  ["A:Agriculture, forestry and fishing", "02:Forestry and logging", "021:Silviculture and other forestry activities", "0210:Silviculture and other forestry activities", 6],
+  ["A:Agriculture, forestry and fishing", "02:Forestry and logging", "022:Logging", "0220:Logging", 8],
+  ["A:Agriculture, forestry and fishing", "03:Fishing and aquaculture", "031:Fishing", "0311:Marine fishing", 2],
+  ["B:Mining and quarrying", "05:Mining of coal and lignite", "051:Mining of hard coal", "0510:Mining of hard coal", 6],
+  ["B:Mining and quarrying", "05:Mining of coal and lignite", "052:Mining of lignite", "0520:Mining of lignite", 3],
+  ["B:Mining and quarrying", "06:Extraction of crude petroleum and natural gas", "061:Extraction of crude petroleum", "0610:Extraction of crude petroleum", 8],
+  ["B:Mining and quarrying", "06:Extraction of crude petroleum and natural gas", "062:Extraction of natural gas", "0620:Extraction of natural gas", 10],
+  ["B:Mining and quarrying", "07:Mining of metal ores", "071:Mining of iron ores", "0710:Mining of iron ores", 3],
+  ["B:Mining and quarrying", "07:Mining of metal ores", "072:Mining of non-ferrous metal ores", "0721:Mining of uranium and thorium ores", 2],
+  ["B:Mining and quarrying", "07:Mining of metal ores", "072:Mining of non-ferrous metal ores", "0729:Mining of other non-ferrous metal ores", 10],
+  ["B:Mining and quarrying", "08:Other mining and quarrying", "081:Quarrying of stone, sand and clay", "0810:Quarrying of stone, sand and clay", 10],
+  ["B:Mining and quarrying", "08:Other mining and quarrying", "089:Mining and quarrying n.e.c.", "0891:Mining of chemical and fertilizer minerals", 3],
+  ["B:Mining and quarrying", "08:Other mining and quarrying", "089:Mining and quarrying n.e.c.", "0899:Other mining and quarrying n.e.c.", 3],
+  ["C:Manufacturing", "10:Manufacture of food products", "101:Processing and preserving of meat", "1010:Processing and preserving of meat", 10],
+  ["C:Manufacturing", "10:Manufacture of food products", "104:Manufacture of vegetable and animal oils and fats", "1040:Manufacture of vegetable and animal oils and fats", 12],
+  ["C:Manufacturing", "10:Manufacture of food products", "106:Manufacture of grain mill products, starches and starch products", "1061:Manufacture of grain mill products", 8],
+  ["C:Manufacturing", "16:Manufacture of wood and of products of wood and cork", "161:Sawmilling and planing of wood", "1610:Sawmilling and planing of wood", 20],
+  ["C:Manufacturing", "17:Manufacture of paper and paper products", "170:Manufacture of paper and paper products", "1701:Manufacture of pulp, paper and paperboard", 12],
+  ["C:Manufacturing", "19:Manufacture of coke and refined petroleum products", "192:Manufacture of refined petroleum products", "1920:Manufacture of refined petroleum products", 30],
+  ["C:Manufacturing", "20:Manufacture of chemicals and chemical products", "201:Manufacture of basic chemicals, fertilizers and nitrogen compounds, plastics and synthetic rubber in primary forms", "2011:Manufacture of basic chemicals", 110],
+  ["C:Manufacturing", "20:Manufacture of chemicals and chemical products", "201:Manufacture of basic chemicals, fertilizers and nitrogen compounds, plastics and synthetic rubber in primary forms", "2012:Manufacture of fertilizers and nitrogen compounds", 20],
+  ["C:Manufacturing", "20:Manufacture of chemicals and chemical products", "201:Manufacture of basic chemicals, fertilizers and nitrogen compounds, plastics and synthetic rubber in primary forms", "2013:Manufacture of plastics and synthetic rubber in primary forms", 20],
+  ["C:Manufacturing", "22:Manufacture of rubber and plastics products", "222:Manufacture of plastics products", "2220:Manufacture of plastics products", 10],
+  ["C:Manufacturing", "23:Manufacture of other non-metallic mineral products", "239:Manufacture of non-metallic mineral products n.e.c.", "2394:Manufacture of cement, lime and plaster", 20],
+  ["C:Manufacturing", "23:Manufacture of other non-metallic mineral products", "239:Manufacture of non-metallic mineral products n.e.c.", "2395:Manufacture of articles of concrete, cement and plaster", 15],
+  ["C:Manufacturing", "24:Manufacture of basic metals", "241:Manufacture of basic iron and steel", "2410:Manufacture of basic iron and steel", 25],
+  ["C:Manufacturing", "24:Manufacture of basic metals", "242:Manufacture of basic precious and other non-ferrous metals", "2420:Manufacture of basic precious and other non-ferrous metals", 45],
+  ["C:Manufacturing", "25:Manufacture of fabricated metal products, except machinery and equipment", "259:Manufacture of other fabricated metal products; metalworking service activities", "2592:Treatment and coating of metals; machining", 15],
+  ["C:Manufacturing", "26:Manufacture of computer, electronic and optical products", "261:Manufacture of electronic components and boards", "2610:Manufacture of electronic components and boards", 15],
+  ["C:Manufacturing", "27:Manufacture of electrical equipment", "272:Manufacture of batteries and accumulators", "2720:Manufacture of batteries and accumulators", 10],
+  ["C:Manufacturing", "28:Manufacture of machinery and equipment n.e.c.", "282:Manufacture of special-purpose machinery", "2821:Manufacture of agricultural and forestry machinery", 8],
+  ["C:Manufacturing", "29:Manufacture of motor vehicles, trailers and semi-trailers", "291:Manufacture of motor vehicles", "2910:Manufacture of motor vehicles", 6],
+  ["D:Electricity, gas, steam and air conditioning supply", "35:Electricity, gas, steam and air conditioning supply", "351:Electric power generation, transmission and distribution", "3510:Electric power generation, transmission and distribution", 140],
+  ["D:Electricity, gas, steam and air conditioning supply", "35:Electricity, gas, steam and air conditioning supply", "352:Manufacture of gas; distribution of gaseous fuels through mains", "3520:Manufacture of gas; distribution of gaseous fuels through mains", 15],
+  ["D:Electricity, gas, steam and air conditioning supply", "35:Electricity, gas, steam and air conditioning supply", "353:Steam and air conditioning supply", "3530:Steam and air conditioning supply", 30],
+  ["E:Water supply; sewerage, waste management and remediation activities", "36:Water collection, treatment and supply", "360:Water collection, treatment and supply", "3600:Water collection, treatment and supply", 12],
+  ["E:Water supply; sewerage, waste management and remediation activities", "37:Sewerage", "370:Sewerage", "3700:Sewerage", 15],
+  ["E:Water supply; sewerage, waste management and remediation activities", "38:Waste collection, treatment and disposal activities; materials recovery", "382:Waste treatment and disposal", "3821:Treatment and disposal of non-hazardous waste", 60],
+  ["E:Water supply; sewerage, waste management and remediation activities", "38:Waste collection, treatment and disposal activities; materials recovery", "382:Waste treatment and disposal", "3822:Treatment and disposal of hazardous waste", 30],
+  ["F:Construction", "41:Construction of buildings", "410:Construction of buildings", "4100:Construction of buildings", 15],
+  ["F:Construction", "42:Civil engineering", "421:Construction of roads and railways", "4210:Construction of roads and railways", 6],
+  ["G:Wholesale and retail trade; repair of motor vehicles and motorcycles", "46:Wholesale trade, except of motor vehicles and motorcycles", "461:Wholesale on a fee or contract basis", "4610:Wholesale on a fee or contract basis", 30],
+  ["H:Transportation and storage", "49:Land transport and transport via pipelines", "492:Other transport via railways", "4912:Freight rail transport", 10],
+  ["H:Transportation and storage", "49:Land transport and transport via pipelines", "493:Other land transport", "4923:Freight transport by road", 25],
+  ["H:Transportation and storage", "49:Land transport and transport via pipelines", "493:Pipeline transport", "4930:Transport via pipeline", 8],
+  ["H:Transportation and storage", "50:Water transport", "501:Sea and coastal water transport", "5012:Sea and coastal freight water transport", 6],
+  ["H:Transportation and storage", "51:Air transport", "512:Freight air transport", "5120:Freight air transport", 3]]
+
+# Locations of ecoinvent and their weight. Rest-of-World and Global are by far the most frequent.
+locations = [
+  ["Rest-of-World", 30], ["Global", 14], ["Europe", 3], ["Europe without Switzerland", 3], ["Switzerland", 6],
+  ["Germany", 4], ["France", 3], ["Italy", 2], ["Spain", 2], ["United Kingdom", 2], ["Austria", 1], ["Netherlands", 1],
+  ["Belgium", 1], ["Poland", 1], ["Sweden", 1], ["Norway", 1], ["Finland", 1], ["Czech Republic", 1], ["Portugal", 1],
+  ["China", 5], ["India", 4], ["Japan", 1], ["South Korea", 1], ["Indonesia", 1], ["Malaysia", 1], ["Thailand", 1],
+  ["Viet Nam", 1], ["United States", 4], ["Canada", 1], ["Canada, Quebec", 1], ["Mexico", 1], ["Brazil", 3],
+  ["Argentina", 1], ["Chile", 1], ["Peru", 1], ["Colombia", 1], ["South Africa", 2], ["Zambia", 1], ["Kenya", 1],
+  ["Australia", 1], ["New Zealand", 1], ["Russian Federation", 1], ["Kazakhstan", 1], ["Turkey", 1], ["Iran", 1],
+  ["North America", 1], ["Latin America and the Caribbean", 1], ["Asia", 1], ["Africa", 1], ["RER w/o CH+DE", 1]]
+
+# Abbreviated locations in the rules of the script and the location they stand for
+location_names = {"Canada, Qu": "Canada, Quebec", "Canada, Q": "Canada, Quebec"}
+
+# Resources in ground (in kg, unless given otherwise)
+resources_in_ground = [
+  "Aluminium, 24% in bauxite, 11% in crude ore, in ground", "Anhydrite, in ground", "Barite, in ground",
+  "Basalt, in ground", "Borax, in ground", "Cadmium, in ground", "Calcite, in ground", "Chromium, in ground",
+  "Clay, bentonite, in ground", "Clay, unspecified, in ground", "Coal, brown, in ground", "Coal, hard, unspecified, in ground",
+  "Cobalt, in ground", "Copper, Cu 0.52%, in mixed ore, in ground", "Copper, Cu 0.99%, in mixed ore, in ground",
+  "Copper, Cu 1.13%, in mixed ore, in ground", "Copper, Cu 3.2E+0%, Pt 2.5E-4%, Pd 7.3E-4%, in ore, in ground",
+  "Diatomite, in ground", "Dolomite, in ground", "Feldspar, in ground", "Fluorspar, in ground", "Gallium, in ground",
+  "Gold, Au 1.1E-4%, Ag 4.2E-3%, in ore, in ground", "Gold, Au 4.9E-5%, in ore, in ground", "Granite, in ground",
+  "Gravel, in ground", "Gypsum, in ground", "Indium, in ground", "Iron, 46% in ore, 25% in crude ore, in ground",
+  "Iron, in ground", "Kaolinite, in ground", "Lead, in ground", "Lithium, in ground", "Magnesite, in ground",
+  "Manganese, in ground", "Molybdenum, in ground", "Nickel, Ni 2.5E+0%, in mixed ore, in ground", "Peat, in ground",
+  "Phosphorus, in ground", "Potassium chloride, in ground", "Sand, unspecified, in ground", "Shale, in ground",
+  "Silver, Ag 9.7E-4%, in mixed ore, in ground", "Sodium chloride, in ground", "Sulfur, in ground", "Talc, in ground",
+  "Tin, in ground", "Titanium, in ground", "Uranium, in ground", "Zinc, in ground", "Zirconium, in ground"]
+
+# Flows used by the script or by the stages, with their compartment and unit
+named_flows = [
+  ["Gangue, bauxite", "in ground", "kg"], ["Gangue", "in ground", "kg"],
+  ["Oil, crude, in ground", "in ground", "kg"], ["Gas, natural, in ground", "in ground", "m3"],
+  ["Water, well, in ground", "in ground", "m3"], ["Water, river", "in water", "m3"], ["Water, lake", "in water", "m3"],
+  ["Water, turbine use, unspecified natural origin", "in water", "m3"], ["Water, salt, ocean", "in water", "m3"],
+  ["Water, cooling, unspecified natural origin", "in water", "m3"], ["Water, unspecified natural origin", "in water", "m3"],
+  ["Water, in air", "in air", "m3"],
+  ["Wood, hard, standing", "biotic", "m3"], ["Wood, soft, standing", "biotic", "m3"],
+  ["Wood, primary forest, standing", "biotic", "m3"], ["Fish, demersal, in ocean", "biotic", "kg"],
+  ["Fish, pelagic, in ocean", "biotic", "kg"], ["Fish, demersal, in inland waters", "biotic", "kg"],
+  ["Energy, gross calorific value, in biomass", "biotic", "MJ"],
+  ["Energy, gross calorific value, in biomass, primary forest", "biotic", "MJ"],
+  ["Energy, gross calorific value, in biomass, correction", "biotic", "MJ"],
+  ["Peat, unspecified", "unspecified", "kg"], ["Volume occupied, reservoir", "unspecified", "m3*a"],
+  ["Transformation, from traffic area, rail/road embankment", "land", "m2"],
+  ["Transformation, from arable land, unspecified use", "land", "m2"], ["Transformation, to arable land, unspecified use", "land", "m2"],
+  ["Transformation, from forest, unspecified", "land", "m2"], ["Transformation, to forest, intensive", "land", "m2"],
+  ["Occupation, arable land, unspecified use", "land", "m2*a"], ["Occupation, forest, intensive", "land", "m2*a"],
+  ["Occupation, industrial area", "land", "m2*a"], ["Occupation, mineral extraction site", "land", "m2*a"]]
+
+# Emissions are generated for these substances in every compartment. Further substances
+# are numbered, until the number of elementary flows is reached.
+substances = [
+  "Carbon dioxide, fossil", "Carbon dioxide, non-fossil", "Carbon monoxide, fossil", "Methane, fossil",
+  "Methane, non-fossil", "Dinitrogen monoxide", "Nitrogen oxides", "Ammonia", "Sulfur dioxide", "Hydrogen chloride",
+  "Hydrogen fluoride", "Particulate Matter, < 2.5 um", "Particulate Matter, > 10 um", "Particulate Matter, > 2.5 um, and < 10um",
+  "NMVOC, non-methane volatile organic compounds", "Benzene", "Toluene", "Xylene", "Formaldehyde", "Acetone",
+  "Arsenic", "Cadmium", "Chromium", "Chromium VI", "Cobalt", "Copper ion", "Lead", "Mercury", "Nickel", "Zinc",
+  "Antimony", "Barium", "Boron", "Manganese", "Molybdenum", "Selenium", "Vanadium", "Nitrate", "Phosphate",
+  "Phosphorus", "Sulfate", "Chloride", "Fluoride", "Sodium", "Potassium", "Calcium", "Iron", "Aluminium",
+  "BOD5, Biological Oxygen Demand", "COD, Chemical Oxygen Demand", "DOC, Dissolved Organic Carbon", "TOC, Total Organic Carbon",
+  "Suspended solids, unspecified", "Heat, waste", "Radon-222", "Tritium", "Carbon-14", "Cesium-137", "Uranium-238",
+  "Glyphosate", "Atrazine", "Metolachlor", "Chlorpyrifos", "Mancozeb", "Pendimethalin", "Dioxins, measured as 2,3,7,8-tetrachlorodibenzo-p-dioxin",
+  "PAH, polycyclic aromatic hydrocarbons", "Benzo(a)pyrene", "Ethene", "Propene", "Butane", "Pentane", "Hexane", "Ethanol", "Methanol"]
+
+emission_compartments = [
+  ["Emission to air", ["unspecified", "urban air close to ground", "non-urban air or from high stacks",
+                       "lower stratosphere + upper troposphere", "low population density, long-term"]],
+  ["Emission to water", ["unspecified", "surface water", "ground water", "ground water, long-term", "ocean"]],
+  ["Emission to soil", ["unspecified", "agricultural", "forestry", "industrial"]]]
+
+# Waste flows indicating overburden, which are outputs of mining processes
+overburden_waste_flows = ["non-sulfidic overburden, off-site", "spoil from hard coal mining", "spoil from lignite mining"]
+
+# Crops, woods and other products used in the names of the generated processes
+crops  = ["wheat grain", "barley grain", "rye grain", "maize grain", "sweet corn", "sunflower seed", "rape seed",
+          "rice, non-basmati", "potato", "sugar beet", "soybean", "cotton seed", "grape", "apple", "banana", "tomato",
+          "coffee, green bean", "tea, dried", "oil palm fruit bunch", "coconut, husked", "sugarcane", "onion", "carrot"]
+woods  = ["hardwood, measured as solid wood under bark", "softwood, measured as solid wood under bark",
+          "eucalyptus, measured as solid wood under bark", "cleft timber, measured as dry mass", "wood chips, wet, measured as dry mass"]
+goods  = ["chemical, inorganic", "chemical, organic", "electricity, high voltage", "electricity, medium voltage",
+          "electricity, low voltage", "heat, district or industrial, natural gas", "heat, district or industrial, other than natural gas",
+          "transport, freight, lorry >32 metric ton, EURO6", "transport, freight train", "transport, freight, sea, container ship",
+          "steel, low-alloyed", "steel, chromium steel 18/8", "aluminium, primary, ingot", "copper, cathode", "zinc", "nickel, class 1",
+          "cement, Portland", "concrete, normal", "clinker", "lime", "sand", "gravel, crushed", "clay", "polyethylene, high density, granulate",
+          "polypropylene, granulate", "polyvinylchloride, bulk polymerised", "nitrogen fertiliser, as N", "phosphate fertiliser, as P2O5",
+          "potassium fertiliser, as K2O", "diesel", "petrol, unleaded", "natural gas, high pressure", "hard coal", "lignite",
+          "sawnwood, board, softwood, raw, dried (u=10%)", "paper, woodfree, uncoated", "kraft paper", "tap water", "wastewater, average",
+          "municipal solid waste", "hazardous waste, for incineration", "building, multi-storey", "road", "lorry, 40 metric ton",
+          "printed wiring board, surface mounted, unspecified, Pb free", "battery, Li-ion, rechargeable, prismatic",
+          "vegetable oil, refined", "meat, pig", "cow milk", "chicken for slaughtering, live weight", "fish, pelagic, at fishing vessel"]
+
+# The function weighted_choice picks one of the [value, ..., weight] entries by its weight
+def weighted_choice(rnd, entries, total):
+  pick = rnd.uniform(0, total)
+  for entry in entries:
+    pick = pick - entry[-1]
+    if pick <= 0:
+      return entry
+  return entries[-1]
+
+# The function rule_processes reads the data file with the rules of the script and returns the
+# processes named there as [name of the process, location or None, table]
+def rule_processes(path):
+  with open(path, 'r') as f:
+    data = json.load(f)
+
+  found = []
+  for table in ["overburden", "gangue"]:
+    for entry in data[table]["entries"]:
+      found.append([str(entry["process"]), location_names.get(entry["location"], str(entry["location"])), "mining"])
+  for table in ["tillage", "compacting"]:
+    for entry in data[table]["entries"]:
+      found.append([str(entry["process"]), None, table])
+  return found
+
+# The function rule_process_name turns a name pattern of the rules into the name of a process
+def rule_process_name(pattern):
+  name = pattern.strip().rstrip("|").strip()
+  if name.endswith(","):
+    name = name + " by rotary harrow"
+  if " | " not in name:
+    name = name + " | " + name
+  return name + " | Cutoff, U"
+
+# The function mining_class returns the ISIC class of a mining process given by the rules
+def mining_class(name):
+  activity = name.split(" | ")[0]
+  if "coal" in activity:
+    return "0510:Mining of hard coal"
+  if "lignite" in activity:
+    return "0520:Mining of lignite"
+  if "iron" in activity:
+    return "0710:Mining of iron ores"
+  if "uranium" in activity:
+    return "0721:Mining of uranium and thorium ores"
+  if "barite" in activity or "gravel" in activity or "sand" in activity or "clay" in activity or "kaolin" in activity:
+    return "0899:Other mining and quarrying n.e.c."
+  return "0729:Mining of other non-ferrous metal ores"
+
+# The function exchange_count draws the number of exchanges of a process (without the reference product).
+# Most processes have 10 to 50 exchanges, a few have several hundred.
+def exchange_count(rnd):
+  return max(2, min(400, int(rnd.lognormvariate(3.1, 0.75))))
+
+# The function generate creates the database. The number of processes includes the processes
+# of the rules. With the default, the database has the size of ecoinvent 3.9.1.
+def generate(processes = ecoinvent_processes, seed = 1, name = "ei391_fixture", elementary_flows = 4300, rules = rules):
+  rnd = random.Random(seed)
+  db  = Database(name)
+
+  def new_ref_id():
+    return str(uuid.UUID(int = rnd.getrandbits(128)))
+
+  # Units and flow properties
+  properties = {}
+  for group_name, property_name, unit_names in [["Units of mass", "Mass", ["kg", "g", "t"]],
+                                                ["Units of volume", "Volume", ["m3", "l"]],
+                                                ["Units of energy", "Energy", ["MJ", "kWh"]],
+                                                ["Units of area", "Area", ["m2"]],
+                                                ["Units of area*time", "Area*time", ["m2*a"]],
+                                                ["Units of volume*time", "Volume*time", ["m3*a"]],
+                                                ["Units of mass*distance", "Goods transport (mass*distance)", ["t*km"]],
+                                                ["Units of items", "Number of items", ["Item(s)"]]]:
+    group = db.store(UnitGroup, UnitGroup(refId = new_ref_id(), name = group_name))
+    prop  = db.store(FlowProperty, FlowProperty(refId = new_ref_id(), name = property_name))
+    for unit_name in unit_names:
+      unit = Unit(id = next(entity_ids), refId = new_ref_id(), name = unit_name)
+      group.units.add(unit)
+      properties[unit_name] = [unit, prop]
+
+  # The categories are stored by their path, e.g. "Elementary flows/Resource/in ground"
+  categories = {}
+  def category(path, model_type):
+    if path not in categories:
+      parent = None
+      if "/" in path:
+        parent = category(path.rsplit("/", 1)[0], model_type)
+      c = db.store(Category, Category(refId = new_ref_id(), name = path.split("/")[-1], category = parent, modelType = model_type))
+      if parent != None:
+        parent.childCategories.add(c)
+      categories[path] = c
+    return categories[path]
+
+  # Flows
+  flows = {}
+  def flow(flow_name, path, unit_name):
+    unit, prop = properties[unit_name]
+    f = db.store(Flow, Flow(refId = new_ref_id(), name = flow_name, category = category(path, ModelType.FLOW),
+                            referenceUnit = unit, referenceFlowProperty = prop,
+                            referenceFactor = FlowPropertyFactor(id = next(entity_ids), flowProperty = prop)))
+    flows[flow_name] = f
+    return f
+
+  for flow_name in resources_in_ground:
+    flow(flow_name, "Elementary flows/Resource/in ground", "kg")
+  for flow_name, compartment, unit_name in named_flows:
+    flow(flow_name, "Elementary flows/Resource/" + compartment, unit_name)
+
+  emissions = []
+  number    = 0
+  while len(db.all(Flow)) < elementary_flows:
+    for compartment, subcompartments in emission_compartments:
+      for subcompartment in subcompartments:
+        if number < len(substances):
+          substance = substances[number]
+        else:
+          substance = "Substance " + str(number + 1)
+        emissions.append(flow(substance, "Elementary flows/" + compartment + "/" + subcompartment, "kg"))
+    number = number + 1
+
+  for flow_name in overburden_waste_flows:
+    flow(flow_name, "Technosphere flows/Waste", "kg")
+
+  # Product flows are created for the processes on demand
+  def product(product_name, unit_name):
+    if product_name not in flows:
+      flow(product_name, "Technosphere flows/" + product_name[0].upper(), unit_name)
+    return flows[product_name]
+
+  # Process categories
+  classes = {}
+  for section, div, group, cls, weight in isic_classes:
+    classes[cls] = category(section + "/" + div + "/" + group + "/" + cls, ModelType.PROCESS)
+  total_class_weight    = float(sum([entry[-1] for entry in isic_classes]))
+  total_location_weight = float(sum([entry[-1] for entry in locations]))
+  location_entities     = {}
+  def location(location_name):
+    if location_name not in location_entities:
+      location_entities[location_name] = db.store(Location, Location(refId = new_ref_id(), name = location_name))
+    return location_entities[location_name]
+
+  # The function process creates a process with its reference product and exchanges
+  def process(process_name, class_name, location_name, exchanges, ref_unit = "kg"):
+    product_flow = product(process_name.split(" | ")[1], ref_unit)
+    reference    = Exchange(internalId = 1, isInput = False, flow = product_flow, amount = 1.0,
+                            unit = product_flow.referenceUnit, flowPropertyFactor = product_flow.referenceFactor)
+    p = Process(refId = new_ref_id(), name = process_name, category = classes[class_name], location = location(location_name),
+                version = 10**10 * 3 + 10**5 * 9 + 1, lastChange = 1669852800000, quantitativeReference = reference)
+    p.exchanges.add(reference)
+    for f, is_input, amount in exchanges:
+      p.exchanges.add(Exchange(internalId = len(p.exchanges) + 1, isInput = is_input, flow = f, amount = float(amount),
+                               unit = f.referenceUnit, flowPropertyFactor = f.referenceFactor))
+    p.lastInternalId = len(p.exchanges)
+    return db.store(Process, p)
+
+  products = [product(good, "kg") for good in goods]
+
+  # The function background adds technosphere inputs and emissions to the exchanges of a process
+  def background(exchanges, count):
+    while len(exchanges) < count:
+      if rnd.random() < 0.35:
+        exchanges.append([rnd.choice(products), True, rnd.uniform(0.001, 2)])
+      else:
+        exchanges.append([rnd.choice(emissions), False, rnd.uniform(1e-9, 1)])
+    return exchanges
+
+  # The function mining_exchanges returns the resources and wastes of a mining process.
+  # Some have gangue and overburden waste flows, others lack them.
+  def mining_exchanges(class_name):
+    exchanges = [[flows[rnd.choice(resources_in_ground)], True, rnd.uniform(1, 5)]]
+    if class_name.startswith("07") and rnd.random() < 0.4:
+      exchanges.append([flows["Gangue"], True, rnd.uniform(1, 50)])
+    if rnd.random() < 0.3:
+      waste = overburden_waste_flows[0]
+      if class_name.startswith("05"):
+        waste = overburden_waste_flows[1 + int(class_name == "0520:Mining of lignite")]
+      exchanges.append([flows[waste], False, rnd.uniform(1, 20)])
+    exchanges.append([flows["Occupation, mineral extraction site"], True, rnd.uniform(0.001, 0.1)])
+    return exchanges
+
+  # The processes of the rules. Tillage and compacting processes exist for Switzerland and the Rest-of-World.
+  names = set()
+  for pattern, location_name, kind in rule_processes(rules):
+    process_name = rule_process_name(pattern)
+    location_list = [location_name] if location_name != None else ["Switzerland", "Rest-of-World"]
+    for location_name in location_list:
+      if (process_name, location_name) in names:
+        continue
+      names.add((process_name, location_name))
+      if kind == "mining":
+        class_name = mining_class(process_name)
+        process(process_name, class_name, location_name, background(mining_exchanges(class_name), exchange_count(rnd)))
+      else:
+        process(process_name, "0161:Support activities for crop production", location_name,
+                background([[flows["Occupation, arable land, unspecified use"], True, rnd.uniform(1, 10)]], exchange_count(rnd)), "m2")
+
+  # The remaining processes are spread over the categories
+  index = 0
+  while len(db.all(Process)) < processes:
+    index         = index + 1
+    class_name    = weighted_choice(rnd, isic_classes, total_class_weight)[3]
+    location_name = weighted_choice(rnd, locations, total_location_weight)[0]
+    division_code = class_name[0:2]
+    kind          = rnd.random()
+    count         = exchange_count(rnd)
+    exchanges     = []
+    ref_unit      = "kg"
+
+    if division_code == "01" and class_name.startswith("014") == False and class_name != "0161:Support activities for crop production":
+      good = rnd.choice(crops)
+      activity = good + " production"
+      exchanges.append([flows["Energy, gross calorific value, in biomass"], True, rnd.uniform(10, 20)])
+      exchanges.append([flows["Occupation, arable land, unspecified use"], True, rnd.uniform(0.1, 2)])
+    elif class_name.startswith("014"):
+      good = "animal " + str(index)
+      activity = good + " production"
+      exchanges.append([flows["Energy, gross calorific value, in biomass"], True, rnd.uniform(1, 10)])
+    elif division_code == "02":
+      good = rnd.choice(woods)
+      activity = good.split(",")[0] + " forestry"
+      ref_unit = "m3"
+      exchanges.append([flows["Energy, gross calorific value, in biomass, primary forest"], True, rnd.uniform(1000, 9000)])
+      exchanges.append([flows["Energy, gross calorific value, in biomass, correction"], True, rnd.uniform(1, 10)])
+      exchanges.append([flows["Wood, hard, standing" if "hardwood" in good else "Wood, soft, standing"], True, 1])
+      if class_name == "0220:Logging" and rnd.random() < 0.6:
+        exchanges.append([flows["Transformation, from traffic area, rail/road embankment"], True, rnd.uniform(0.01, 0.2)])
+    elif division_code == "03":
+      good = "fish " + str(index)
+      activity = good + " fishing"
+      exchanges.append([flows[rnd.choice(["Fish, demersal, in ocean", "Fish, pelagic, in ocean"])], True, rnd.uniform(1, 2)])
+    elif division_code in ["05", "07", "08"]:
+      good = "ore " + str(index)
+      activity = good + " mine operation"
+      exchanges.extend(mining_exchanges(class_name))
+    elif division_code == "06":
+      good = rnd.choice(["petroleum", "natural gas, unprocessed"])
+      activity = good + " production, onshore " + str(index)
+      exchanges.append([flows["Oil, crude, in ground" if good == "petroleum" else "Gas, natural, in ground"], True, rnd.uniform(1, 2)])
+    else:
+      good = rnd.choice(goods) + " " + str(index)
+      activity = good + " production"
+      # Some processes outside the mining categories extract resources themselves
+      if rnd.random() < 0.05:
+        exchanges.append([flows[rnd.choice(resources_in_ground)], True, rnd.uniform(0.01, 1)])
+      if rnd.random() < 0.3:
+        exchanges.append([flows[rnd.choice(["Water, river", "Water, well, in ground", "Water, cooling, unspecified natural origin"])], True, rnd.uniform(0.001, 1)])
+
+    # About a quarter of the processes are markets, and a few are treatments of waste.
+    # Some markets of mining products pass on overburden waste flows.
+    if kind < 0.25:
+      activity  = "market for " + good
+      exchanges = [[rnd.choice(products), True, rnd.uniform(0.5, 1)]]
+      count     = min(count, 12)
+      if division_code in ["05", "07"] and rnd.random() < 0.2:
+        exchanges.append([flows[rnd.choice(overburden_waste_flows)], False, 1.0])
+    elif division_code == "38":
+      activity = "treatment of " + good
+
+    process(activity + " | " + good + " | Cutoff, U", class_name, location_name, background(exchanges, count), ref_unit)
+
+  return db
+
+
+##################################### 4. Install #####################################
+
+# The function install registers the stand-ins as the modules of openLCA and Java that the
+# script imports. The modules of the openLCA application are not registered, so the
+# database has to be passed to the script as "db".
+def install():
+
+  def module(name, **attributes):
+    m = sys.modules.get(name)
+    if m == None:
+      m = types.ModuleType(name)
+      sys.modules[name] = m
+    m.__dict__.update(attributes)
+    if "." in name:
+      parent, leaf = name.rsplit(".", 1)
+      setattr(module(parent), leaf, m)
+    return m
+
+  module("org.openlca.core.model", Category = Category, Location = Location, Unit = Unit, UnitGroup = UnitGroup,
+         FlowProperty = FlowProperty, FlowPropertyFactor = FlowPropertyFactor, Flow = Flow, Exchange = Exchange,
+         Process = Process, ImpactFactor = ImpactFactor, ImpactCategory = ImpactCategory, ImpactMethod = ImpactMethod,
+         ModelType = ModelType, Version = Version)
+  module("org.openlca.core.database", Derby = None, CategoryDao = CategoryDao, LocationDao = LocationDao,
+         UnitGroupDao = UnitGroupDao, FlowPropertyDao = FlowPropertyDao, FlowDao = FlowDao, ProcessDao = ProcessDao,
+         ImpactMethodDao = ImpactMethodDao, ImpactCategoryDao = ImpactCategoryDao)
+  module("org.openlca.jsonld", ZipStore = ZipStore, JsonStoreReader = None)
+  module("org.openlca.jsonld.input", JsonImport = JsonImport)
+  module("java.io", File = File)
+  module("java.util", UUID = UUID)
+  module("java.util.concurrent", Executors = Executors, TimeUnit = TimeUnit)
+  module("java.lang", Runtime = Runtime)
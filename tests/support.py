@@ -0,0 +1,60 @@
+###################################################################
+### M a t e r i a l   I n t e n s i t y   T e s t   S u p p o r t ###
+###################################################################
+
+# This module runs MI_ei_3.9.1.py on the synthetic database of MI_fixture.py for the tests.
+# The tests run with Python 2.7, like the python console of openLCA:
+#   python -m unittest discover tests
+
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MI_fixture
+
+MI_fixture.install()
+
+# The function make_work_dir creates an empty openLCA data directory for a test
+def make_work_dir():
+  work_dir = tempfile.mkdtemp(prefix = "mi_test_")
+  os.environ["OPENLCA_DATA_DIR"] = work_dir
+  return work_dir
+
+def remove_work_dir(work_dir):
+  shutil.rmtree(work_dir, ignore_errors = True)
+
+# The function run_script runs the script once on the database and returns the variables of the run.
+# The settings replace the values of the variables in the settings section of the script,
+# e.g. {"incremental": True}. The output of the script is written to log.txt in the data directory.
+def run_script(db, settings = {}, extra = {}):
+  with open(MI_fixture.script, 'r') as f:
+    source = f.read()
+  for name in settings:
+    source, replaced = re.subn(r"^" + name + r"\s*=.*$", name + " = " + repr(settings[name]), source, count = 1, flags = re.M)
+    if replaced != 1:
+      raise Exception("The script has no setting " + name + ".")
+
+  scope = {"__name__": "__main__", "__file__": MI_fixture.script, "db": db}
+  scope.update(extra)
+  stdout = sys.stdout
+  with open(os.path.join(os.environ["OPENLCA_DATA_DIR"], "log.txt"), 'a') as log:
+    sys.stdout = log
+    try:
+      exec(compile(source, MI_fixture.script, "exec"), scope)
+    finally:
+      sys.stdout = stdout
+  return scope
+
+# The function process_state returns the exchanges of all processes as sorted tuples, so that
+# the databases of two runs can be compared. The flows are given by their names, because the
+# IDs of two databases generated with the same seed are not the same.
+def process_state(db):
+  state = []
+  for p in db.all(MI_fixture.Process):
+    exchanges = sorted([(ex.flow.name, ex.isInput == True, round(float(ex.amount), 9), ex.internalId) for ex in p.exchanges])
+    state.append((p.refId, exchanges))
+  return sorted(state)
@@ -0,0 +1,45 @@
+###################################################################
+### T e s t s :   D r y   R u n                                 ###
+###################################################################
+
+import json
+import os
+import unittest
+
+import support
+import MI_fixture
+
+
+class DryRunTest(unittest.TestCase):
+
+  def setUp(self):
+    self.work_dir = support.make_work_dir()
+
+  def tearDown(self):
+    support.remove_work_dir(self.work_dir)
+
+  # A dry run writes the plan, but does not change the database, not even by adding
+  # the new elementary flows. The JDBC backend is used, because the process entities of
+  # the fixture are the stored ones, while openLCA would hand out copies.
+  def test_a_dry_run_changes_nothing_in_the_database(self):
+    db      = MI_fixture.generate(processes = 500, seed = 4)
+    flows   = len(db.all(MI_fixture.Flow))
+    state   = support.process_state(db)
+    scope   = support.run_script(db, {"dry_run": True, "read_backend": "jdbc"})
+
+    self.assertTrue(len(scope["new_flows"]) > 0)
+    self.assertTrue(min([f.id for f in scope["new_flows"]]) < 0)
+    self.assertEqual(len(db.all(MI_fixture.Flow)), flows)
+    self.assertEqual(support.process_state(db), state)
+    for key in ["insert", "update", "delete", "merge", "persist", "commit"]:
+      self.assertEqual(db.counts[key], 0, key)
+
+    with open(scope["plan_file"](), 'r') as f:
+      plan = json.load(f)
+    self.assertTrue(len(plan) > 0)
+    new_names = set([f.name for f in scope["new_flows"]])
+    self.assertTrue(len([entry for entry in plan if entry[1] in new_names]) > 0)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,67 @@
+###################################################################
+### T e s t s :   I n c r e m e n t a l                         ###
+###################################################################
+
+import unittest
+
+import support
+import MI_fixture
+
+
+class IncrementalTest(unittest.TestCase):
+
+  def setUp(self):
+    self.work_dirs = []
+
+  def tearDown(self):
+    for work_dir in self.work_dirs:
+      support.remove_work_dir(work_dir)
+
+  def new_work_dir(self):
+    self.work_dirs.append(support.make_work_dir())
+
+  # The function change_process doubles the amount of an input of a mining process and sets a new
+  # last change, like an update of the database would
+  def change_process(self, db):
+    for p in db.all(MI_fixture.Process):
+      if p.category != None and p.category.name.startswith("07"):
+        for ex in p.exchanges:
+          if ex.isInput == True:
+            ex.amount     = ex.amount * 2
+            p.lastChange  = p.lastChange + 1
+            return
+
+  def scan_counts(self, scope):
+    for s in scope["report_stages"]:
+      if s["stage"] == "scan":
+        return s["counts"]
+
+  # Two runs in the incremental mode must give the same processes as two full runs,
+  # while the second run reads only the exchanges of the changed process
+  def check_incremental_runs(self, read_backend):
+    full = MI_fixture.generate(processes = 500, seed = 5)
+    self.new_work_dir()
+    support.run_script(full)
+    self.change_process(full)
+    support.run_script(full)
+
+    db = MI_fixture.generate(processes = 500, seed = 5)
+    self.new_work_dir()
+    first = support.run_script(db, {"incremental": True, "read_backend": read_backend})
+    self.change_process(db)
+    second = support.run_script(db, {"incremental": True, "read_backend": read_backend})
+
+    self.assertEqual(support.process_state(full), support.process_state(db))
+    processes = len(db.all(MI_fixture.Process))
+    self.assertEqual(self.scan_counts(first).get("processes_restored", 0), 0)
+    self.assertEqual(self.scan_counts(second)["processes_restored"], processes - 1)
+    self.assertTrue(self.scan_counts(second)["exchanges"] < self.scan_counts(first)["exchanges"] / 10)
+
+  def test_incremental_runs_with_jdbc(self):
+    self.check_incremental_runs("jdbc")
+
+  def test_incremental_runs_with_jpa(self):
+    self.check_incremental_runs("jpa")
+
+if __name__ == "__main__":
+  unittest.main()
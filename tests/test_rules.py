@@ -0,0 +1,48 @@
+###################################################################
+### T e s t s :   R u l e s                                     ###
+###################################################################
+
+import json
+import os
+import unittest
+
+import support
+import MI_fixture
+
+
+class RulesTest(unittest.TestCase):
+
+  def setUp(self):
+    self.work_dir = support.make_work_dir()
+
+  def tearDown(self):
+    support.remove_work_dir(self.work_dir)
+
+  # The first run compiles the rules, the second run loads them from the compiled file.
+  # Both must give the same rules.
+  def test_rules_are_the_same_after_loading_the_compiled_rules(self):
+    db     = MI_fixture.generate(processes = 500, seed = 3)
+    first  = support.run_script(db)
+    compiled_file = os.path.join(self.work_dir, "Material Intensity", "rules_3.9.1.compiled.json")
+    self.assertTrue(os.path.isfile(compiled_file))
+
+    second = support.run_script(db)
+    self.assertEqual(first["rules"], second["rules"])
+    with open(compiled_file, 'r') as f:
+      self.assertEqual(json.load(f)["key"], second["rules"]["key"])
+
+  # The amounts of the rules are plain numbers, which are taken as they are
+  def test_rule_amounts_are_numbers(self):
+    with open(MI_fixture.rules, 'r') as f:
+      data = json.load(f)
+    for table in ["overburden", "gangue"]:
+      for entry in data[table]["entries"]:
+        self.assertTrue(isinstance(entry["amount"], (int, long, float)), entry["process"])
+
+    db    = MI_fixture.generate(processes = 100, seed = 3)
+    scope = support.run_script(db)
+    self.assertEqual([e[2] for e in scope["rules"]["gangue"]], [e["amount"] for e in data["gangue"]["entries"]])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,87 @@
+###################################################################
+### T e s t s :   S c a n                                       ###
+###################################################################
+
+import unittest
+
+import support
+import MI_fixture
+
+
+class ScanTest(unittest.TestCase):
+
+  def setUp(self):
+    self.work_dirs     = []
+    self.exchange_rows = MI_fixture.exchange_rows
+
+  def tearDown(self):
+    MI_fixture.exchange_rows = self.exchange_rows
+    for work_dir in self.work_dirs:
+      support.remove_work_dir(work_dir)
+
+  def new_work_dir(self):
+    self.work_dirs.append(support.make_work_dir())
+
+  # The function change_process doubles the amount of an input of a mining process and sets a new
+  # last change, like an update of the database would
+  def change_process(self, db):
+    for p in db.all(MI_fixture.Process):
+      if p.category != None and p.category.name.startswith("07"):
+        for ex in p.exchanges:
+          if ex.isInput == True:
+            ex.amount     = ex.amount * 2
+            p.lastChange  = p.lastChange + 1
+            return
+
+  # The function failing_exchange_rows makes the exchange query fail after its first row
+  def failing_exchange_rows(self, processes):
+    rows = self.exchange_rows(processes)
+    yield next(rows)
+    raise Exception("The connection was closed.")
+
+  def amounts(self, scope):
+    summary_values = scope["summary_values"]
+    amount_stats   = scope["amount_stats"]
+    return [sorted(summary_values(amount_stats[scope["gangue"].id])),
+            sorted(summary_values(amount_stats[scope["overburden"].id]))]
+
+  # If the exchange query fails partway, the processes are read again with JPA.
+  # The gangue and overburden amounts must be counted once, as in a run that used JPA only.
+  def test_a_failed_jdbc_scan_does_not_count_amounts_twice(self):
+    clean = MI_fixture.generate(processes = 500, seed = 7)
+    self.new_work_dir()
+    support.run_script(clean, {"incremental": True})
+    self.change_process(clean)
+    expected = support.run_script(clean, {"incremental": True})
+
+    db = MI_fixture.generate(processes = 500, seed = 7)
+    self.new_work_dir()
+    support.run_script(db, {"incremental": True, "read_backend": "jdbc"})
+    self.change_process(db)
+    MI_fixture.exchange_rows = self.failing_exchange_rows
+    scope = support.run_script(db, {"incremental": True, "read_backend": "jdbc"})
+
+    self.assertTrue(len(self.amounts(expected)[0]) > 0)
+    self.assertEqual(self.amounts(expected), self.amounts(scope))
+    self.assertEqual(support.process_state(clean), support.process_state(db))
+
+  # The exchanges read by several threads must give the same processes and amounts
+  # as the exchanges read on the main thread
+  def test_parallel_scan_gives_the_same_results_as_the_serial_scan(self):
+    serial = MI_fixture.generate(processes = 1000, seed = 9)
+    self.new_work_dir()
+    expected = support.run_script(serial, {"read_backend": "jdbc", "worker_threads": 1})
+
+    db = MI_fixture.generate(processes = 1000, seed = 9)
+    self.new_work_dir()
+    scope = support.run_script(db, {"read_backend": "jdbc", "worker_threads": 0})
+
+    self.assertEqual(scope["thread_count"](), 4)
+    self.assertEqual(serial.counts["connection"] + 4, db.counts["connection"])
+    self.assertEqual(self.amounts(expected), self.amounts(scope))
+    self.assertEqual(support.process_state(serial), support.process_state(db))
+    self.assertEqual(expected["change_plan"], scope["change_plan"])
+
+
+if __name__ == "__main__":
+  unittest.main()
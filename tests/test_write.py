@@ -0,0 +1,64 @@
+###################################################################
+### T e s t s :   W r i t e   B a c k                           ###
+###################################################################
+
+import os
+import unittest
+
+import support
+import MI_fixture
+
+
+class WriteTest(unittest.TestCase):
+
+  def setUp(self):
+    self.work_dir = support.make_work_dir()
+    self.commit   = MI_fixture.Transaction.commit
+    self.merge    = MI_fixture.EntityManager.merge
+
+  def tearDown(self):
+    MI_fixture.Transaction.commit = self.commit
+    MI_fixture.EntityManager.merge = self.merge
+    support.remove_work_dir(self.work_dir)
+
+  def run_failing(self, db, settings):
+    with self.assertRaises(Exception):
+      support.run_script(db, settings)
+    with open(os.path.join(self.work_dir, "log.txt"), 'r') as f:
+      return [line for line in f.read().splitlines() if line.startswith("Writing the processes failed")]
+
+  # The first commit after the processes were merged fails. The message names the processes
+  # of this commit, none of which were committed.
+  def test_a_failed_commit_reports_the_processes_of_the_commit(self):
+    db     = MI_fixture.generate(processes = 1000, seed = 2)
+    commit = self.commit
+    def failing_commit(transaction):
+      if transaction.db.counts["merge"] > 0:
+        raise Exception("The disk is full.")
+      commit(transaction)
+    MI_fixture.Transaction.commit = failing_commit
+
+    failures = self.run_failing(db, {"commit_mode": "every", "commit_every": 50})
+    self.assertEqual(len(failures), 1)
+    self.assertTrue(failures[0].startswith("Writing the processes failed at the commit of the processes 1 to 50 of the plan"))
+    self.assertIn(". 0 of ", failures[0])
+
+  # A merge fails for a single process, after two commits of 50 processes
+  def test_a_failed_merge_reports_the_process(self):
+    db    = MI_fixture.generate(processes = 1000, seed = 2)
+    merge = self.merge
+    def failing_merge(em, entity):
+      if em.db.counts["merge"] == 120:
+        raise Exception("The disk is full.")
+      return merge(em, entity)
+    MI_fixture.EntityManager.merge = failing_merge
+
+    failures = self.run_failing(db, {"commit_mode": "every", "commit_every": 50})
+    self.assertEqual(len(failures), 1)
+    self.assertTrue(failures[0].startswith("Writing the processes failed at the merge of the process "))
+    self.assertIn("which was changed first by the stage ", failures[0])
+    self.assertIn(". 100 of ", failures[0])
+
+
+if __name__ == "__main__":
+  unittest.main()